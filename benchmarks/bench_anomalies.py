@@ -0,0 +1,121 @@
+"""Мікробенчмарк AnomalyDetector.update на 100k різних серіях.
+
+Запуск: ``python benchmarks/bench_anomalies.py [--series 100000] [--minutes 10]``.
+Поруч вимірюється попередня реалізація, що на кожну подію перераховувала
+середнє та дисперсію по всьому вікну, і (якщо встановлено numpy) векторизований
+бекенд, що оцінює всі серії разом при закритті хвилини.
+"""
+from __future__ import annotations
+
+import argparse
+import os
+import random
+import sys
+import time
+from collections import defaultdict, deque
+from datetime import UTC, datetime, timedelta
+from pathlib import Path
+from typing import Any
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT / "src"))
+for _name, _value in {
+    "TG_BOT_TOKEN": "bench",
+    "DATABASE_URL": "sqlite+aiosqlite:///:memory:",
+    "REDIS_URL": "redis://localhost:6379/0",
+    "API_AUTH_TOKEN": "bench",
+}.items():
+    os.environ.setdefault(_name, _value)
+
+from cortexwatcher.analyzer.anomalies import AnomalyDetector  # noqa: E402
+
+try:
+    import numpy  # noqa: F401
+
+    from cortexwatcher.analyzer.vectorized import VectorizedAnomalyDetector  # noqa: E402
+except ImportError:
+    VectorizedAnomalyDetector = None  # type: ignore[assignment,misc]
+
+# Скільки хвилин потрібно старій реалізації, щоб рахувати z-score
+LEGACY_MIN_POINTS = 3
+
+
+class LegacyDetector:
+    """Попередня реалізація: список значень і два проходи на кожну подію."""
+
+    def __init__(self, window_minutes: int, threshold: float = 3.0) -> None:
+        self.window_minutes = window_minutes
+        self.threshold = threshold
+        self.history: dict[str, deque[list[Any]]] = defaultdict(deque)
+
+    def update(self, host: str, app: str, severity: str, timestamp: datetime) -> tuple[bool, float]:
+        key = f"{host}|{app}|{severity}"
+        bucket_ts = timestamp.replace(second=0, microsecond=0)
+        series = self.history[key]
+        if series and series[-1][0] == bucket_ts:
+            series[-1][1] += 1
+        else:
+            series.append([bucket_ts, 1])
+        limit = bucket_ts - timedelta(minutes=self.window_minutes)
+        while series and series[0][0] < limit:
+            series.popleft()
+        values = [value for _, value in series]
+        if len(values) < LEGACY_MIN_POINTS:
+            return False, 0.0
+        mean = sum(values) / len(values)
+        std = (sum((val - mean) ** 2 for val in values) / len(values)) ** 0.5
+        if std == 0:
+            return False, 0.0
+        z_score = (series[-1][1] - mean) / std
+        return z_score >= self.threshold, z_score
+
+
+def build_events(
+    series: int, minutes: int, per_minute: int, rng: random.Random,
+) -> list[tuple[str, str, str, datetime]]:
+    start = datetime(2024, 1, 1, tzinfo=UTC)
+    events = []
+    for minute in range(minutes):
+        ts = start + timedelta(minutes=minute, seconds=1)
+        for _ in range(per_minute):
+            index = rng.randrange(series)
+            events.append((f"host{index % 5000}", f"app{index // 5000}", "info", ts))
+    return events
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--series", type=int, default=100_000)
+    parser.add_argument("--minutes", type=int, default=10)
+    parser.add_argument("--per-minute", type=int, default=50_000)
+    parser.add_argument("--window", type=int, default=30)
+    args = parser.parse_args()
+
+    rng = random.Random(7)  # noqa: S311 - детермінований набір для бенчмарку
+    events = build_events(args.series, args.minutes, args.per_minute, rng)
+    print(f"{len(events):,} подій, {args.series:,} серій, вікно {args.window} хв")
+    detectors: list[tuple[str, Any]] = [
+        ("incremental", AnomalyDetector(window_minutes=args.window)),
+        ("legacy", LegacyDetector(window_minutes=args.window)),
+    ]
+    if VectorizedAnomalyDetector is not None:
+        detectors.append(("numpy", VectorizedAnomalyDetector(window_minutes=args.window)))
+        detectors.append(
+            ("numpy-mad", VectorizedAnomalyDetector(window_minutes=args.window, method="mad")),
+        )
+    end = events[-1][3] + timedelta(minutes=1)
+    for name, detector in detectors:
+        started = time.perf_counter()
+        for host, app, severity, ts in events:
+            detector.update(host, app, severity, ts)
+        if hasattr(detector, "tick"):
+            detector.tick(end)
+        elapsed = time.perf_counter() - started
+        print(
+            f"{name:>12}: {len(events) / elapsed:>12,.0f} подій/с, "
+            f"{elapsed * 1e9 / len(events):>7,.0f} нс/подію",
+        )
+
+
+if __name__ == "__main__":
+    main()
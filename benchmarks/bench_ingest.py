@@ -0,0 +1,131 @@
+"""Бенчмарк ``POST /ingest``: затримка малих запитів, поки розбираються великі.
+
+Запуск: ``python benchmarks/bench_ingest.py [--large 2] [--large-mb 8] [--workers 2]``.
+Запити йдуть в один цикл подій через ASGI-транспорт httpx, тож видно саме
+блокування циклу. Режим ``inline`` — розбір у обробнику, як було раніше,
+``pool`` — ``ParsePool`` з процесами. Для кожного режиму друкується
+пропускна здатність великих тіл (рядків/с) і p50/p99/max малих запитів.
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT / "src"))
+for _name, _value in {
+    "TG_BOT_TOKEN": "bench",
+    "DATABASE_URL": "sqlite+aiosqlite:///:memory:",
+    "REDIS_URL": "redis://localhost:6379/0",
+    "API_AUTH_TOKEN": "bench",
+}.items():
+    os.environ.setdefault(_name, _value)
+
+import httpx  # noqa: E402
+
+from cortexwatcher.api.main import app  # noqa: E402
+from cortexwatcher.parsers.parallel import ParsePool  # noqa: E402
+from cortexwatcher.storage.clickhouse import ClickHouseStorage  # noqa: E402
+
+HEADERS = {"X-API-Token": os.environ["API_AUTH_TOKEN"]}
+SMALL_BODY = {"content": '{"host": "web", "app": "nginx", "message": "GET / 200"}'}
+SMALL_INTERVAL = 0.01
+
+
+def _syslog_body(megabytes: int) -> tuple[dict[str, str], int]:
+    line = (
+        "<34>Oct 11 22:14:15 web-{host} sshd[{pid}]: "
+        "Failed password for root from 10.0.{a}.{b} port 22\n"
+    )
+    lines = []
+    size = 0
+    index = 0
+    while size < megabytes * 1024 * 1024:
+        text = line.format(host=index % 50, pid=1000 + index % 9000, a=index % 250, b=index % 200)
+        lines.append(text)
+        size += len(text)
+        index += 1
+    return {"content": "".join(lines)}, index
+
+
+async def _run(pool: ParsePool | None, large: int, body: dict[str, str], lines: int) -> str:
+    app.state.storage = ClickHouseStorage("http://bench")
+    app.state.parse_pool = pool
+    if pool is not None:
+        await pool.start()
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(
+        transport=transport,
+        base_url="http://bench",
+        timeout=None,  # noqa: S113 - бенчмарк міряє повну затримку без обриву
+    ) as client:
+        latencies: list[float] = []
+        done = asyncio.Event()
+
+        async def small_request(scheduled: float) -> None:
+            response = await client.post("/ingest/small", json=SMALL_BODY, headers=HEADERS)
+            response.raise_for_status()
+            latencies.append(time.perf_counter() - scheduled)
+
+        async def small_requests() -> None:
+            # Затримка рахується від запланованого моменту, а не від фактичної
+            # відправки: інакше час, поки цикл заблоковано, випадає з вимірів
+            tasks = []
+            began = time.perf_counter()
+            index = 0
+            while not done.is_set():
+                scheduled = began + index * SMALL_INTERVAL
+                await asyncio.sleep(max(0.0, scheduled - time.perf_counter()))
+                tasks.append(asyncio.create_task(small_request(scheduled)))
+                index += 1
+            await asyncio.gather(*tasks)
+
+        async def large_requests() -> float:
+            started = time.perf_counter()
+            responses = await asyncio.gather(
+                *(client.post("/ingest/large", json=body, headers=HEADERS) for _ in range(large)),
+            )
+            elapsed = time.perf_counter() - started
+            for response in responses:
+                response.raise_for_status()
+            done.set()
+            return elapsed
+
+        small_task = asyncio.create_task(small_requests())
+        await asyncio.sleep(0.2)
+        elapsed = await large_requests()
+        await small_task
+
+    latencies.sort()
+    p99 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))]
+    return (
+        f"{large * lines / elapsed:>12,.0f} {len(latencies):>7} "
+        f"{statistics.median(latencies) * 1000:>8.1f} {p99 * 1000:>8.1f} "
+        f"{latencies[-1] * 1000:>8.1f}"
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--large", type=int, default=2, help="скільки великих запитів одночасно")
+    parser.add_argument("--large-mb", type=int, default=8)
+    parser.add_argument("--workers", type=int, default=2)
+    args = parser.parse_args()
+
+    body, lines = _syslog_body(args.large_mb)
+    print(f"{'mode':>8} {'large ln/s':>12} {'small':>7} {'p50 ms':>8} {'p99 ms':>8} {'max ms':>8}")
+    print(f"{'inline':>8} {asyncio.run(_run(None, args.large, body, lines))}")
+    pool = ParsePool(args.workers, inline_max_chars=256 * 1024, chunk_chars=1024 * 1024)
+    try:
+        print(f"{'pool':>8} {asyncio.run(_run(pool, args.large, body, lines))}")
+    finally:
+        pool.close()
+
+
+if __name__ == "__main__":
+    main()
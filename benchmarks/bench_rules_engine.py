@@ -0,0 +1,157 @@
+"""Бенчмарк рушія правил: повідомлень/сек для 10, 100 та 1000 правил.
+
+Запуск: ``python benchmarks/bench_rules_engine.py [--messages 20000]``.
+Для порівняння поруч вимірюється попередня реалізація, яка компілювала
+шаблони на кожне повідомлення.
+"""
+from __future__ import annotations
+
+import argparse
+import fnmatch
+import functools
+import os
+import random
+import re
+import string
+import sys
+import tempfile
+import time
+from collections.abc import Callable, Sequence
+from pathlib import Path
+from typing import Any
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT / "src"))
+for _name, _value in {
+    "TG_BOT_TOKEN": "bench",
+    "DATABASE_URL": "sqlite+aiosqlite:///:memory:",
+    "REDIS_URL": "redis://localhost:6379/0",
+    "API_AUTH_TOKEN": "bench",
+}.items():
+    os.environ.setdefault(_name, _value)
+
+import yaml  # noqa: E402
+
+from cortexwatcher.analyzer.rules_engine import Rule, RuleEngine  # noqa: E402
+
+APPS = ["sshd", "nginx", "cron", "kernel", "postfix", "dockerd"]
+# З кожних десяти згенерованих правил: 7 літеральних, 2 regex, решта — glob
+LITERAL_RULES_PER_TEN = 7
+REGEX_RULES_PER_TEN = 2
+
+
+def _word(rng: random.Random, low: int = 4, high: int = 10) -> str:
+    return "".join(rng.choice(string.ascii_lowercase) for _ in range(rng.randint(low, high)))
+
+
+def build_rules(count: int, rng: random.Random) -> list[dict[str, Any]]:
+    """Генерує суміш літеральних, regex та glob правил."""
+
+    rules: list[dict[str, Any]] = []
+    for index in range(count):
+        kind = index % 10
+        if kind < LITERAL_RULES_PER_TEN:
+            patterns = [f"{_word(rng)} {_word(rng)}", _word(rng, 6, 12)]
+        elif kind < LITERAL_RULES_PER_TEN + REGEX_RULES_PER_TEN:
+            patterns = [f"/{_word(rng, 3, 5)}\\s+\\d{{2,4}}/"]
+        else:
+            patterns = [f"*{_word(rng, 4, 6)}*"]
+        filters: dict[str, list[str]] = {}
+        if index % 2 == 0:
+            filters["app"] = [rng.choice(APPS)]
+        rules.append(
+            {
+                "id": f"rule_{index}",
+                "title": "bench",
+                "description": "",
+                "severity": 5,
+                "patterns": patterns,
+                "filters": filters,
+            },
+        )
+    rules.append(
+        {
+            "id": "ssh_failed",
+            "title": "bench",
+            "description": "",
+            "severity": 6,
+            "patterns": ["Failed password"],
+            "filters": {"app": ["sshd"]},
+        },
+    )
+    return rules
+
+
+def build_messages(count: int, rng: random.Random) -> list[dict[str, Any]]:
+    messages = []
+    for index in range(count):
+        text = " ".join(_word(rng, 2, 9) for _ in range(20))
+        if index % 10 == 0:
+            text = f"Failed password for root from 10.0.0.{index % 255} port 22 ssh2"
+        messages.append(
+            {"msg": text, "host": f"host{index % 50}", "app": rng.choice(APPS), "severity": "info"},
+        )
+    return messages
+
+
+def _legacy_pattern_matches(pattern: str, message: str) -> bool:
+    if pattern.startswith("/") and pattern.endswith("/"):
+        try:
+            return bool(re.compile(pattern.strip("/"), re.IGNORECASE).search(message))
+        except re.error:
+            return False
+    if any(char in pattern for char in "*?[]"):
+        return fnmatch.fnmatch(message.lower(), pattern.lower())
+    return pattern.lower() in message.lower()
+
+
+def _legacy_match(rules: Sequence[Rule], record: dict[str, Any]) -> list[Rule]:
+    message = str(record.get("msg") or "")
+    matched = []
+    for rule in rules:
+        passed = True
+        for key, allowed in rule.filters.items():
+            value = record.get(key)
+            if allowed and (
+                value is None or not any(fnmatch.fnmatch(str(value), p) for p in allowed)
+            ):
+                passed = False
+                break
+        if not passed:
+            continue
+        if rule.patterns and not any(
+            _legacy_pattern_matches(p, message) for p in rule.patterns if p
+        ):
+            continue
+        matched.append(rule)
+    return matched
+
+
+def _measure(func: Callable[[dict[str, Any]], object], messages: Sequence[dict[str, Any]]) -> float:
+    started = time.perf_counter()
+    for record in messages:
+        func(record)
+    return len(messages) / (time.perf_counter() - started)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--messages", type=int, default=20000)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10, 100, 1000])
+    args = parser.parse_args()
+
+    rng = random.Random(42)  # noqa: S311 - відтворювані тестові дані, не криптографія
+    messages = build_messages(args.messages, rng)
+    print(f"{'rules':>6} {'compiled msg/s':>16} {'legacy msg/s':>14} {'speedup':>8}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for size in args.sizes:
+            path = Path(tmp) / f"rules_{size}.yaml"
+            path.write_text(yaml.safe_dump(build_rules(size, rng)), encoding="utf-8")
+            engine = RuleEngine(path)
+            compiled = _measure(engine.match, messages)
+            legacy = _measure(functools.partial(_legacy_match, engine.rules), messages)
+            print(f"{size:>6} {compiled:>16,.0f} {legacy:>14,.0f} {compiled / legacy:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+"""Бенчмарк розбору часових міток: мітки/сек для кожного формату.
+
+Запуск: ``python benchmarks/bench_timestamps.py [--count 20000]``.
+Для порівняння поруч вимірюється попередній шлях через ``dateutil``
+(для RFC3164 — з ``datetime.now()`` на кожен рядок, як було в
+``parse_syslog``).
+"""
+from __future__ import annotations
+
+import argparse
+import os
+import sys
+import time
+from collections.abc import Callable, Sequence
+from datetime import UTC, datetime, timedelta
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT / "src"))
+for _name, _value in {
+    "TG_BOT_TOKEN": "bench",
+    "DATABASE_URL": "sqlite+aiosqlite:///:memory:",
+    "REDIS_URL": "redis://localhost:6379/0",
+    "API_AUTH_TOKEN": "bench",
+}.items():
+    os.environ.setdefault(_name, _value)
+
+from dateutil import parser as date_parser  # noqa: E402
+
+from cortexwatcher.parsers.timestamps import parse_rfc3164, parse_timestamp  # noqa: E402
+
+START = datetime(2026, 10, 12, 8, 0, tzinfo=UTC)
+# Типова пачка: близько 20 рядків на секунду, тож мітки RFC3164 повторюються
+LINES_PER_SECOND = 20
+
+FORMATS: dict[str, Callable[[datetime], str]] = {
+    "rfc5424": lambda ts: ts.isoformat(timespec="milliseconds").replace("+00:00", "Z"),
+    "suricata": lambda ts: ts.strftime("%Y-%m-%dT%H:%M:%S.%f+0000"),
+    "wazuh": lambda ts: ts.strftime("%Y-%m-%dT%H:%M:%S.") + f"{ts.microsecond // 1000:03d}+0000",
+    "clf": lambda ts: ts.strftime("%d/%b/%Y:%H:%M:%S +0000"),
+    "rfc2822": lambda ts: ts.strftime("%a, %d %b %Y %H:%M:%S +0000"),
+    "rfc3164": lambda ts: ts.strftime("%b %e %H:%M:%S"),
+}
+
+
+def _legacy(value: str) -> datetime | None:
+    # Як колишній coerce_timestamp: нерозпізнаний рядок дає None (CLF dateutil не розбирає)
+    try:
+        ts = date_parser.parse(value)
+    except (ValueError, TypeError):
+        return None
+    if ts.tzinfo is None:
+        return ts.replace(tzinfo=UTC)
+    return ts.astimezone(UTC)
+
+
+def _legacy_rfc3164(value: str) -> datetime:
+    now = datetime.now(UTC)
+    ts = date_parser.parse(value, default=now)
+    return ts.replace(tzinfo=UTC).replace(year=now.year)
+
+
+def _fast_rfc3164(year: int) -> Callable[[str], object]:
+    return lambda value: parse_rfc3164(value, year)
+
+
+def _measure(func: Callable[[str], object], values: Sequence[str]) -> float:
+    started = time.perf_counter()
+    for value in values:
+        func(value)
+    return len(values) / (time.perf_counter() - started)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--count", type=int, default=20000)
+    args = parser.parse_args()
+
+    moments = [
+        START + timedelta(seconds=index // LINES_PER_SECOND, milliseconds=index % 1000)
+        for index in range(args.count)
+    ]
+    print(f"{'format':>10} {'fast ts/s':>12} {'dateutil ts/s':>14} {'speedup':>8}")
+    for name, render in FORMATS.items():
+        values = [render(moment) for moment in moments]
+        if name == "rfc3164":
+            parse_rfc3164.cache_clear()
+            fast = _measure(_fast_rfc3164(START.year), values)
+            legacy = _measure(_legacy_rfc3164, values)
+        else:
+            fast = _measure(parse_timestamp, values)
+            legacy = _measure(_legacy, values)
+        print(f"{name:>10} {fast:>12,.0f} {legacy:>14,.0f} {fast / legacy:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,10 +1,18 @@
-"""Виявлення аномалій на основі ковзного вікна."""
+"""Виявлення аномалій: ковзне вікно та потокові базові лінії (EWMA, Holt-Winters)."""
 from __future__ import annotations
 
-from collections import defaultdict, deque
+import fnmatch
+import math
+import struct
+import sys
+from array import array
+from collections import OrderedDict
+from collections.abc import Iterable, Sequence
 from dataclasses import dataclass
-from datetime import datetime, timedelta
-from typing import Deque, Dict, List, Tuple
+from datetime import UTC, datetime
+from typing import ClassVar, Protocol
+
+from cortexwatcher.analyzer.metrics import ANOMALY_SERIES_EVICTED, ANOMALY_SERIES_TRACKED
 
 
 @dataclass
@@ -13,47 +21,571 @@ class WindowStat:
     value: int
 
 
+@dataclass
+class AnomalyHit:
+    """Аномальна хвилина серії, виявлена при закритті кошика."""
+
+    signal: str
+    score: float
+    timestamp: datetime
+    value: int
+
+
+class AnomalyBackend(Protocol):
+    """Спільний інтерфейс бекендів детектора для ``_evaluate_log``.
+
+    ``update`` враховує подію й, якщо бекенд оцінює події поштучно, одразу
+    повертає результат; бекенди, що рахують пакетно, віддають аномалії з
+    ``tick`` після закриття хвилини.
+    """
+
+    window_minutes: int
+
+    def update(
+        self, host: str | None, app: str | None, severity: str | None, timestamp: datetime,
+    ) -> tuple[bool, float]: ...
+
+    def tick(self, now: datetime | None = None) -> list[AnomalyHit]: ...
+
+    def report_metrics(self) -> None: ...
+
+    def snapshot(self) -> dict[str, list[WindowStat]]: ...
+
+
+_SERIES_HEADER = struct.Struct("<qHHQQ")
+# z-score рахується лише від трьох заповнених хвилин і ненульової дисперсії
+_MIN_FILLED = 3
+_MIN_VARIANCE = 1e-12
+
+
+class _Series:
+    """Кільце хвилинних кошиків із поточними сумою та сумою квадратів.
+
+    Пропущені хвилини явно заповнюються нулями, тож середнє й дисперсія
+    рахуються по всіх хвилинах вікна. Оновлення коштує O(1) (зсув кільця —
+    не більше розміру вікна) і не перебирає історію. Кошики зберігаються
+    компактним ``array``, а сам обʼєкт не має ``__dict__``.
+    """
+
+    __slots__ = ("counts", "head", "pos", "total", "total_sq", "filled")
+
+    TAG: ClassVar[int] = 0
+    RETAIN_MINUTES: ClassVar[int] = 0
+
+    def __init__(self, size: int, minute: int) -> None:
+        self.counts: array[int] = array("I", bytes(4 * size))
+        self.head = minute
+        self.pos = 0
+        self.total = 0
+        self.total_sq = 0
+        self.filled = 1
+
+    def add(self, minute: int) -> None:
+        counts = self.counts
+        size = len(counts)
+        if minute > self.head:
+            gap = minute - self.head
+            if gap >= size:
+                for index in range(size):
+                    counts[index] = 0
+                self.total = 0
+                self.total_sq = 0
+                self.pos = 0
+            else:
+                pos = self.pos
+                for _ in range(gap):
+                    pos = (pos + 1) % size
+                    stale = counts[pos]
+                    if stale:
+                        self.total -= stale
+                        self.total_sq -= stale * stale
+                        counts[pos] = 0
+                self.pos = pos
+            self.filled = min(self.filled + gap, size)
+            self.head = minute
+            slot = self.pos
+        elif self.head - minute < self.filled:
+            slot = (self.pos - (self.head - minute)) % size
+        else:
+            # Подія старша за вікно — базову лінію не змінює
+            return
+        value = counts[slot]
+        counts[slot] = value + 1
+        self.total += 1
+        self.total_sq += 2 * value + 1
+
+    def score(self) -> float | None:
+        """z-score поточної хвилини або None, якщо даних замало."""
+
+        filled = self.filled
+        if filled < _MIN_FILLED:
+            return None
+        mean = self.total / filled
+        variance = self.total_sq / filled - mean * mean
+        if variance <= _MIN_VARIANCE:
+            return None
+        return (self.counts[self.pos] - mean) / math.sqrt(variance)
+
+    def values(self) -> list[int]:
+        size = len(self.counts)
+        start = self.pos - self.filled + 1
+        return [self.counts[(start + offset) % size] for offset in range(self.filled)]
+
+    def to_bytes(self) -> bytes:
+        """Упаковує серію: голова, позиція, заповненість, суми й кошики (little-endian)."""
+
+        counts = self.counts
+        if sys.byteorder != "little":
+            counts = array("I", counts)
+            counts.byteswap()
+        header = _SERIES_HEADER.pack(self.head, self.pos, self.filled, self.total, self.total_sq)
+        return header + counts.tobytes()
+
+    @classmethod
+    def from_bytes(cls, data: bytes, size: int) -> _Series:
+        """Відновлює серію; ValueError, якщо розмір кільця не збігається."""
+
+        if len(data) != _SERIES_HEADER.size + 4 * size:
+            raise ValueError("Розмір серії не відповідає вікну")
+        head, pos, filled, total, total_sq = _SERIES_HEADER.unpack_from(data)
+        if pos >= size or not 1 <= filled <= size:
+            raise ValueError("Пошкоджена серія")
+        series = cls.__new__(cls)
+        counts = array("I")
+        counts.frombytes(data[_SERIES_HEADER.size:])
+        if sys.byteorder != "little":
+            counts.byteswap()
+        series.counts = counts
+        series.head = head
+        series.pos = pos
+        series.filled = filled
+        series.total = total
+        series.total_sq = total_sq
+        return series
+
+
+_EWMA_STATE = struct.Struct("<qIddI")
+_HW_STATE = struct.Struct("<qIdddI")
+# Скільки пропущених хвилин максимум доганяємо нулями при поверненні серії
+_MAX_CATCH_UP = 24 * 60
+
+
+class _Ewma:
+    """Потокові EWMA-середнє та дисперсія хвилинних лічильників.
+
+    Поточна хвилина накопичується в ``current`` і оцінюється відносно
+    середнього всіх попередніх; у модель вона потрапляє при закритті,
+    тож оновлення коштує O(1) і не потребує історії.
+    """
+
+    __slots__ = ("head", "current", "mean", "var", "seen")
+
+    TAG: ClassVar[int] = 1
+    RETAIN_MINUTES: ClassVar[int] = 0
+    ALPHA: ClassVar[float] = 0.1
+    WARMUP: ClassVar[int] = 10
+
+    def __init__(self, minute: int) -> None:
+        self.head = minute
+        self.current = 0
+        self.mean = 0.0
+        self.var = 0.0
+        self.seen = 0
+
+    def add(self, minute: int) -> None:
+        if minute > self.head:
+            self._fold(self.current)
+            for _ in range(min(minute - self.head - 1, _MAX_CATCH_UP)):
+                self._fold(0)
+            self.head = minute
+            self.current = 0
+        elif minute < self.head:
+            # Закриту хвилину вже враховано в моделі
+            return
+        self.current += 1
+
+    def _fold(self, value: float) -> None:
+        if not self.seen:
+            self.mean = value
+        else:
+            alpha = self.ALPHA
+            delta = value - self.mean
+            self.mean += alpha * delta
+            self.var = (1 - alpha) * (self.var + alpha * delta * delta)
+        self.seen += 1
+
+    def forecast(self) -> float:
+        return self.mean
+
+    def score(self) -> float | None:
+        if self.seen < self.WARMUP or self.var <= _MIN_VARIANCE:
+            return None
+        return (self.current - self.forecast()) / math.sqrt(self.var)
+
+    def values(self) -> list[int]:
+        return [self.current]
+
+    def to_bytes(self) -> bytes:
+        return _EWMA_STATE.pack(self.head, self.current, self.mean, self.var, self.seen)
+
+    @classmethod
+    def from_bytes(cls, data: bytes, size: int) -> _Ewma:
+        if len(data) != _EWMA_STATE.size:
+            raise ValueError("Пошкоджений стан EWMA")
+        series = cls.__new__(cls)
+        series.head, series.current, series.mean, series.var, series.seen = _EWMA_STATE.unpack(data)
+        return series
+
+
+class _HoltWinters:
+    """Адитивний Holt-Winters із сезонністю по годинних слотах.
+
+    Рівень і тренд оновлюються щохвилини, а сезонна поправка та залишкова
+    дисперсія (EWMA квадратів похибки прогнозу) зберігаються в ``SLOTS``
+    годинних слотах (24 на добу чи 168 на тиждень) компактними
+    ``array('f')``. Тож денний підйом трафіку, вивчений сезонною складовою,
+    не дає сплеску z-score, а денний шум не порівнюється з нічним.
+    """
+
+    __slots__ = ("head", "current", "level", "trend", "var", "seen", "season", "season_var")
+
+    TAG: ClassVar[int] = 2
+    SLOTS: ClassVar[int] = 24
+    SLOT_MINUTES: ClassVar[int] = 60
+    ALPHA: ClassVar[float] = 0.005
+    BETA: ClassVar[float] = 0.001
+    GAMMA: ClassVar[float] = 0.05
+    RHO: ClassVar[float] = 0.05
+    WARMUP: ClassVar[int] = 60
+    # Вивчену сезонність не викидаємо через нічне затишшя
+    RETAIN_MINUTES: ClassVar[int] = 24 * 60
+
+    def __init__(self, minute: int) -> None:
+        self.head = minute
+        self.current = 0
+        self.level = 0.0
+        self.trend = 0.0
+        self.var = 0.0
+        self.seen = 0
+        self.season = array("f", bytes(4 * self.SLOTS))
+        self.season_var = array("f", bytes(4 * self.SLOTS))
+
+    def _slot(self, minute: int) -> int:
+        return (minute // self.SLOT_MINUTES) % self.SLOTS
+
+    def add(self, minute: int) -> None:
+        if minute > self.head:
+            self._fold(self.head, self.current)
+            gap = minute - self.head - 1
+            start = self.head + 1 + max(gap - _MAX_CATCH_UP, 0)
+            for missing in range(start, minute):
+                self._fold(missing, 0)
+            self.head = minute
+            self.current = 0
+        elif minute < self.head:
+            return
+        self.current += 1
+
+    def _fold(self, minute: int, value: float) -> None:
+        slot = self._slot(minute)
+        season = self.season[slot]
+        if not self.seen:
+            self.level = value - season
+        else:
+            error = value - (self.level + self.trend + season)
+            squared = error * error
+            self.var = (1 - self.RHO) * self.var + self.RHO * squared
+            slot_var = self.season_var[slot]
+            if slot_var > 0:
+                squared = (1 - self.RHO) * slot_var + self.RHO * squared
+            self.season_var[slot] = squared
+            level = self.ALPHA * (value - season) + (1 - self.ALPHA) * (self.level + self.trend)
+            self.trend = self.BETA * (level - self.level) + (1 - self.BETA) * self.trend
+            self.level = level
+        self.season[slot] = self.GAMMA * (value - self.level) + (1 - self.GAMMA) * season
+        self.seen += 1
+
+    def forecast(self) -> float:
+        return self.level + self.trend + self.season[self._slot(self.head)]
+
+    def score(self) -> float | None:
+        if self.seen < self.WARMUP:
+            return None
+        # Поки слот не вивчено, спираємося на загальну дисперсію
+        variance = self.season_var[self._slot(self.head)] or self.var
+        if variance <= _MIN_VARIANCE:
+            return None
+        return (self.current - self.forecast()) / math.sqrt(variance)
+
+    def values(self) -> list[int]:
+        return [self.current]
+
+    def to_bytes(self) -> bytes:
+        header = _HW_STATE.pack(
+            self.head, self.current, self.level, self.trend, self.var, self.seen,
+        )
+        arrays = array("f", self.season)
+        arrays.extend(self.season_var)
+        if sys.byteorder != "little":
+            arrays.byteswap()
+        return header + arrays.tobytes()
+
+    @classmethod
+    def from_bytes(cls, data: bytes, size: int) -> _HoltWinters:
+        if len(data) != _HW_STATE.size + 8 * cls.SLOTS:
+            raise ValueError("Пошкоджений стан Holt-Winters")
+        series = cls.__new__(cls)
+        (
+            series.head, series.current, series.level, series.trend, series.var, series.seen,
+        ) = _HW_STATE.unpack_from(data)
+        arrays = array("f")
+        arrays.frombytes(data[_HW_STATE.size:])
+        if sys.byteorder != "little":
+            arrays.byteswap()
+        series.season = arrays[: cls.SLOTS]
+        series.season_var = arrays[cls.SLOTS:]
+        return series
+
+
+class _HoltWintersWeekly(_HoltWinters):
+    """Holt-Winters із тижневим періодом (168 годинних слотів)."""
+
+    __slots__ = ()
+
+    TAG: ClassVar[int] = 3
+    SLOTS: ClassVar[int] = 24 * 7
+    RETAIN_MINUTES: ClassVar[int] = 7 * 24 * 60
+
+
+_AnySeries = _Series | _Ewma | _HoltWinters
+_StreamingModel = type[_Ewma] | type[_HoltWinters]
+
+# Назва моделі -> клас потокової базової лінії; "window" — ковзне вікно
+MODELS: dict[str, _StreamingModel | None] = {
+    "window": None,
+    "ewma": _Ewma,
+    "hw_daily": _HoltWinters,
+    "hw_weekly": _HoltWintersWeekly,
+}
+_BY_TAG: dict[int, type[_Series] | _StreamingModel] = {
+    model.TAG: model for model in (_Series, _Ewma, _HoltWinters, _HoltWintersWeekly)
+}
+
+
+def pack_series(series: _AnySeries) -> bytes:
+    """Упаковує серію будь-якої моделі з байтом-тегом моделі на початку."""
+
+    return bytes((series.TAG,)) + series.to_bytes()
+
+
+def unpack_series(data: bytes, size: int) -> _AnySeries:
+    if not data:
+        raise ValueError("Порожня серія")
+    model = _BY_TAG.get(data[0])
+    if model is None:
+        raise ValueError(f"Невідома модель серії: {data[0]}")
+    return model.from_bytes(data[1:], size)
+
+
+def _minute(timestamp: datetime) -> int:
+    if timestamp.tzinfo is None:
+        timestamp = timestamp.replace(tzinfo=UTC)
+    return int(timestamp.timestamp() // 60)
+
+
 class AnomalyDetector:
-    """Обчислює z-score для сигналів (host+app+severity)."""
+    """Обчислює z-score для сигналів (host+app+severity).
 
-    def __init__(self, window_minutes: int, threshold: float = 3.0) -> None:
+    Модель базової лінії обирається для сигналу за першим збігом glob-шаблону
+    з ``models`` (``window`` — ковзне вікно, ``ewma``, ``hw_daily``,
+    ``hw_weekly``), інакше використовується ``default_model``.
+
+    Кількість серій обмежена ``max_series``: серії впорядковані за останнім
+    оновленням, тож при переповненні витісняється найдавніша, а серії без
+    подій довше за ``idle_minutes`` прибираються, щойно настає нова хвилина.
+    Для прибирання кожна модель із власним ``RETAIN_MINUTES`` має окрему
+    чергу за останнім оновленням: сезонні серії, що переживають затишшя до
+    повного періоду, не затримують витіснення звичайних, а кожна черга
+    зупиняється на першій свіжій серії (кожна серія витісняється один раз,
+    тож амортизовано це O(1) на оновлення).
+    """
+
+    def __init__(  # noqa: PLR0913 - налаштування детектора з конфігурації
+        self,
+        window_minutes: int,
+        threshold: float = 3.0,
+        max_series: int = 100_000,
+        idle_minutes: int | None = None,
+        *,
+        models: Sequence[tuple[str, str]] = (),
+        default_model: str = "window",
+    ) -> None:
+        for _, name in (*models, ("*", default_model)):
+            if name not in MODELS:
+                raise ValueError(f"Невідома модель аномалій: {name}")
         self.window_minutes = window_minutes
         self.threshold = threshold
-        self.history: Dict[str, Deque[WindowStat]] = defaultdict(deque)
+        self.max_series = max_series
+        if idle_minutes is None:
+            idle_minutes = max(window_minutes * 2, 10)
+        self.idle_minutes = idle_minutes
+        self.models: tuple[tuple[str, _StreamingModel | None], ...] = tuple(
+            (pattern, MODELS[name]) for pattern, name in models
+        )
+        self.default_model = MODELS[default_model]
+        self.history: OrderedDict[str, _AnySeries] = OrderedDict()
+        # RETAIN_MINUTES -> ключі серій цієї тривалості за останнім оновленням
+        self._expiry: dict[int, OrderedDict[str, None]] = {}
+        self.evicted: dict[str, int] = {"capacity": 0, "idle": 0}
+        self._swept_minute = 0
+        self._dirty: set[str] | None = None
+        self._removed: set[str] = set()
 
     def _key(self, host: str | None, app: str | None, severity: str | None) -> str:
-        return "|".join(filter(None, [host or "*", app or "*", severity or "*"]))
+        return f"{host or '*'}|{app or '*'}|{severity or '*'}"
 
-    def update(self, host: str | None, app: str | None, severity: str | None, timestamp: datetime) -> Tuple[bool, float]:
+    def update(
+        self, host: str | None, app: str | None, severity: str | None, timestamp: datetime,
+    ) -> tuple[bool, float]:
         key = self._key(host, app, severity)
-        bucket_ts = timestamp.replace(second=0, microsecond=0)
-        series = self.history[key]
-        if series and series[-1].timestamp == bucket_ts:
-            series[-1].value += 1
+        minute = _minute(timestamp)
+        history = self.history
+        series = history.get(key)
+        if series is None:
+            series = self._new_series(key, minute)
+            history[key] = series
+            self._expiry_queue(series)[key] = None
+            if len(history) > self.max_series:
+                victim, evicted = history.popitem(last=False)
+                del self._expiry_queue(evicted)[victim]
+                self._record_eviction(victim, "capacity")
         else:
-            series.append(WindowStat(timestamp=bucket_ts, value=1))
-        self._trim(series, bucket_ts)
-        values = [stat.value for stat in series]
-        if len(values) < 3:
-            return False, 0.0
-        mean = sum(values) / len(values)
-        variance = sum((val - mean) ** 2 for val in values) / len(values)
-        std = variance ** 0.5
-        if std == 0:
+            history.move_to_end(key)
+            self._expiry_queue(series).move_to_end(key)
+        series.add(minute)
+        if self._dirty is not None:
+            self._dirty.add(key)
+        if minute > self._swept_minute:
+            self._sweep_idle(minute)
+        z_score = series.score()
+        if z_score is None:
             return False, 0.0
-        current = series[-1].value
-        z_score = (current - mean) / std
         return z_score >= self.threshold, z_score
 
-    def _trim(self, series: Deque[WindowStat], current_ts: datetime) -> None:
-        limit = current_ts - timedelta(minutes=self.window_minutes)
-        while series and series[0].timestamp < limit:
-            series.popleft()
+    def _new_series(self, key: str, minute: int) -> _AnySeries:
+        model = self.default_model
+        for pattern, candidate in self.models:
+            if fnmatch.fnmatchcase(key, pattern):
+                model = candidate
+                break
+        if model is None:
+            # Поточна хвилина плюс window_minutes попередніх
+            return _Series(self.window_minutes + 1, minute)
+        return model(minute)
+
+    def _expiry_queue(self, series: _AnySeries) -> OrderedDict[str, None]:
+        queue = self._expiry.get(series.RETAIN_MINUTES)
+        if queue is None:
+            queue = self._expiry[series.RETAIN_MINUTES] = OrderedDict()
+        return queue
+
+    def _sweep_idle(self, minute: int) -> None:
+        self._swept_minute = minute
+        history = self.history
+        idle_before = minute - self.idle_minutes
+        for retain, queue in self._expiry.items():
+            # Сезонні моделі переживають затишшя до повного періоду
+            expire_before = min(idle_before, minute - retain + 1)
+            while queue:
+                key = next(iter(queue))
+                if history[key].head >= expire_before:
+                    break
+                del queue[key]
+                del history[key]
+                self._record_eviction(key, "idle")
+
+    def _record_eviction(self, key: str, reason: str) -> None:
+        self.evicted[reason] += 1
+        ANOMALY_SERIES_EVICTED.labels(reason=reason).inc()
+        if self._dirty is not None:
+            self._dirty.discard(key)
+            self._removed.add(key)
+
+    def track_changes(self) -> None:
+        """Вмикає облік змінених і видалених серій для інкрементальних знімків."""
+
+        if self._dirty is None:
+            self._dirty = set()
+
+    def drain_changes(self) -> tuple[set[str], set[str]]:
+        """Повертає й скидає множини змінених та видалених з останнього виклику серій."""
+
+        dirty, removed = self._dirty or set(), self._removed
+        if self._dirty is not None:
+            self._dirty = set()
+        self._removed = set()
+        return dirty, removed
+
+    def export_series(self, key: str) -> bytes | None:
+        series = self.history.get(key)
+        return pack_series(series) if series is not None else None
+
+    def restore_series(self, items: Iterable[tuple[str, bytes]]) -> int:
+        """Завантажує упаковані серії; пошкоджені пропускаються. Повертає кількість."""
+
+        size = self.window_minutes + 1
+        restored: list[tuple[str, _AnySeries]] = []
+        for key, data in items:
+            try:
+                restored.append((key, unpack_series(data, size)))
+            except (ValueError, struct.error):
+                continue
+        # Найсвіжіші серії мають опинитися в кінці черги витіснення
+        restored.sort(key=lambda item: item[1].head)
+        history = self.history
+        for key, series in restored[-self.max_series:]:
+            history.pop(key, None)
+            history[key] = series
+        while len(history) > self.max_series:
+            history.popitem(last=False)
+        self._expiry = {}
+        for key, series in history.items():
+            self._expiry_queue(series)[key] = None
+        return min(len(restored), self.max_series)
+
+    def tick(self, now: datetime | None = None) -> list[AnomalyHit]:
+        """Події оцінюються в ``update``, тож відкладених аномалій немає."""
+
+        return []
+
+    def report_metrics(self) -> None:
+        """Оновлює gauge кількості серій (викликається раз на цикл аналізатора)."""
+
+        ANOMALY_SERIES_TRACKED.set(len(self.history))
 
-    def snapshot(self) -> Dict[str, List[WindowStat]]:
-        """Повертає копію статистик."""
+    def snapshot(self) -> dict[str, list[WindowStat]]:
+        """Повертає копію статистик (включно з нульовими хвилинами)."""
 
-        return {key: list(stats) for key, stats in self.history.items()}
+        result: dict[str, list[WindowStat]] = {}
+        for key, series in self.history.items():
+            values = series.values()
+            first = series.head - len(values) + 1
+            result[key] = [
+                WindowStat(
+                    timestamp=datetime.fromtimestamp((first + offset) * 60, tz=UTC),
+                    value=value,
+                )
+                for offset, value in enumerate(values)
+            ]
+        return result
 
 
-__all__ = ["AnomalyDetector", "WindowStat"]
+__all__ = [
+    "AnomalyBackend",
+    "AnomalyDetector",
+    "AnomalyHit",
+    "MODELS",
+    "WindowStat",
+    "pack_series",
+    "unpack_series",
+]
@@ -0,0 +1,299 @@
+"""Знімки стану аналізатора для швидкого прогріву після рестарту."""
+from __future__ import annotations
+
+import json
+import os
+import struct
+import tempfile
+import time
+import zlib
+from collections.abc import Mapping
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Protocol
+
+from redis import Redis
+from redis.exceptions import RedisError
+
+from cortexwatcher.analyzer.anomalies import AnomalyDetector
+from cortexwatcher.analyzer.rules_engine import RuleEngine
+from cortexwatcher.logging import logger
+
+CHECKPOINT_MAGIC = b"CWCP"
+# Збільшується при будь-якій несумісній зміні формату знімка
+CHECKPOINT_VERSION = 2
+CHECKPOINT_KEY = "cortexwatcher:analyzer:checkpoint"
+
+_HEADER = struct.Struct("<4sHH")
+_LENGTH = struct.Struct("<I")
+_HEADER_FIELD = b"__header__"
+_RULES_FIELD = b"__rules__"
+
+
+class CheckpointError(ValueError):
+    """Знімок пошкоджений або несумісний із поточною версією."""
+
+
+@dataclass
+class Snapshot:
+    """Розпакований знімок: вікно детектора, серії та стан правил."""
+
+    window_minutes: int
+    series: dict[str, bytes] = field(default_factory=dict)
+    rules: dict[str, object] = field(default_factory=dict)
+
+
+def encode_header(window_minutes: int) -> bytes:
+    return _HEADER.pack(CHECKPOINT_MAGIC, CHECKPOINT_VERSION, window_minutes)
+
+
+def decode_header(data: bytes) -> int:
+    """Перевіряє заголовок і повертає розмір вікна детектора."""
+
+    try:
+        magic, version, window = _HEADER.unpack_from(data)
+    except struct.error as exc:
+        raise CheckpointError("Обрізаний заголовок знімка") from exc
+    if magic != CHECKPOINT_MAGIC:
+        raise CheckpointError("Невідомий формат знімка")
+    if version != CHECKPOINT_VERSION:
+        raise CheckpointError(f"Версія знімка {version} не підтримується")
+    return int(window)
+
+
+def encode_rules(state: Mapping[str, object]) -> bytes:
+    return zlib.compress(json.dumps(state, separators=(",", ":")).encode())
+
+
+def decode_rules(data: bytes) -> dict[str, object]:
+    try:
+        state = json.loads(zlib.decompress(data))
+    except (zlib.error, ValueError) as exc:
+        raise CheckpointError("Пошкоджений стан правил") from exc
+    return state if isinstance(state, dict) else {}
+
+
+def encode_snapshot(snapshot: Snapshot) -> bytes:
+    """Повний знімок: заголовок + zlib(стан правил, записи серій)."""
+
+    rules = encode_rules(snapshot.rules)
+    parts = [_LENGTH.pack(len(rules)), rules, _LENGTH.pack(len(snapshot.series))]
+    for key, data in snapshot.series.items():
+        raw_key = key.encode()
+        parts.extend((_LENGTH.pack(len(raw_key)), raw_key, _LENGTH.pack(len(data)), data))
+    return encode_header(snapshot.window_minutes) + zlib.compress(b"".join(parts))
+
+
+def decode_snapshot(data: bytes) -> Snapshot:
+    window = decode_header(data)
+    try:
+        body = memoryview(zlib.decompress(data[_HEADER.size:]))
+        offset = 0
+
+        def take() -> bytes:
+            nonlocal offset
+            (length,) = _LENGTH.unpack_from(body, offset)
+            start = offset + _LENGTH.size
+            offset = start + length
+            if offset > len(body):
+                raise CheckpointError("Обрізаний знімок")
+            return bytes(body[start:offset])
+
+        rules = decode_rules(take())
+        (count,) = _LENGTH.unpack_from(body, offset)
+        offset += _LENGTH.size
+        series: dict[str, bytes] = {}
+        unpack = _LENGTH.unpack_from
+        for _ in range(count):
+            (key_length,) = unpack(body, offset)
+            offset += _LENGTH.size
+            key = str(body[offset:offset + key_length], "utf-8")
+            offset += key_length
+            (length,) = unpack(body, offset)
+            offset += _LENGTH.size
+            series[key] = bytes(body[offset:offset + length])
+            offset += length
+        if offset > len(body):
+            raise CheckpointError("Обрізаний знімок")
+    except (zlib.error, struct.error, UnicodeDecodeError) as exc:
+        raise CheckpointError("Пошкоджений знімок") from exc
+    return Snapshot(window_minutes=window, series=series, rules=rules)
+
+
+class CheckpointStore(Protocol):
+    """Сховище знімків. ``incremental`` — чи приймає лише змінені серії."""
+
+    incremental: bool
+
+    def load(self) -> Snapshot | None: ...
+
+    def save(self, snapshot: Snapshot, removed: set[str], full: bool) -> None: ...
+
+
+class RedisCheckpointStore:
+    """Знімок у хеші Redis: поле на серію, тож зберігаються лише зміни."""
+
+    incremental = True
+
+    def __init__(self, redis: Redis, key: str = CHECKPOINT_KEY) -> None:
+        self.redis = redis
+        self.key = key
+
+    def load(self) -> Snapshot | None:
+        raw: dict[bytes, bytes] = {}
+        for name, value in self.redis.hgetall(self.key).items():
+            # Серії бінарні: клієнт із decode_responses їх не прочитає
+            if not isinstance(name, bytes) or not isinstance(value, bytes):
+                raise CheckpointError("Знімок читається лише клієнтом без decode_responses")
+            raw[name] = value
+        if not raw:
+            return None
+        header = raw.pop(_HEADER_FIELD, None)
+        if header is None:
+            raise CheckpointError("Знімок без заголовка")
+        window = decode_header(header)
+        rules_blob = raw.pop(_RULES_FIELD, None)
+        rules = decode_rules(rules_blob) if rules_blob else {}
+        series = {field.decode(): value for field, value in raw.items()}
+        return Snapshot(window_minutes=window, series=series, rules=rules)
+
+    def save(self, snapshot: Snapshot, removed: set[str], full: bool) -> None:
+        pipe = self.redis.pipeline(transaction=True)
+        if full:
+            pipe.delete(self.key)
+        else:
+            # Серія могла бути витіснена й створена знову між знімками
+            stale = removed - snapshot.series.keys()
+            if stale:
+                pipe.hdel(self.key, *stale)
+        mapping: dict[str | bytes, bytes] = {
+            _HEADER_FIELD: encode_header(snapshot.window_minutes),
+            _RULES_FIELD: encode_rules(snapshot.rules),
+        }
+        mapping.update(snapshot.series)
+        pipe.hset(self.key, mapping=mapping)  # type: ignore[arg-type]
+        pipe.execute()
+
+    def clear(self) -> None:
+        self.redis.delete(self.key)
+
+
+class FileCheckpointStore:
+    """Знімок у локальному файлі; перезаписується цілком і атомарно."""
+
+    incremental = False
+
+    def __init__(self, path: str | Path) -> None:
+        self.path = Path(path)
+
+    def load(self) -> Snapshot | None:
+        try:
+            data = self.path.read_bytes()
+        except FileNotFoundError:
+            return None
+        return decode_snapshot(data)
+
+    def save(self, snapshot: Snapshot, removed: set[str], full: bool) -> None:
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        fd, tmp_name = tempfile.mkstemp(dir=self.path.parent, prefix=f".{self.path.name}.")
+        try:
+            with os.fdopen(fd, "wb") as handle:
+                handle.write(encode_snapshot(snapshot))
+            os.replace(tmp_name, self.path)
+        except BaseException:
+            Path(tmp_name).unlink(missing_ok=True)
+            raise
+
+    def clear(self) -> None:
+        self.path.unlink(missing_ok=True)
+
+
+class AnalyzerCheckpoint:
+    """Періодично зберігає стан детектора та правил і відновлює його на старті.
+
+    Детектор веде облік змінених серій, тож у Redis між знімками
+    дописуються лише вони; знімки з іншою версією формату чи іншим вікном
+    детектора відкидаються, і аналізатор стартує з порожнього стану.
+    """
+
+    def __init__(
+        self,
+        detector: AnomalyDetector,
+        engine: RuleEngine,
+        store: CheckpointStore,
+        interval: float = 60.0,
+    ) -> None:
+        self.detector = detector
+        self.engine = engine
+        self.store = store
+        self.interval = interval
+        self._full = True
+        self._last_save = time.monotonic()
+        detector.track_changes()
+
+    def restore(self) -> bool:
+        """Завантажує знімок; повертає True, якщо стан відновлено."""
+
+        started = time.perf_counter()
+        try:
+            snapshot = self.store.load()
+        except (CheckpointError, RedisError, OSError) as exc:
+            logger.warning("Знімок стану аналізатора відкинуто", error=str(exc))
+            return False
+        if snapshot is None:
+            return False
+        if snapshot.window_minutes != self.detector.window_minutes:
+            logger.warning(
+                "Знімок створено для іншого вікна детектора",
+                snapshot_window=snapshot.window_minutes,
+                window=self.detector.window_minutes,
+            )
+            return False
+        restored = self.detector.restore_series(snapshot.series.items())
+        self.engine.restore_state(snapshot.rules)
+        # Відновлене вже лежить у сховищі — далі достатньо дописувати зміни
+        self._full = restored != len(snapshot.series)
+        logger.info(
+            "Стан аналізатора відновлено",
+            series=restored,
+            elapsed_ms=round((time.perf_counter() - started) * 1000, 2),
+        )
+        return True
+
+    def maybe_save(self) -> bool:
+        if time.monotonic() - self._last_save < self.interval:
+            return False
+        return self.save()
+
+    def save(self) -> bool:
+        """Зберігає знімок; при помилці зміни лишаються для наступної спроби."""
+
+        self._last_save = time.monotonic()
+        dirty, removed = self.detector.drain_changes()
+        full = self._full or not self.store.incremental
+        keys = self.detector.history.keys() if full else dirty
+        export = self.detector.export_series
+        series = {key: data for key in keys if (data := export(key)) is not None}
+        snapshot = Snapshot(self.detector.window_minutes, series, self.engine.export_state())
+        try:
+            self.store.save(snapshot, removed, full)
+        except (RedisError, OSError) as exc:
+            logger.warning("Не вдалося зберегти знімок стану аналізатора", error=str(exc))
+            self._full = True
+            return False
+        self._full = False
+        return True
+
+
+__all__ = [
+    "AnalyzerCheckpoint",
+    "CheckpointError",
+    "CheckpointStore",
+    "FileCheckpointStore",
+    "RedisCheckpointStore",
+    "Snapshot",
+    "CHECKPOINT_KEY",
+    "CHECKPOINT_VERSION",
+    "decode_snapshot",
+    "encode_snapshot",
+]
@@ -1,16 +1,33 @@
 """Побудова ключа кореляції."""
 from __future__ import annotations
 
-from typing import Dict
+from collections.abc import Mapping
 
+# Назви полів з адресами в різних форматах (syslog/JSON, Wazuh, Suricata EVE)
+SOURCE_IP_FIELDS = ("srcip", "source_ip", "src_ip")
+DESTINATION_IP_FIELDS = ("dstip", "destination_ip", "dest_ip")
 
-def build_correlation_key(record: Dict[str, object]) -> str:
+
+def _first(record: Mapping[str, object], names: tuple[str, ...]) -> str | None:
+    for name in names:
+        value = record.get(name)
+        if value:
+            return str(value)
+    return None
+
+
+def extract_ips(record: Mapping[str, object]) -> tuple[str | None, str | None]:
+    """Повертає (srcip, dstip) запису або None, якщо адреси немає."""
+
+    return _first(record, SOURCE_IP_FIELDS), _first(record, DESTINATION_IP_FIELDS)
+
+
+def build_correlation_key(record: Mapping[str, object]) -> str:
     """Формує ключ із srcip, dstip та app."""
 
-    src = str(record.get("srcip") or record.get("source_ip") or "*")
-    dst = str(record.get("dstip") or record.get("destination_ip") or "*")
+    src, dst = extract_ips(record)
     app = str(record.get("app") or record.get("program") or "*")
-    return f"{src}|{dst}|{app}"
+    return f"{src or '*'}|{dst or '*'}|{app}"
 
 
-__all__ = ["build_correlation_key"]
+__all__ = ["build_correlation_key", "extract_ips"]
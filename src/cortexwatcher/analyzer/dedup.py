@@ -0,0 +1,150 @@
+"""Дедуплікація алертів за (rule_id, correlation_key) у вікні придушення."""
+from __future__ import annotations
+
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from datetime import datetime
+
+from redis import Redis
+from redis.exceptions import RedisError
+
+from cortexwatcher.analyzer.metrics import ALERTS_SUPPRESSED
+from cortexwatcher.logging import logger
+
+DEDUP_KEY_PREFIX = "cortexwatcher:alerts:open"
+
+
+@dataclass
+class _OpenAlert:
+    alert_id: int
+    expires_at: float
+    pending: int = 0
+    last_seen: datetime | None = None
+
+
+def dedup_key(rule_id: str | None, correlation_key: str | None) -> str:
+    return f"{DEDUP_KEY_PREFIX}:{rule_id or '*'}:{correlation_key or '*'}"
+
+
+class AlertDeduplicator:
+    """Індекс відкритих інцидентів: перший алерт зберігається, решта рахується.
+
+    Інцидент відкривається першим алертом пари ``(rule_id, correlation_key)``
+    і живе ``window_seconds``; повтори в цьому вікні лише збільшують
+    лічильник, який ``drain`` віддає пакетом для оновлення в сховищі.
+    Індекс тримається в памʼяті процесу та дублюється в Redis (``SET NX EX``),
+    тож інцидент, відкритий іншою реплікою, теж придушується. Якщо Redis
+    недоступний, дедуплікація працює лише локально.
+    """
+
+    def __init__(
+        self,
+        window_seconds: float,
+        redis: Redis | None = None,
+        max_keys: int = 10000,
+    ) -> None:
+        self.window = window_seconds
+        self.redis = redis
+        self.max_keys = max_keys
+        self.open: OrderedDict[str, _OpenAlert] = OrderedDict()
+        self._orphans: dict[int, tuple[int, datetime]] = {}
+
+    @property
+    def enabled(self) -> bool:
+        return self.window > 0
+
+    def check(self, rule_id: str | None, correlation_key: str | None, seen_at: datetime) -> bool:
+        """True, якщо алерт повторює відкритий інцидент і лише врахований у лічильнику."""
+
+        if not self.enabled:
+            return False
+        key = dedup_key(rule_id, correlation_key)
+        now = time.time()
+        entry = self.open.get(key)
+        if entry is not None and entry.expires_at <= now:
+            del self.open[key]
+            entry = None
+        if entry is None:
+            entry = self._load_shared(key, now)
+            if entry is None:
+                return False
+        entry.pending += 1
+        if entry.last_seen is None or seen_at > entry.last_seen:
+            entry.last_seen = seen_at
+        ALERTS_SUPPRESSED.inc()
+        return True
+
+    def opened(self, rule_id: str | None, correlation_key: str | None, alert_id: int) -> None:
+        """Реєструє щойно збережений алерт як відкритий інцидент."""
+
+        if not self.enabled:
+            return
+        key = dedup_key(rule_id, correlation_key)
+        self._remember(key, _OpenAlert(alert_id=alert_id, expires_at=time.time() + self.window))
+        if self.redis is None:
+            return
+        try:
+            self.redis.set(key, alert_id, nx=True, ex=max(1, int(self.window)))
+        except RedisError as exc:
+            logger.warning("Не вдалося зареєструвати інцидент у Redis", error=str(exc))
+
+    def drain(self) -> dict[int, tuple[int, datetime]]:
+        """Віддає накопичені повтори ``id алерту -> (кількість, час останнього)``."""
+
+        counts, self._orphans = self._orphans, {}
+        now = time.time()
+        for key in list(self.open):
+            entry = self.open[key]
+            if entry.pending and entry.last_seen is not None:
+                counts[entry.alert_id] = _combine(
+                    counts.get(entry.alert_id),
+                    entry.pending,
+                    entry.last_seen,
+                )
+                entry.pending = 0
+            if entry.expires_at <= now:
+                del self.open[key]
+        return counts
+
+    def _remember(self, key: str, entry: _OpenAlert) -> None:
+        self.open[key] = entry
+        self.open.move_to_end(key)
+        while len(self.open) > self.max_keys:
+            _, evicted = self.open.popitem(last=False)
+            # Лічильник витісненого інциденту не губимо — він піде з наступним drain
+            if evicted.pending and evicted.last_seen is not None:
+                self._orphans[evicted.alert_id] = _combine(
+                    self._orphans.get(evicted.alert_id),
+                    evicted.pending,
+                    evicted.last_seen,
+                )
+
+    def _load_shared(self, key: str, now: float) -> _OpenAlert | None:
+        if self.redis is None:
+            return None
+        try:
+            pipe = self.redis.pipeline(transaction=False)
+            pipe.get(key)
+            pipe.pttl(key)
+            value, ttl_ms = pipe.execute()
+        except RedisError:
+            return None
+        if value is None or ttl_ms is None or ttl_ms <= 0:
+            return None
+        entry = _OpenAlert(alert_id=int(value), expires_at=now + ttl_ms / 1000)
+        self._remember(key, entry)
+        return entry
+
+
+def _combine(
+    current: tuple[int, datetime] | None,
+    count: int,
+    last_seen: datetime,
+) -> tuple[int, datetime]:
+    if current is None:
+        return count, last_seen
+    return current[0] + count, max(current[1], last_seen)
+
+
+__all__ = ["AlertDeduplicator", "DEDUP_KEY_PREFIX", "dedup_key"]
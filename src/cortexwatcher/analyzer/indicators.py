@@ -0,0 +1,290 @@
+"""Набори індикаторів компрометації (IP-мережі, домени, хеші) для умов правил.
+
+Набір — локальний файл з одним індикатором на рядок (``#`` та ``;``
+відкривають коментар, решта після першого пробілу ігнорується). Якщо
+перший індикатор — IP-адреса чи мережа, файл завантажується в
+``NetworkSet`` (radix-дерево з рівнями в хеш-таблицях), інакше —
+в ``ExactSet`` (фільтр Блума з точним підтвердженням). В обох випадках
+вартість перевірки не залежить від розміру набору.
+
+Правила посилаються на набори за назвою: ``srcip in set threat_nets``.
+"""
+from __future__ import annotations
+
+import hashlib
+import ipaddress
+import math
+import socket
+from array import array
+from collections.abc import Iterable, Iterator, Mapping
+from pathlib import Path
+
+from cortexwatcher.logging import logger
+
+_WIDTH = {4: 32, 6: 128}
+_FAMILY = {4: socket.AF_INET, 6: socket.AF_INET6}
+
+
+class NetworkSet:
+    """Набір IPv4/IPv6-мереж з пошуком найвужчої мережі, що містить адресу.
+
+    Це radix-дерево, рівні якого стиснені в хеш-таблиці: для кожної довжини
+    префікса, що зустрічається в наборі, зберігається словник «старші біти
+    мережі → мережа». Пошук перебирає лише наявні довжини від найдовшої,
+    тож робить не більше 33 (IPv4) чи 129 (IPv6) звернень до словника
+    незалежно від кількості мереж, а на типових фідах — кілька.
+    """
+
+    kind = "cidr"
+
+    def __init__(self, networks: Iterable[str] = ()) -> None:
+        self._tables: dict[int, dict[int, dict[int, str]]] = {4: {}, 6: {}}
+        self._levels: dict[int, tuple[tuple[int, dict[int, str]], ...]] = {4: (), 6: ()}
+        self._size = 0
+        for network in networks:
+            self.add(network)
+
+    def add(self, network: str) -> None:
+        """Додає мережу або окрему адресу; ``ValueError`` для некоректного запису."""
+
+        parsed = ipaddress.ip_network(network, strict=False)
+        width = _WIDTH[parsed.version]
+        tables = self._tables[parsed.version]
+        table = tables.get(parsed.prefixlen)
+        if table is None:
+            table = tables[parsed.prefixlen] = {}
+            self._levels[parsed.version] = tuple(
+                (width - length, tables[length]) for length in sorted(tables, reverse=True)
+            )
+        key = int(parsed.network_address) >> (width - parsed.prefixlen)
+        if key not in table:
+            self._size += 1
+        table[key] = str(parsed)
+
+    def lookup(self, address: object) -> str | None:
+        text = str(address).strip()
+        version = 6 if ":" in text else 4
+        try:
+            value = int.from_bytes(socket.inet_pton(_FAMILY[version], text), "big")
+        except OSError:
+            return None
+        for shift, table in self._levels[version]:
+            network = table.get(value >> shift)
+            if network is not None:
+                return network
+        return None
+
+    def __contains__(self, address: object) -> bool:
+        return self.lookup(address) is not None
+
+    def __len__(self) -> int:
+        return self._size
+
+
+class BloomFilter:
+    """Фільтр Блума на ``bytearray`` з подвійним хешуванням одного blake2b."""
+
+    def __init__(self, capacity: int, error_rate: float = 0.01) -> None:
+        if not 0 < error_rate < 1:
+            raise ValueError("Частка хибних спрацювань має бути в межах (0, 1)")
+        capacity = max(1, capacity)
+        self.bits = max(8, math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hashes = max(1, round(self.bits / capacity * math.log(2)))
+        self._array = bytearray((self.bits + 7) // 8)
+
+    def _positions(self, key: bytes) -> Iterator[int]:
+        digest = hashlib.blake2b(key, digest_size=16).digest()
+        first = int.from_bytes(digest[:8], "little")
+        step = int.from_bytes(digest[8:], "little") | 1
+        bits = self.bits
+        for index in range(self.hashes):
+            yield (first + index * step) % bits
+
+    def add(self, key: bytes) -> None:
+        array_ = self._array
+        for position in self._positions(key):
+            array_[position >> 3] |= 1 << (position & 7)
+
+    def __contains__(self, key: bytes) -> bool:
+        array_ = self._array
+        return all(
+            array_[position >> 3] & (1 << (position & 7)) for position in self._positions(key)
+        )
+
+
+class ExactSet:
+    """Великий набір рядків: фільтр Блума перед точним бінарним пошуком.
+
+    Значення (у нижньому регістрі) відсортовано й склеєно в один ``bytes`` з
+    масивом зсувів — це кілька байтів накладних витрат на запис замість
+    сотні в ``set``. Більшість подій відсікає фільтр Блума за ``hashes``
+    перевірок бітів; бінарний пошук виконується лише для його спрацювань і
+    прибирає хибні збіги.
+    """
+
+    kind = "exact"
+
+    def __init__(self, values: Iterable[str], error_rate: float = 0.01) -> None:
+        entries = sorted({value.strip().lower().encode() for value in values if value.strip()})
+        self.bloom = BloomFilter(len(entries), error_rate)
+        offsets = array("Q", [0])
+        for entry in entries:
+            self.bloom.add(entry)
+            offsets.append(offsets[-1] + len(entry))
+        self._blob = b"".join(entries)
+        self._offsets = offsets
+
+    def __contains__(self, value: object) -> bool:
+        key = str(value).strip().lower().encode()
+        return key in self.bloom and self._confirm(key)
+
+    def _confirm(self, key: bytes) -> bool:
+        blob, offsets = self._blob, self._offsets
+        low, high = 0, len(offsets) - 1
+        while low < high:
+            middle = (low + high) // 2
+            entry = blob[offsets[middle] : offsets[middle + 1]]
+            if entry < key:
+                low = middle + 1
+            elif entry > key:
+                high = middle
+            else:
+                return True
+        return False
+
+    def __len__(self) -> int:
+        return len(self._offsets) - 1
+
+
+IndicatorSet = NetworkSet | ExactSet
+
+
+def _entries(lines: Iterable[str]) -> Iterator[str]:
+    for line in lines:
+        text = line.split("#", 1)[0].split(";", 1)[0].split()
+        if text:
+            yield text[0]
+
+
+def _is_network(entry: str) -> bool:
+    try:
+        ipaddress.ip_network(entry, strict=False)
+    except ValueError:
+        return False
+    return True
+
+
+def load_indicator_file(path: str | Path, error_rate: float = 0.01) -> IndicatorSet:
+    """Завантажує набір з файлу, визначаючи тип за першим індикатором."""
+
+    with open(path, encoding="utf-8", errors="replace") as handle:
+        entries = list(_entries(handle))
+    if not entries or not _is_network(entries[0]):
+        return ExactSet(entries, error_rate)
+    networks = NetworkSet()
+    skipped = 0
+    for entry in entries:
+        try:
+            networks.add(entry)
+        except ValueError:
+            skipped += 1
+    if skipped:
+        logger.warning(
+            "Пропущено некоректні мережі в наборі індикаторів",
+            path=str(path),
+            skipped=skipped,
+        )
+    return networks
+
+
+class IndicatorRegistry:
+    """Іменовані набори індикаторів, що перечитуються при зміні файлів.
+
+    Умови правил звертаються до набору за назвою під час кожної перевірки,
+    тому новий вміст файлу підхоплюється без перекомпіляції правил. Набір
+    будується повністю і лише потім підміняє попередній.
+    """
+
+    def __init__(self, paths: Mapping[str, str | Path], error_rate: float = 0.01) -> None:
+        self.paths = {name: Path(path) for name, path in paths.items()}
+        self.error_rate = error_rate
+        self._sets: dict[str, IndicatorSet] = {}
+        self._stamps: dict[str, tuple[int, int]] = {}
+        for name in self.paths:
+            self._load(name)
+
+    @property
+    def names(self) -> frozenset[str]:
+        return frozenset(self.paths)
+
+    def _stamp(self, name: str) -> tuple[int, int] | None:
+        try:
+            stat = self.paths[name].stat()
+        except OSError:
+            return None
+        return stat.st_mtime_ns, stat.st_size
+
+    def _load(self, name: str) -> None:
+        stamp = self._stamp(name)
+        loaded = load_indicator_file(self.paths[name], self.error_rate)
+        self._sets[name] = loaded
+        if stamp is not None:
+            self._stamps[name] = stamp
+        logger.info(
+            "Набір індикаторів завантажено",
+            name=name,
+            kind=loaded.kind,
+            entries=len(loaded),
+        )
+
+    def get(self, name: str) -> IndicatorSet | None:
+        return self._sets.get(name)
+
+    def contains(self, name: str, value: object) -> bool:
+        """Чи входить значення (або будь-який елемент списку) у набір."""
+
+        indicators = self._sets.get(name)
+        if indicators is None:
+            return False
+        if isinstance(value, (list, tuple, set, frozenset)):
+            return any(item in indicators for item in value if item is not None)
+        return value in indicators
+
+    def changed_on_disk(self) -> list[str]:
+        """Назви наборів, чиї файли змінилися (mtime або розмір)."""
+
+        return [
+            name
+            for name in self.paths
+            if (stamp := self._stamp(name)) is not None and stamp != self._stamps.get(name)
+        ]
+
+    def reload(self) -> list[str]:
+        """Перечитує змінені файли; при помилці лишає попередній вміст набору."""
+
+        reloaded: list[str] = []
+        for name in self.changed_on_disk():
+            try:
+                self._load(name)
+            except (OSError, ValueError) as exc:
+                logger.error(
+                    "Не вдалося перезавантажити набір індикаторів",
+                    name=name,
+                    error=str(exc),
+                )
+                continue
+            reloaded.append(name)
+        return reloaded
+
+    def sizes(self) -> dict[str, int]:
+        return {name: len(indicators) for name, indicators in self._sets.items()}
+
+
+__all__ = [
+    "BloomFilter",
+    "ExactSet",
+    "IndicatorRegistry",
+    "IndicatorSet",
+    "NetworkSet",
+    "load_indicator_file",
+]
@@ -0,0 +1,428 @@
+"""Аналіз записів одразу під час інжесту та спільні кроки конвеєра аналізатора.
+
+``InlineAnalyzer`` застосовує правила й детектор аномалій до щойно
+збережених записів у процесі API чи RQ-воркера. Матчинг, детектор, скетчі
+та синхронні звернення до Redis виконуються в окремому потоці, тож цикл
+подій лишається вільним для інших запитів; у цикл повертається лише
+збереження алертів і аномалій у сховище. Модуль не створює підключень
+сам: клієнт Redis передає той, хто створює аналізатор.
+"""
+from __future__ import annotations
+
+import asyncio
+from collections.abc import Iterable, Sequence
+from contextlib import suppress
+from dataclasses import dataclass, field
+from datetime import UTC, datetime
+from time import time
+from typing import Any
+from uuid import uuid4
+
+from redis import Redis
+from redis.exceptions import RedisError
+
+from cortexwatcher.analyzer.anomalies import AnomalyBackend, AnomalyDetector
+from cortexwatcher.analyzer.correlate import extract_ips
+from cortexwatcher.analyzer.dedup import AlertDeduplicator
+from cortexwatcher.analyzer.indicators import IndicatorRegistry
+from cortexwatcher.analyzer.notifier import AlertNotifier
+from cortexwatcher.analyzer.outbox import AlertOutbox
+from cortexwatcher.analyzer.reload import RuleReloader, default_replica_id
+from cortexwatcher.analyzer.rules_engine import RuleEngine
+from cortexwatcher.analyzer.sketches import (
+    QuantileTracker,
+    TrafficTracker,
+    persist_sketches,
+    persist_traffic,
+)
+from cortexwatcher.analyzer.vectorized import VectorizedAnomalyDetector
+from cortexwatcher.config import get_settings
+from cortexwatcher.db.models import Alert, Anomaly, LogNormalized
+from cortexwatcher.logging import logger
+from cortexwatcher.storage.base import LogStorage
+
+PROCESSED_LOGS_KEY = "cortexwatcher:analyzer:processed_logs"
+
+
+@dataclass
+class AnalysisOutputs:
+    """Алерти й аномалії пакета логів, що зберігаються разом."""
+
+    alerts: list[Alert] = field(default_factory=list)
+    anomalies: list[Anomaly] = field(default_factory=list)
+
+
+def inline_analysis_enabled(source: str) -> bool:
+    """Чи застосовувати правила до джерела одразу під час інжесту."""
+
+    sources = get_settings().inline_sources()
+    return "*" in sources or source.lower() in sources
+
+
+def build_indicators() -> IndicatorRegistry | None:
+    """Набори індикаторів з ``INDICATOR_SETS``; None, якщо їх не задано."""
+
+    paths = get_settings().indicator_set_paths()
+    return IndicatorRegistry(paths) if paths else None
+
+
+def build_engine() -> RuleEngine:
+    """Рушій правил з обмеженнями стану, профайлером і кешем із налаштувань."""
+
+    settings = get_settings()
+    return RuleEngine(
+        settings.rules_path,
+        max_groups=settings.rule_state_max_groups,
+        profile_sample=settings.rule_profile_sample,
+        match_cache_size=settings.rule_match_cache_size,
+        indicators=build_indicators(),
+    )
+
+
+def build_detector() -> AnomalyBackend:
+    """Детектор аномалій обраного бекенду з обмеженнями памʼяті з налаштувань."""
+
+    settings = get_settings()
+    if settings.anomaly_backend == "numpy":
+        return VectorizedAnomalyDetector(
+            window_minutes=settings.anomaly_window_min,
+            max_series=settings.anomaly_max_series,
+            idle_minutes=settings.anomaly_idle_min,
+            method=settings.anomaly_method,
+        )
+    return AnomalyDetector(
+        window_minutes=settings.anomaly_window_min,
+        max_series=settings.anomaly_max_series,
+        idle_minutes=settings.anomaly_idle_min,
+        models=settings.anomaly_model_rules(),
+        default_model=settings.anomaly_model,
+    )
+
+
+def build_quantile_tracker() -> QuantileTracker:
+    settings = get_settings()
+    return QuantileTracker(settings.quantile_field_paths(), max_series=settings.anomaly_max_series)
+
+
+def build_traffic_tracker() -> TrafficTracker:
+    settings = get_settings()
+    return TrafficTracker(
+        settings.top_field_names(),
+        settings.cardinality_specs(),
+        capacity=settings.top_k_capacity,
+        max_groups=settings.anomaly_max_series,
+    )
+
+
+def build_dedup(redis: Redis) -> AlertDeduplicator:
+    settings = get_settings()
+    return AlertDeduplicator(
+        settings.alert_suppress_window,
+        redis,
+        max_keys=settings.rule_state_max_groups,
+    )
+
+
+def build_notifier(storage: LogStorage, dedup: AlertDeduplicator, redis: Redis) -> AlertNotifier:
+    outbox = AlertOutbox(redis) if get_settings().notify_outbox else None
+    return AlertNotifier(storage, dedup=dedup, outbox=outbox)
+
+
+def rule_record(log: LogNormalized) -> dict[str, Any]:
+    """Запис, який бачать правила: нормалізований лог з адресами та повним ``meta``."""
+
+    meta = log.meta_json if isinstance(log.meta_json, dict) else {}
+    srcip, dstip = extract_ips(meta)
+    return {
+        "id": log.id,
+        "msg": log.msg,
+        "host": log.host,
+        "app": log.app,
+        "severity": log.severity,
+        "srcip": srcip,
+        "dstip": dstip,
+        "correlation_key": log.correlation_key,
+        "ts": log.ts,
+        "meta": meta,
+    }
+
+
+def claim_logs(redis: Redis, logs: Iterable[LogNormalized]) -> list[LogNormalized]:
+    """Позначає записи обробленими (``ZADD NX``) і повертає ті, що позначив саме цей виклик.
+
+    Записи, які вже взяв окремий аналізатор, пропускаються. Записи без
+    ідентифікатора позначити не можна, вони повертаються завжди; якщо Redis
+    недоступний — повертаються всі (fail-open, як у циклі аналізатора).
+    """
+
+    logs = list(logs)
+    stored = [log for log in logs if getattr(log, "id", None) is not None]
+    if not stored:
+        return logs
+    now = time()
+    try:
+        pipe = redis.pipeline(transaction=False)
+        for log in stored:
+            pipe.zadd(PROCESSED_LOGS_KEY, {str(log.id): now}, nx=True)
+        added = pipe.execute()
+    except RedisError as exc:
+        logger.warning("Не вдалося позначити записи обробленими", error=str(exc))
+        return logs
+    skipped = {id(log) for log, result in zip(stored, added, strict=True) if not result}
+    return [log for log in logs if id(log) not in skipped]
+
+
+def evaluate_log(  # noqa: PLR0913 - скетчі необовʼязкові й передаються за іменем
+    engine: RuleEngine,
+    detector: AnomalyBackend,
+    log: LogNormalized,
+    outputs: AnalysisOutputs,
+    *,
+    quantiles: QuantileTracker | None = None,
+    traffic: TrafficTracker | None = None,
+) -> None:
+    """Застосовує правила й детектор до запису, додаючи алерти й аномалії в ``outputs``."""
+
+    min_level = get_settings().alert_min_level
+    record = rule_record(log)
+    for rule in engine.match(record):
+        if rule.severity < min_level:
+            continue
+        outputs.alerts.append(
+            Alert(
+                created_at=datetime.now(UTC),
+                rule_id=rule.id,
+                level=rule.severity,
+                title=rule.title,
+                description=rule.description,
+                tags=list(rule.tags),
+                evidence_json={"log_id": log.id, "msg": log.msg},
+                correlation_key=log.correlation_key,
+            ),
+        )
+    if quantiles is not None:
+        quantiles.observe(log.meta_json, log.host, log.app, log.ts)
+    if traffic is not None:
+        traffic.observe(record, log.meta_json, log.ts)
+    anomaly, score = detector.update(log.host, log.app, log.severity, log.ts)
+    if anomaly:
+        outputs.anomalies.append(
+            Anomaly(
+                created_at=datetime.now(UTC),
+                signal=f"{log.host}|{log.app}|{log.severity}",
+                score=score,
+                window=detector.window_minutes,
+                details_json={"log_id": log.id},
+            ),
+        )
+
+
+async def persist_outputs(
+    storage: LogStorage,
+    notifier: AlertNotifier,
+    outputs: AnalysisOutputs,
+) -> int:
+    """Зберігає накопичені аномалії та алерти пакетними вставками.
+
+    Повертає кількість справді збережених алертів (без повторів інцидентів).
+    """
+
+    saved = 0
+    if outputs.anomalies:
+        await storage.store_anomalies_batch(outputs.anomalies)
+    if outputs.alerts:
+        saved = len(await notifier.persist_and_notify_batch(outputs.alerts))
+    outputs.alerts = []
+    outputs.anomalies = []
+    return saved
+
+
+def collect_closed_anomalies(detector: AnomalyBackend, outputs: AnalysisOutputs) -> None:
+    """Додає аномалії, які пакетний бекенд виявив при закритті хвилин."""
+
+    for hit in detector.tick(datetime.now(UTC)):
+        outputs.anomalies.append(
+            Anomaly(
+                created_at=datetime.now(UTC),
+                signal=hit.signal,
+                score=hit.score,
+                window=detector.window_minutes,
+                details_json={"minute": hit.timestamp.isoformat(), "count": hit.value},
+            ),
+        )
+
+
+def flush_quantiles(
+    redis: Redis,
+    engine: RuleEngine,
+    quantiles: QuantileTracker,
+    replica: str,
+    outputs: AnalysisOutputs,
+) -> None:
+    """Зберігає закриті хвилинні скетчі та перевіряє на них квантильні правила."""
+
+    closed = quantiles.tick(datetime.now(UTC))
+    if not closed:
+        return
+    settings = get_settings()
+    try:
+        persist_sketches(redis, closed, replica, settings.sketch_retention_min)
+    except RedisError as exc:
+        logger.warning("Не вдалося зберегти квантильні скетчі", error=str(exc))
+    for item in closed:
+        host, _, app = item.series.partition("|")
+        series = {"host": host, "app": app}
+        for rule, value in engine.match_quantiles(item.field, series, item.sketch):
+            q = float((rule.quantile or {})["q"])
+            minute = datetime.fromtimestamp(item.minute * 60, tz=UTC).isoformat()
+            details = {
+                "field": item.field,
+                "q": q,
+                "value": value,
+                "count": item.sketch.count,
+                "minute": minute,
+            }
+            outputs.anomalies.append(
+                Anomaly(
+                    created_at=datetime.now(UTC),
+                    signal=f"{item.field}:p{q * 100:g}|{item.series}",
+                    score=value,
+                    window=1,
+                    details_json={"rule_id": rule.id, **details},
+                ),
+            )
+            if rule.severity < settings.alert_min_level:
+                continue
+            alert = Alert(
+                created_at=datetime.now(UTC),
+                rule_id=rule.id,
+                level=rule.severity,
+                title=rule.title,
+                description=rule.description,
+                tags=list(rule.tags),
+                evidence_json={"series": item.series, **details},
+                correlation_key=item.series,
+            )
+            outputs.alerts.append(alert)
+
+
+def flush_traffic(redis: Redis, traffic: TrafficTracker) -> None:
+    """Переносить топ-K закритих хвилин і різні значення пакета в Redis."""
+
+    closed = traffic.tick(datetime.now(UTC))
+    distinct = traffic.drain_distinct()
+    if not closed and not distinct:
+        return
+    try:
+        persist_traffic(redis, closed, distinct, get_settings().sketch_retention_min)
+    except RedisError as exc:
+        logger.warning("Не вдалося зберегти скетчі трафіку", error=str(exc))
+
+
+def bump_alert_metrics(redis: Redis, count: int = 1) -> None:
+    """Лічильник алертів і ковзне вікно для ``/status``."""
+
+    if count <= 0:
+        return
+    now_iso = datetime.now(UTC).isoformat()
+    timestamp = time()
+    member_id = f"{int(timestamp * 1000)}:{count}:{uuid4().hex}"
+    with suppress(RedisError):
+        pipe = redis.pipeline()
+        pipe.hincrby("cortexwatcher:metrics", "alerts_total", count)
+        pipe.hset("cortexwatcher:metrics", mapping={"last_alert_ts": now_iso})
+        pipe.zadd("cortexwatcher:metrics:alerts_window", {member_id: timestamp})
+        pipe.zremrangebyscore("cortexwatcher:metrics:alerts_window", 0, timestamp - 600)
+        pipe.expire("cortexwatcher:metrics:alerts_window", 3600)
+        pipe.execute()
+
+
+class InlineAnalyzer:
+    """Правила й детектор для записів, що аналізуються одразу під час інжесту.
+
+    Стан (скомпільовані правила, лічильники порогових і послідовних правил,
+    базові лінії детектора, скетчі, відкриті інциденти) живе в екземплярі
+    між пакетами, тож створюється він один раз на процес. Пакети одного
+    процесу обробляються по черзі. Після ``start`` екземпляр слід закрити
+    через ``close``, щоб прибрати запис репліки з ``/rules``.
+    """
+
+    def __init__(
+        self,
+        redis: Redis,
+        engine: RuleEngine | None = None,
+        detector: AnomalyBackend | None = None,
+        replica_id: str | None = None,
+    ) -> None:
+        self.redis = redis
+        self.engine = engine if engine is not None else build_engine()
+        self.detector = detector if detector is not None else build_detector()
+        self.quantiles = build_quantile_tracker()
+        self.traffic = build_traffic_tracker()
+        self.dedup = build_dedup(redis)
+        self.reloader = RuleReloader(
+            self.engine,
+            redis,
+            replica_id or default_replica_id("inline"),
+        )
+        self._lock = asyncio.Lock()
+
+    def start(self) -> None:
+        """Підписується на оновлення правил і реєструє версію репліки."""
+
+        self.reloader.start()
+
+    def close(self) -> None:
+        self.reloader.close()
+
+    async def analyze(self, storage: LogStorage, logs: Sequence[LogNormalized]) -> None:
+        """Застосовує правила та детектор до щойно збережених записів."""
+
+        async with self._lock:
+            await self.reloader.poll()
+            outputs = await asyncio.to_thread(self._evaluate, logs)
+            notifier = build_notifier(storage, self.dedup, self.redis)
+            saved = await persist_outputs(storage, notifier, outputs)
+            if saved:
+                await asyncio.to_thread(bump_alert_metrics, self.redis, saved)
+            await notifier.flush_occurrences()
+
+    def _evaluate(self, logs: Sequence[LogNormalized]) -> AnalysisOutputs:
+        outputs = AnalysisOutputs()
+        for log in claim_logs(self.redis, logs):
+            evaluate_log(
+                self.engine,
+                self.detector,
+                log,
+                outputs,
+                quantiles=self.quantiles,
+                traffic=self.traffic,
+            )
+        collect_closed_anomalies(self.detector, outputs)
+        flush_quantiles(self.redis, self.engine, self.quantiles, self.reloader.replica_id, outputs)
+        flush_traffic(self.redis, self.traffic)
+        self.detector.report_metrics()
+        return outputs
+
+
+__all__ = [
+    "PROCESSED_LOGS_KEY",
+    "AnalysisOutputs",
+    "InlineAnalyzer",
+    "build_detector",
+    "build_dedup",
+    "build_engine",
+    "build_indicators",
+    "build_notifier",
+    "build_quantile_tracker",
+    "build_traffic_tracker",
+    "bump_alert_metrics",
+    "claim_logs",
+    "collect_closed_anomalies",
+    "evaluate_log",
+    "flush_quantiles",
+    "flush_traffic",
+    "inline_analysis_enabled",
+    "persist_outputs",
+    "rule_record",
+]
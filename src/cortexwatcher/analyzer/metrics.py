@@ -0,0 +1,53 @@
+"""Prometheus-метрики аналізатора."""
+from __future__ import annotations
+
+from prometheus_client import Counter, Gauge
+
+ANOMALY_SERIES_TRACKED = Gauge(
+    "cortexwatcher_anomaly_series_tracked",
+    "Кількість серій, які відстежує детектор аномалій",
+)
+ANOMALY_SERIES_EVICTED = Counter(
+    "cortexwatcher_anomaly_series_evicted_total",
+    "Кількість витіснених серій детектора аномалій",
+    ["reason"],
+)
+ALERTS_SUPPRESSED = Counter(
+    "cortexwatcher_alerts_suppressed_total",
+    "Кількість алертів, врахованих як повтор відкритого інциденту",
+)
+RULE_EVALUATIONS = Counter(
+    "cortexwatcher_rule_evaluations_total",
+    "Оцінка кількості перевірок правила (за вибіркою профайлера)",
+    ["rule_id"],
+)
+RULE_MATCHES = Counter(
+    "cortexwatcher_rule_matches_total",
+    "Оцінка кількості збігів шаблонів правила (за вибіркою профайлера)",
+    ["rule_id"],
+)
+RULE_EVAL_SECONDS = Counter(
+    "cortexwatcher_rule_eval_seconds_total",
+    "Оцінка сумарного часу перевірки шаблонів правила (за вибіркою профайлера)",
+    ["rule_id"],
+)
+RULE_MATCH_CACHE = Counter(
+    "cortexwatcher_rule_match_cache_total",
+    "Звернення до кешу результатів матчингу однакових повідомлень",
+    ["result"],
+)
+RULE_MATCH_CACHE_HITS = RULE_MATCH_CACHE.labels("hit")
+RULE_MATCH_CACHE_MISSES = RULE_MATCH_CACHE.labels("miss")
+
+
+__all__ = [
+    "ALERTS_SUPPRESSED",
+    "ANOMALY_SERIES_TRACKED",
+    "ANOMALY_SERIES_EVICTED",
+    "RULE_EVALUATIONS",
+    "RULE_EVAL_SECONDS",
+    "RULE_MATCH_CACHE",
+    "RULE_MATCH_CACHE_HITS",
+    "RULE_MATCH_CACHE_MISSES",
+    "RULE_MATCHES",
+]
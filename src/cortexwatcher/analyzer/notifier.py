@@ -1,35 +1,141 @@
 """Надсилання алертів у Telegram."""
 from __future__ import annotations
 
+import asyncio
+from collections.abc import Sequence
+
 from aiogram import Bot
+from redis.exceptions import RedisError
 
+from cortexwatcher.analyzer.dedup import AlertDeduplicator
+from cortexwatcher.analyzer.outbox import AlertOutbox
 from cortexwatcher.config import get_settings
 from cortexwatcher.db.models import Alert
 from cortexwatcher.logging import logger
 from cortexwatcher.storage.base import LogStorage
 
 
+def _split_repeats(
+    dedup: AlertDeduplicator,
+    alerts: Sequence[Alert],
+) -> tuple[list[Alert], list[Alert]]:
+    """Нові інциденти пакета й повтори інцидентів, відкритих у цьому ж пакеті."""
+
+    fresh: list[Alert] = []
+    repeats: list[Alert] = []
+    opened: set[tuple[str | None, str | None]] = set()
+    for alert in alerts:
+        if dedup.check(alert.rule_id, alert.correlation_key, alert.created_at):
+            continue
+        key = (alert.rule_id, alert.correlation_key)
+        if dedup.enabled and key in opened:
+            repeats.append(alert)
+            continue
+        opened.add(key)
+        fresh.append(alert)
+    return fresh, repeats
+
+
+def _register_incidents(
+    dedup: AlertDeduplicator,
+    saved: Sequence[Alert],
+    repeats: Sequence[Alert],
+) -> None:
+    """Відкриває інциденти збережених алертів і враховує їхні повтори з пакета."""
+
+    for item in saved:
+        if item.id is not None:
+            dedup.opened(item.rule_id, item.correlation_key, item.id)
+    for alert in repeats:
+        dedup.check(alert.rule_id, alert.correlation_key, alert.created_at)
+
+
 class AlertNotifier:
     """Відправляє алерти у whitelisted чати."""
 
-    def __init__(self, storage: LogStorage, bot: Bot | None = None) -> None:
+    def __init__(
+        self,
+        storage: LogStorage,
+        bot: Bot | None = None,
+        dedup: AlertDeduplicator | None = None,
+        outbox: AlertOutbox | None = None,
+    ) -> None:
         self.storage = storage
         settings = get_settings()
         self.chat_ids = settings.allowed_chat_ids
         self.bot = bot
+        self.dedup = dedup
+        self.outbox = outbox
+
+    async def persist_and_notify(self, alert: Alert, thread_id: int | None = None) -> Alert | None:
+        """Зберігає алерт і за потреби відправляє у Telegram.
 
-    async def persist_and_notify(self, alert: Alert, thread_id: int | None = None) -> Alert:
-        """Зберігає алерт і за потреби відправляє у Telegram."""
+        Повертає None, якщо алерт лише збільшив лічильник відкритого інциденту.
+        """
 
-        saved = await self.storage.store_alert(alert)
-        if self.bot and self.chat_ids:
-            message = self._format_message(saved)
+        saved = await self.persist_and_notify_batch([alert], thread_id)
+        return saved[0] if saved else None
+
+    async def persist_and_notify_batch(
+        self,
+        alerts: Sequence[Alert],
+        thread_id: int | None = None,
+    ) -> list[Alert]:
+        """Зберігає пакет алертів одним записом у сховище й ставить сповіщення.
+
+        Повтори відкритих інцидентів (зокрема в межах самого пакета) лише
+        рахуються дедуплікатором; повертаються справді збережені алерти.
+        Дедуплікатор звертається до синхронного Redis, тож його кроки
+        виконуються поза циклом подій.
+        """
+
+        fresh: list[Alert] = list(alerts)
+        repeats: list[Alert] = []
+        if self.dedup is not None:
+            fresh, repeats = await asyncio.to_thread(_split_repeats, self.dedup, alerts)
+        for alert in fresh:
+            alert.occurrences = alert.occurrences or 1
+            alert.last_seen_at = alert.last_seen_at or alert.created_at
+        saved = await self.storage.store_alerts_batch(fresh) if fresh else []
+        if self.dedup is not None:
+            await asyncio.to_thread(_register_incidents, self.dedup, saved, repeats)
+        for item in saved:
+            await self._notify(item, thread_id)
+        return saved
+
+    async def _notify(self, saved: Alert, thread_id: int | None) -> None:
+        if not self.chat_ids:
+            return
+        message = self._format_message(saved)
+        if self.outbox is not None:
+            try:
+                await asyncio.to_thread(
+                    self.outbox.enqueue,
+                    self.chat_ids,
+                    message,
+                    saved.title,
+                    saved.level,
+                    thread_id,
+                )
+                return
+            except RedisError as exc:
+                logger.error("Не вдалося поставити алерт у чергу сповіщень", error=str(exc))
+        if self.bot:
             for chat_id in self.chat_ids:
                 try:
                     await self.bot.send_message(chat_id=chat_id, text=message, message_thread_id=thread_id)
                 except Exception as exc:  # noqa: BLE001
                     logger.error("Не вдалося відправити алерт", error=str(exc), chat_id=chat_id)
-        return saved
+
+    async def flush_occurrences(self) -> int:
+        """Записує накопичені повтори інцидентів у сховище; повертає їх кількість."""
+
+        if self.dedup is None:
+            return 0
+        counts = self.dedup.drain()
+        if counts:
+            await self.storage.add_alert_occurrences(counts)
+        return sum(count for count, _ in counts.values())
 
     def _format_message(self, alert: Alert) -> str:
         tags = ", ".join(alert.tags or [])
@@ -0,0 +1,307 @@
+"""Черга сповіщень у Redis та асинхронний відправник у Telegram."""
+from __future__ import annotations
+
+import asyncio
+import json
+import time
+from collections.abc import Awaitable, Callable, Iterable
+from dataclasses import dataclass
+from typing import Any
+
+from aiogram.exceptions import TelegramAPIError, TelegramNetworkError, TelegramRetryAfter
+from redis import Redis
+from redis.asyncio import Redis as AsyncRedis
+from redis.exceptions import RedisError
+
+from cortexwatcher.logging import logger
+
+OUTBOX_PREFIX = "cortexwatcher:outbox"
+OUTBOX_CHATS_KEY = f"{OUTBOX_PREFIX}:chats"
+OUTBOX_DEAD_KEY = f"{OUTBOX_PREFIX}:dead"
+# Найстаріші повідомлення відкидаються, якщо відправник довго не працює
+OUTBOX_MAX_LEN = 10000
+DIGEST_MAX_ITEMS = 50
+NETWORK_BACKOFF_SECONDS = 5.0
+
+
+def outbox_key(chat_id: int | str) -> str:
+    return f"{OUTBOX_PREFIX}:chat:{chat_id}"
+
+
+def sending_key(chat_id: int | str) -> str:
+    """Список повідомлень чату, які відправник уже забрав, але ще не доставив."""
+
+    return f"{outbox_key(chat_id)}:sending"
+
+
+class AlertOutbox:
+    """Записує сповіщення в Redis-список окремо для кожного чату.
+
+    Аналізатор лише дописує повідомлення (``RPUSH``) і не чекає на Telegram;
+    відправляє їх ``OutboxSender`` в окремому процесі.
+    """
+
+    def __init__(self, redis: Redis, max_len: int = OUTBOX_MAX_LEN) -> None:
+        self.redis = redis
+        self.max_len = max_len
+
+    def enqueue(
+        self,
+        chat_ids: Iterable[int],
+        text: str,
+        title: str,
+        level: int,
+        thread_id: int | None = None,
+    ) -> None:
+        payload = json.dumps(
+            {
+                "text": text,
+                "title": title,
+                "level": level,
+                "thread_id": thread_id,
+                "ts": time.time(),
+            },
+            ensure_ascii=False,
+        )
+        pipe = self.redis.pipeline(transaction=False)
+        for chat_id in chat_ids:
+            key = outbox_key(chat_id)
+            pipe.rpush(key, payload)
+            pipe.ltrim(key, -self.max_len, -1)
+            # SADD після RPUSH: відправник, що щойно прибрав чат із множини, побачить його знову
+            pipe.sadd(OUTBOX_CHATS_KEY, chat_id)
+        pipe.execute()
+
+
+class TokenBucket:
+    """Відро токенів: ``rate`` токенів за секунду, не більше ``capacity``."""
+
+    def __init__(
+        self,
+        rate: float,
+        capacity: float,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self.rate = rate
+        self.capacity = capacity
+        self.clock = clock
+        self.tokens = capacity
+        self.updated = clock()
+
+    def _refill(self) -> None:
+        now = self.clock()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def ready(self) -> bool:
+        self._refill()
+        return self.tokens >= 1
+
+    def take(self) -> bool:
+        self._refill()
+        if self.tokens < 1:
+            return False
+        self.tokens -= 1
+        return True
+
+
+@dataclass
+class _ChatState:
+    bucket: TokenBucket
+    blocked_until: float = 0.0
+
+
+def format_digest(items: list[dict[str, Any]]) -> str:
+    """Зводить чергу чату в одне повідомлення зі списком заголовків."""
+
+    lines = [f"📦 *Зведення: {len(items)} алертів*"]
+    lines.extend(f"• {item.get('title', '')} (рівень {item.get('level', '?')})" for item in items)
+    return "\n".join(lines)
+
+
+class OutboxSender:
+    """Відправляє повідомлення з черги конкурентно по чатах.
+
+    На кожен чат — своє відро токенів (Telegram дозволяє близько 20
+    повідомлень на хвилину в групу), спільне відро обмежує загальну
+    швидкість бота. ``retry_after`` від Telegram блокує лише свій чат.
+    Якщо в черзі чату назбиралося ``digest_threshold`` повідомлень, до
+    ``DIGEST_MAX_ITEMS`` з них відправляються одним зведенням. Перед
+    відправкою повідомлення атомарно переносяться (``LMOVE``) у список
+    ``sending_key`` чату, тож ``LTRIM`` продюсера не зсуває їх; список
+    очищується лише після успішної відправки, а після ``retry_after`` ті самі
+    повідомлення відправляються знову. Відхилені Telegram і пошкоджені
+    записи потрапляють у ``cortexwatcher:outbox:dead``. Розраховано на один
+    процес-відправник.
+    """
+
+    def __init__(  # noqa: PLR0913 - ліміти відправника з конфігурації
+        self,
+        redis: AsyncRedis,
+        send: Callable[..., Awaitable[Any]],
+        *,
+        chat_per_minute: float = 20,
+        global_per_second: float = 25,
+        digest_threshold: int = 10,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self.redis = redis
+        self.send = send
+        self.chat_rate = chat_per_minute / 60
+        self.chat_burst = max(1.0, min(3.0, chat_per_minute))
+        self.global_bucket = TokenBucket(global_per_second, global_per_second, clock)
+        self.digest_threshold = digest_threshold
+        self.clock = clock
+        self.chats: dict[str, _ChatState] = {}
+
+    def _state(self, chat_id: str) -> _ChatState:
+        state = self.chats.get(chat_id)
+        if state is None:
+            bucket = TokenBucket(self.chat_rate, self.chat_burst, self.clock)
+            state = self.chats[chat_id] = _ChatState(bucket)
+        return state
+
+    async def run_once(self) -> int:
+        """Один прохід по чатах із готовими токенами; повертає кількість відправлених."""
+
+        members = await self.redis.smembers(OUTBOX_CHATS_KEY)
+        now = self.clock()
+        ready = []
+        for raw in members:
+            chat_id = raw.decode() if isinstance(raw, bytes) else str(raw)
+            state = self._state(chat_id)
+            if state.blocked_until <= now and state.bucket.ready():
+                ready.append(chat_id)
+        results = await asyncio.gather(*(self._drain_chat_safely(chat_id) for chat_id in ready))
+        return sum(results)
+
+    async def run(self, idle_seconds: float = 0.5) -> None:
+        while True:
+            try:
+                sent = await self.run_once()
+            except RedisError as exc:
+                logger.warning("Черга сповіщень недоступна", error=str(exc))
+                sent = 0
+            if not sent:
+                await asyncio.sleep(idle_seconds)
+
+    async def _drain_chat_safely(self, chat_id: str) -> int:
+        """Як ``_drain_chat``, але несподівана помилка одного чату не зупиняє решту."""
+
+        try:
+            return await self._drain_chat(chat_id)
+        except RedisError:
+            raise
+        except Exception as exc:  # noqa: BLE001 - ізолюємо збій одного чату
+            self._state(chat_id).blocked_until = self.clock() + NETWORK_BACKOFF_SECONDS
+            logger.error("Не вдалося відправити сповіщення чату", chat_id=chat_id, error=str(exc))
+            return 0
+
+    async def _drain_chat(self, chat_id: str) -> int:
+        key = outbox_key(chat_id)
+        sending = sending_key(chat_id)
+        # Недоставлене з попереднього проходу (retry_after, мережа) — першим
+        raw_items = await self.redis.lrange(sending, 0, -1)
+        length = len(raw_items) or await self.redis.llen(key)
+        if not length:
+            await self.redis.srem(OUTBOX_CHATS_KEY, chat_id)
+            # Повідомлення могло зʼявитися між LLEN і SREM — повертаємо чат
+            if await self.redis.llen(key):
+                await self.redis.sadd(OUTBOX_CHATS_KEY, chat_id)
+            return 0
+        if not self.global_bucket.take():
+            return 0
+        state = self._state(chat_id)
+        state.bucket.take()
+        if not raw_items:
+            count = min(length, DIGEST_MAX_ITEMS) if length >= self.digest_threshold else 1
+            raw_items = await self._claim(key, sending, count)
+        raw_items, items = await self._decode(sending, raw_items)
+        if not items:
+            return 0
+        return await self._deliver(chat_id, state, raw_items, items)
+
+    async def _claim(self, key: str, sending: str, count: int) -> list[bytes | str]:
+        """Атомарно переносить до ``count`` повідомлень із голови черги в ``sending``."""
+
+        pipe = self.redis.pipeline(transaction=True)
+        for _ in range(count):
+            pipe.lmove(key, sending, "LEFT", "RIGHT")
+        moved = await pipe.execute()
+        return [item for item in moved if item is not None]
+
+    async def _decode(
+        self, sending: str, raw_items: list[bytes | str],
+    ) -> tuple[list[bytes | str], list[dict[str, Any]]]:
+        """Розбирає повідомлення; пошкоджені переносить у ``OUTBOX_DEAD_KEY``."""
+
+        kept: list[bytes | str] = []
+        items: list[dict[str, Any]] = []
+        broken: list[bytes | str] = []
+        for raw in raw_items:
+            try:
+                item = json.loads(raw)
+            except ValueError:
+                item = None
+            if isinstance(item, dict):
+                kept.append(raw)
+                items.append(item)
+            else:
+                broken.append(raw)
+        if broken:
+            logger.error("Пошкоджені сповіщення в черзі", count=len(broken))
+            pipe = self.redis.pipeline(transaction=True)
+            pipe.rpush(OUTBOX_DEAD_KEY, *broken)
+            pipe.ltrim(OUTBOX_DEAD_KEY, -OUTBOX_MAX_LEN, -1)
+            pipe.delete(sending)
+            if kept:
+                pipe.rpush(sending, *kept)
+            await pipe.execute()
+        return kept, items
+
+    async def _deliver(
+        self,
+        chat_id: str,
+        state: _ChatState,
+        raw_items: list[bytes | str],
+        items: list[dict[str, Any]],
+    ) -> int:
+        sending = sending_key(chat_id)
+        text = format_digest(items) if len(items) > 1 else items[0]["text"]
+        thread_id = items[0].get("thread_id")
+        try:
+            await self.send(chat_id=int(chat_id), text=text, message_thread_id=thread_id)
+        except TelegramRetryAfter as exc:
+            state.blocked_until = self.clock() + exc.retry_after
+            logger.warning(
+                "Telegram просить зачекати",
+                chat_id=chat_id,
+                retry_after=exc.retry_after,
+            )
+            return 0
+        except TelegramNetworkError as exc:
+            state.blocked_until = self.clock() + NETWORK_BACKOFF_SECONDS
+            logger.warning("Мережева помилка Telegram", chat_id=chat_id, error=str(exc))
+            return 0
+        except TelegramAPIError as exc:
+            logger.error("Telegram відхилив сповіщення", chat_id=chat_id, error=str(exc))
+            pipe = self.redis.pipeline(transaction=False)
+            pipe.rpush(OUTBOX_DEAD_KEY, *raw_items)
+            pipe.ltrim(OUTBOX_DEAD_KEY, -OUTBOX_MAX_LEN, -1)
+            pipe.delete(sending)
+            await pipe.execute()
+            return 0
+        await self.redis.delete(sending)
+        return 1
+
+
+__all__ = [
+    "AlertOutbox",
+    "OutboxSender",
+    "TokenBucket",
+    "OUTBOX_CHATS_KEY",
+    "OUTBOX_DEAD_KEY",
+    "format_digest",
+    "outbox_key",
+    "sending_key",
+]
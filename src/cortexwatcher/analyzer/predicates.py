@@ -0,0 +1,230 @@
+"""Умови правил на полях запису та вкладених полях ``meta_json``.
+
+Умова — рядок ``<шлях> <оператор> <значення>``, наприклад ``rule.level >= 10``,
+``alert.severity in [1, 2]``, ``http.status between 500 599``. Під час
+завантаження правил кожна умова компілюється в замикання: шлях розбивається
+один раз, значення розбирається й приводиться до потрібного типу, тож на
+подію залишається лише прохід по словниках і порівняння.
+
+Шлях шукається спершу в записі аналізатора (``host``, ``app``, ``severity``,
+``srcip``…), а якщо там такого поля немає — у ``meta`` (``meta_json`` логу).
+Префікс ``meta.`` явно вказує на ``meta_json``. Умова з відсутнім полем
+не виконується (крім ``not exists``).
+"""
+from __future__ import annotations
+
+import re
+from collections.abc import Callable, Mapping, Sequence
+from typing import TYPE_CHECKING, Any
+
+import yaml
+
+if TYPE_CHECKING:
+    from cortexwatcher.analyzer.indicators import IndicatorRegistry
+
+Predicate = Callable[[Mapping[str, object]], bool]
+Accessor = Callable[[Mapping[str, object]], object]
+
+_SYMBOLIC = re.compile(r"^\s*(?P<path>[\w.\-]+)\s*(?P<op>==|!=|>=|<=|>|<)\s*(?P<value>.+?)\s*$")
+_WORD = re.compile(
+    r"^\s*(?P<path>[\w.\-]+)\s+"
+    r"(?P<op>not\s+in\s+set|in\s+set|not\s+in|in|between|not\s+exists|exists|matches)\b"
+    r"\s*(?P<value>.*?)\s*$",
+)
+# Кількість меж у ``between``
+_RANGE_BOUNDS = 2
+
+
+def compile_accessor(path: str) -> Accessor:
+    """Функція, що дістає значення за шляхом через крапку."""
+
+    parts = tuple(path.split("."))
+    if parts[0] == "meta" and len(parts) > 1:
+        keys = parts[1:]
+
+        def from_meta(record: Mapping[str, object]) -> object:
+            return _walk(record.get("meta"), keys)
+
+        return from_meta
+
+    head, rest = parts[0], parts[1:]
+
+    def get(record: Mapping[str, object]) -> object:
+        value = record.get(head)
+        if value is None:
+            return _walk(record.get("meta"), parts)
+        return _walk(value, rest) if rest else value
+
+    return get
+
+
+def _walk(value: object, keys: Sequence[str]) -> object:
+    for key in keys:
+        if not isinstance(value, Mapping):
+            return None
+        value = value.get(key)
+    return value
+
+
+def _number(value: object) -> float | None:
+    if isinstance(value, bool) or value is None:
+        return None
+    if isinstance(value, (int, float)):
+        return float(value)
+    if isinstance(value, str):
+        try:
+            return float(value)
+        except ValueError:
+            return None
+    return None
+
+
+def _literal(text: str) -> Any:
+    try:
+        return yaml.safe_load(text)
+    except yaml.YAMLError:
+        return text
+
+
+def compile_condition(expression: str, indicators: IndicatorRegistry | None = None) -> Predicate:
+    """Компілює одну умову; ``ValueError``, якщо її не вдалося розібрати.
+
+    ``in set``/``not in set`` посилаються на набори з ``indicators``; сам
+    набір береться з реєстру під час перевірки, тож його перезавантаження
+    не потребує перекомпіляції правил.
+    """
+
+    match = _SYMBOLIC.match(expression) or _WORD.match(expression)
+    if match is None:
+        raise ValueError(f"некоректна умова {expression!r}")
+    get = compile_accessor(match.group("path"))
+    op = " ".join(match.group("op").split())
+    raw = match.group("value")
+
+    if op in ("exists", "not exists"):
+        if raw:
+            raise ValueError(f"умова {expression!r}: {op} не має значення")
+        present = op == "exists"
+        return lambda record: (get(record) is not None) is present
+
+    if not raw:
+        raise ValueError(f"умова {expression!r}: бракує значення")
+    if op in ("in set", "not in set"):
+        return _in_set(expression, get, op, raw, indicators)
+    if op in (">", ">=", "<", "<="):
+        bound = _number(_literal(raw))
+        if bound is None:
+            raise ValueError(f"умова {expression!r}: {op} потребує числа")
+        return _compare(get, op, bound)
+    if op == "between":
+        return _between(expression, get, raw)
+    if op == "matches":
+        return _matches(expression, get, raw)
+    return _equality(expression, get, op, raw)
+
+
+def _in_set(
+    expression: str,
+    get: Accessor,
+    op: str,
+    raw: str,
+    indicators: IndicatorRegistry | None,
+) -> Predicate:
+    if indicators is None or raw not in indicators.names:
+        raise ValueError(f"умова {expression!r}: невідомий набір індикаторів {raw!r}")
+    in_set, name = indicators.contains, raw
+    if op == "in set":
+        return lambda record: (value := get(record)) is not None and in_set(name, value)
+    return lambda record: (value := get(record)) is not None and not in_set(name, value)
+
+
+def _between(expression: str, get: Accessor, raw: str) -> Predicate:
+    numbers = [_number(_literal(part)) for part in raw.replace(",", " ").split()]
+    bounds = sorted(number for number in numbers if number is not None)
+    if len(numbers) != _RANGE_BOUNDS or len(bounds) != _RANGE_BOUNDS:
+        raise ValueError(f"умова {expression!r}: between потребує двох чисел")
+    low, high = bounds
+
+    def between(record: Mapping[str, object]) -> bool:
+        number = _number(get(record))
+        return number is not None and low <= number <= high
+
+    return between
+
+
+def _matches(expression: str, get: Accessor, raw: str) -> Predicate:
+    pattern = raw[1:-1] if len(raw) > 1 and raw.startswith("/") and raw.endswith("/") else raw
+    try:
+        regex = re.compile(pattern, re.IGNORECASE)
+    except re.error as exc:
+        raise ValueError(f"умова {expression!r}: {exc}") from exc
+
+    def matches(record: Mapping[str, object]) -> bool:
+        value = get(record)
+        return value is not None and regex.search(str(value)) is not None
+
+    return matches
+
+
+def _equality(expression: str, get: Accessor, op: str, raw: str) -> Predicate:
+    value = _literal(raw)
+    if op in ("in", "not in"):
+        if not isinstance(value, list):
+            raise ValueError(f"умова {expression!r}: {op} потребує списку [..]")
+        options = value
+    else:
+        options = [value]
+    is_member = _membership(get, options)
+    if op in ("==", "in"):
+        return is_member
+    return lambda record: get(record) is not None and not is_member(record)
+
+
+def _compare(get: Accessor, op: str, bound: float) -> Predicate:
+    if op == ">":
+        return lambda record: (number := _number(get(record))) is not None and number > bound
+    if op == ">=":
+        return lambda record: (number := _number(get(record))) is not None and number >= bound
+    if op == "<":
+        return lambda record: (number := _number(get(record))) is not None and number < bound
+    return lambda record: (number := _number(get(record))) is not None and number <= bound
+
+
+def _membership(get: Accessor, options: Sequence[Any]) -> Predicate:
+    """Числа порівнюються як числа (``"500" == 500``), решта — як рядки."""
+
+    numbers = frozenset(number for number in map(_number, options) if number is not None)
+    strings = frozenset(str(option) for option in options if _number(option) is None)
+
+    def contains(record: Mapping[str, object]) -> bool:
+        value = get(record)
+        if value is None:
+            return False
+        if numbers:
+            number = _number(value)
+            if number is not None and number in numbers:
+                return True
+        return str(value) in strings
+
+    return contains
+
+
+def compile_conditions(
+    expressions: Sequence[str],
+    indicators: IndicatorRegistry | None = None,
+) -> Predicate | None:
+    """Обʼєднує умови правила через «і»; ``None``, якщо умов немає."""
+
+    predicates = tuple(compile_condition(expression, indicators) for expression in expressions)
+    if not predicates:
+        return None
+    if len(predicates) == 1:
+        return predicates[0]
+
+    def every(record: Mapping[str, object]) -> bool:
+        return all(predicate(record) for predicate in predicates)
+
+    return every
+
+
+__all__ = ["Predicate", "compile_accessor", "compile_condition", "compile_conditions"]
@@ -0,0 +1,209 @@
+"""Вибіркове профілювання правил і перевірка regex на катастрофічний бектрекінг.
+
+Команда ``cortexwatcher-rules-profile``, що проганяє корпус логів через набір
+правил, живе в ``cortexwatcher.analyzer.rules_profile``.
+"""
+from __future__ import annotations
+
+import importlib
+from collections.abc import Iterable, Sequence
+from dataclasses import dataclass
+from typing import Any
+
+from cortexwatcher.analyzer.metrics import RULE_EVAL_SECONDS, RULE_EVALUATIONS, RULE_MATCHES
+
+# Публічного API для розбору regex немає; re._parser — той самий розбірник, що й у
+# re.compile (до Python 3.11 — sre_parse). Без жодного з них перевірка regex вимикається
+sre_parse: Any
+sre_constants: Any
+try:
+    sre_parse = importlib.import_module("re._parser")
+    sre_constants = importlib.import_module("re._constants")
+except ImportError:
+    try:
+        sre_parse = importlib.import_module("sre_parse")
+        sre_constants = importlib.import_module("sre_constants")
+    except ImportError:
+        sre_parse = sre_constants = None
+
+if sre_constants is not None:
+    _REPEATS = frozenset({sre_constants.MAX_REPEAT, sre_constants.MIN_REPEAT})
+    _UNBOUNDED = sre_constants.MAXREPEAT
+else:
+    _REPEATS = frozenset()
+    _UNBOUNDED = None
+# Ширші діапазони класу символів вважаються «будь-яким символом»
+_MAX_RANGE_CHARS = 256
+
+
+@dataclass
+class RuleCost:
+    """Накопичена на вибірці вартість одного правила."""
+
+    evaluations: int = 0
+    matches: int = 0
+    seconds: float = 0.0
+
+    @property
+    def micros_per_eval(self) -> float:
+        return self.seconds / self.evaluations * 1e6 if self.evaluations else 0.0
+
+
+class RuleProfiler:
+    """Замірює кожне правило окремо на кожному ``every``-му записі.
+
+    Звичайний шлях ``CompiledRuleSet.match`` не змінюється; раз на
+    ``every`` записів рушій викликає ``CompiledRuleSet.profile``, який
+    повертає час і результат перевірки шаблонів кожного застосовного
+    правила. Prometheus-лічильники збільшуються на ``every`` за кожен
+    замір, тож показують оцінку повних значень.
+    """
+
+    def __init__(self, sample_rate: float, export: bool = True) -> None:
+        if not 0 < sample_rate <= 1:
+            raise ValueError("Частка вибірки має бути в межах (0, 1]")
+        self.every = max(1, round(1 / sample_rate))
+        self.export = export
+        self.sampled = 0
+        self.stats: dict[str, RuleCost] = {}
+        self._countdown = self.every
+
+    def should_sample(self) -> bool:
+        self._countdown -= 1
+        if self._countdown:
+            return False
+        self._countdown = self.every
+        return True
+
+    def record(self, costs: Iterable[tuple[str, bool, float]]) -> None:
+        """Додає заміри одного запису: ``(rule_id, збіг, секунди)``."""
+
+        self.sampled += 1
+        for rule_id, matched, seconds in costs:
+            stat = self.stats.get(rule_id)
+            if stat is None:
+                stat = self.stats[rule_id] = RuleCost()
+            stat.evaluations += 1
+            stat.matches += matched
+            stat.seconds += seconds
+            if self.export:
+                RULE_EVALUATIONS.labels(rule_id).inc(self.every)
+                if matched:
+                    RULE_MATCHES.labels(rule_id).inc(self.every)
+                RULE_EVAL_SECONDS.labels(rule_id).inc(seconds * self.every)
+
+    def ranking(self, limit: int | None = None) -> list[tuple[str, RuleCost]]:
+        """Правила за спаданням сумарного часу."""
+
+        ranked = sorted(self.stats.items(), key=lambda item: (-item[1].seconds, item[0]))
+        return ranked[:limit] if limit is not None else ranked
+
+
+def regex_risks(pattern: str) -> list[str]:
+    """Ознаки шаблону, що можуть дати експоненційний чи поліноміальний бектрекінг.
+
+    Перевірка статична й консервативна: помічаються квантифікатори змінної
+    довжини всередині необмеженого (``(a+)+``, ``(a{2,5})*``), квантифікована
+    альтернатива з перекривними гілками (``(a|a?b)*``) та сусідні необмежені повтори
+    того самого класу (``\\s*\\s*``, ``.*.*``). Якщо розбірник regex
+    недоступний, повертається порожній список.
+    """
+
+    if sre_parse is None:
+        return []
+    try:
+        parsed = sre_parse.parse(pattern)
+    except (sre_constants.error, RecursionError, OverflowError):
+        return []
+    risks: list[str] = []
+    _scan(list(parsed), False, risks)
+    return list(dict.fromkeys(risks))
+
+
+def _scan(items: Sequence[tuple[Any, Any]], inside_unbounded: bool, risks: list[str]) -> None:
+    previous: Any = None
+    for op, av in items:
+        current = None
+        if op in _REPEATS:
+            low, high, sub = av
+            unbounded = high == _UNBOUNDED
+            if inside_unbounded and low != high:
+                risks.append("вкладені квантифікатори змінної довжини")
+            if unbounded and _has_overlapping_branch(sub):
+                risks.append("квантифікована альтернатива з перекривними гілками")
+            if unbounded:
+                current = _repeat_signature(sub)
+                if current is not None and current == previous:
+                    risks.append("сусідні необмежені повтори того самого класу")
+            _scan(list(sub), inside_unbounded or unbounded, risks)
+        elif op == sre_constants.POSSESSIVE_REPEAT:
+            # Присвійні квантифікатори й атомарні групи не повертаються назад
+            _scan(list(av[2]), False, risks)
+        elif op == sre_constants.ATOMIC_GROUP:
+            _scan(list(av), False, risks)
+        elif op == sre_constants.SUBPATTERN:
+            _scan(list(av[-1]), inside_unbounded, risks)
+        elif op == sre_constants.BRANCH:
+            for branch in av[1]:
+                _scan(list(branch), inside_unbounded, risks)
+        elif op in (sre_constants.ASSERT, sre_constants.ASSERT_NOT):
+            _scan(list(av[1]), inside_unbounded, risks)
+        previous = current
+
+
+def _has_overlapping_branch(items: Sequence[tuple[Any, Any]]) -> bool:
+    for op, av in items:
+        if op == sre_constants.SUBPATTERN:
+            if _has_overlapping_branch(av[-1]):
+                return True
+        elif op == sre_constants.BRANCH:
+            firsts = [_first_chars(branch) for branch in av[1]]
+            for index, left in enumerate(firsts):
+                for right in firsts[index + 1 :]:
+                    if left is None or right is None or left & right:
+                        return True
+    return False
+
+
+def _first_chars(items: Sequence[tuple[Any, Any]]) -> frozenset[int] | None:
+    """Множина можливих перших символів; None — будь-який або невідомо."""
+
+    for op, av in items:
+        if op == sre_constants.LITERAL:
+            return frozenset({av})
+        if op == sre_constants.AT:
+            continue
+        if op == sre_constants.IN:
+            return _class_chars(av)
+        if op == sre_constants.SUBPATTERN:
+            return _first_chars(av[-1])
+        if op in _REPEATS and av[0] > 0:
+            return _first_chars(av[2])
+        return None
+    # Порожня гілка перекривається з будь-якою іншою
+    return None
+
+
+def _class_chars(items: Sequence[tuple[Any, Any]]) -> frozenset[int] | None:
+    chars: set[int] = set()
+    for kind, value in items:
+        if kind == sre_constants.LITERAL:
+            chars.add(value)
+        elif kind == sre_constants.RANGE and value[1] - value[0] < _MAX_RANGE_CHARS:
+            chars.update(range(value[0], value[1] + 1))
+        else:
+            return None
+    return frozenset(chars)
+
+
+def _repeat_signature(items: Sequence[tuple[Any, Any]]) -> str | None:
+    if len(items) != 1:
+        return None
+    op, av = items[0]
+    single = (sre_constants.ANY, sre_constants.IN, sre_constants.LITERAL, sre_constants.NOT_LITERAL)
+    if op in single:
+        return f"{op}:{av}"
+    return None
+
+
+__all__ = ["RuleCost", "RuleProfiler", "regex_risks"]
@@ -0,0 +1,224 @@
+"""Гаряче перезавантаження правил і синхронізація версій між репліками."""
+from __future__ import annotations
+
+import asyncio
+import json
+import os
+import socket
+import time
+from collections.abc import Mapping
+from contextlib import suppress
+from datetime import UTC, datetime, timedelta
+from typing import Any
+
+from redis import Redis
+from redis.client import PubSub
+from redis.exceptions import RedisError
+
+from cortexwatcher.analyzer.rules_engine import RuleEngine
+from cortexwatcher.logging import logger
+
+RULES_CHANNEL = "cortexwatcher:rules:updated"
+RULES_VERSIONS_KEY = "cortexwatcher:rules:versions"
+# Запис репліки, що не оновлювався довше, вважається залишком зупиненого процесу
+REPLICA_TTL_SECONDS = 60.0
+
+
+def default_replica_id(role: str) -> str:
+    """Ідентифікатор репліки: роль, хост і pid процесу."""
+
+    return f"{role}:{socket.gethostname()}:{os.getpid()}"
+
+
+def live_replicas(
+    raw: Mapping[Any, Any],
+    now: datetime | None = None,
+) -> tuple[dict[str, dict[str, Any]], list[str]]:
+    """Ділить хеш ``RULES_VERSIONS_KEY`` на живі записи й ідентифікатори застарілих.
+
+    Застарілий — запис без коректного ``seen_at`` або з ``seen_at``, старшим
+    за ``REPLICA_TTL_SECONDS``.
+    """
+
+    cutoff = (now or datetime.now(UTC)) - timedelta(seconds=REPLICA_TTL_SECONDS)
+    live: dict[str, dict[str, Any]] = {}
+    stale: list[str] = []
+    for replica_id, value in raw.items():
+        key = replica_id.decode() if isinstance(replica_id, bytes) else str(replica_id)
+        try:
+            state = json.loads(value)
+            seen_at = datetime.fromisoformat(state["seen_at"])
+        except (TypeError, ValueError, KeyError):
+            stale.append(key)
+            continue
+        if seen_at.tzinfo is None or seen_at < cutoff:
+            stale.append(key)
+            continue
+        live[key] = state
+    return live, stale
+
+
+class RuleReloader:
+    """Стежить за файлом правил і сигналами Redis, підміняючи набір на льоту.
+
+    Зміну файлу виявляємо опитуванням mtime не частіше ніж раз на
+    ``poll_interval`` секунд. Репліка, що першою помітила нову версію,
+    публікує її в канал ``RULES_CHANNEL``; решта перечитує файл одразу,
+    не чекаючи свого опитування. Активна версія кожної репліки пишеться в
+    хеш ``RULES_VERSIONS_KEY`` для ендпоінта ``/rules`` і оновлюється
+    (``seen_at``) на кожному опитуванні; записи, що не оновлювалися
+    ``REPLICA_TTL_SECONDS``, прибирає з хешу будь-яка жива репліка.
+
+    Під час того самого опитування перечитуються змінені файли наборів
+    індикаторів рушія. Клієнт Redis синхронний, тож у ``poll`` звернення до
+    нього виконуються поза циклом подій.
+    """
+
+    def __init__(
+        self,
+        engine: RuleEngine,
+        redis: Redis | None = None,
+        replica_id: str | None = None,
+        poll_interval: float = 5.0,
+    ) -> None:
+        self.engine = engine
+        self.redis = redis
+        self.replica_id = replica_id or default_replica_id("analyzer")
+        self.poll_interval = poll_interval
+        self._pubsub: PubSub | None = None
+        self._last_poll = float("-inf")
+        self._loaded_at = datetime.now(UTC)
+
+    def start(self) -> None:
+        """Підписується на канал оновлень і реєструє поточну версію."""
+
+        if self.redis is not None and self._pubsub is None:
+            try:
+                # Redis.pubsub у redis-py не анотований
+                pubsub = self.redis.pubsub(ignore_subscribe_messages=True)  # type: ignore[no-untyped-call]
+                pubsub.subscribe(RULES_CHANNEL)
+                self._pubsub = pubsub
+            except RedisError as exc:
+                logger.warning("Не вдалося підписатися на оновлення правил", error=str(exc))
+        self._report()
+
+    async def poll(self, force: bool = False) -> bool:
+        """Перевіряє сигнали та файл; повертає True, якщо набір правил підмінено."""
+
+        now = time.monotonic()
+        signalled = self._pubsub is not None and await asyncio.to_thread(self._drain_signals)
+        if not signalled and not force and now - self._last_poll < self.poll_interval:
+            return False
+        self._last_poll = now
+        await asyncio.to_thread(self._heartbeat)
+        await self._reload_indicators()
+        changed_on_disk = self.engine.changed_on_disk()
+        if not (signalled or changed_on_disk or force):
+            return False
+        previous = self.engine.version
+        try:
+            updated = await self.engine.reload_async()
+        except Exception as exc:  # noqa: BLE001 - лишаємо попередній набір активним
+            logger.error(
+                "Не вдалося перезавантажити правила",
+                error=str(exc),
+                path=str(self.engine.rules_path),
+            )
+            return False
+        if not updated:
+            return False
+        self._loaded_at = datetime.now(UTC)
+        logger.info("Правила перезавантажено", previous=previous, version=self.engine.version)
+        await asyncio.to_thread(self._announce, changed_on_disk)
+        return True
+
+    async def _reload_indicators(self) -> None:
+        indicators = self.engine.indicators
+        if indicators is None or not indicators.changed_on_disk():
+            return
+        # Набори підміняються в реєстрі, тож правила підхоплюють їх без перекомпіляції
+        reloaded = await asyncio.to_thread(indicators.reload)
+        if reloaded:
+            self._loaded_at = datetime.now(UTC)
+            await asyncio.to_thread(self._report)
+
+    def _drain_signals(self) -> bool:
+        if self._pubsub is None:
+            return False
+        signalled = False
+        try:
+            while True:
+                message = self._pubsub.get_message(timeout=0)
+                if message is None:
+                    break
+                data = message.get("data")
+                version = data.decode() if isinstance(data, bytes) else str(data)
+                if version != self.engine.version:
+                    signalled = True
+        except RedisError as exc:
+            logger.warning("Помилка читання сигналів оновлення правил", error=str(exc))
+        return signalled
+
+    def _announce(self, publish: bool) -> None:
+        self._report()
+        if publish:
+            self._publish()
+
+    def _publish(self) -> None:
+        if self.redis is None:
+            return
+        with suppress(RedisError):
+            self.redis.publish(RULES_CHANNEL, self.engine.version)
+
+    def _report(self) -> None:
+        if self.redis is None:
+            return
+        with suppress(RedisError):
+            self.redis.hset(RULES_VERSIONS_KEY, self.replica_id, json.dumps(self.state()))
+
+    def _heartbeat(self) -> None:
+        """Оновлює свій запис і прибирає записи реплік, що зупинилися без ``close``."""
+
+        if self.redis is None:
+            return
+        self._report()
+        try:
+            _, stale = live_replicas(self.redis.hgetall(RULES_VERSIONS_KEY))
+            if stale:
+                self.redis.hdel(RULES_VERSIONS_KEY, *stale)
+        except RedisError as exc:
+            logger.warning("Не вдалося прибрати застарілі записи реплік", error=str(exc))
+
+    def state(self) -> dict[str, Any]:
+        """Опис активного набору для звітності."""
+
+        indicators = self.engine.indicators
+        return {
+            "version": self.engine.version,
+            "rules": len(self.engine.rules),
+            "path": str(self.engine.rules_path),
+            "indicators": indicators.sizes() if indicators is not None else {},
+            "loaded_at": self._loaded_at.isoformat(),
+            "seen_at": datetime.now(UTC).isoformat(),
+        }
+
+    def close(self) -> None:
+        """Відписується від каналу та прибирає запис репліки."""
+
+        if self._pubsub is not None:
+            with suppress(RedisError):
+                self._pubsub.close()
+            self._pubsub = None
+        if self.redis is not None:
+            with suppress(RedisError):
+                self.redis.hdel(RULES_VERSIONS_KEY, self.replica_id)
+
+
+__all__ = [
+    "REPLICA_TTL_SECONDS",
+    "RULES_CHANNEL",
+    "RULES_VERSIONS_KEY",
+    "RuleReloader",
+    "default_replica_id",
+    "live_replicas",
+]
@@ -1,14 +1,28 @@
 """Простий рушій правил на основі YAML."""
 from __future__ import annotations
 
+import asyncio
 import fnmatch
+import hashlib
 import re
+from collections import OrderedDict
+from collections.abc import Iterable, Mapping, Sequence
 from dataclasses import dataclass, field
 from pathlib import Path
-from typing import Iterable, List, Sequence
+from time import perf_counter
+from typing import TYPE_CHECKING, Any
 
 import yaml
 
+from cortexwatcher.analyzer.metrics import RULE_MATCH_CACHE_HITS, RULE_MATCH_CACHE_MISSES
+from cortexwatcher.analyzer.predicates import Predicate, compile_conditions
+from cortexwatcher.analyzer.profiler import RuleProfiler
+from cortexwatcher.analyzer.stateful import RuleState
+
+if TYPE_CHECKING:
+    from cortexwatcher.analyzer.indicators import IndicatorRegistry
+    from cortexwatcher.analyzer.sketches import KllSketch
+
 
 @dataclass
 class Rule:
@@ -21,67 +35,531 @@ class Rule:
     patterns: Sequence[str] = field(default_factory=list)
     tags: Sequence[str] = field(default_factory=list)
     filters: dict[str, Sequence[str]] = field(default_factory=dict)
+    threshold: int | None = None
+    window: int | None = None
+    group_by: Sequence[str] = field(default_factory=list)
+    sequence: Sequence[dict[str, Any]] = field(default_factory=list)
+    within: int | None = None
+    quantile: dict[str, Any] | None = None
+    where: Sequence[str] = field(default_factory=list)
+
+
+@dataclass(frozen=True)
+class CompiledRule:
+    """Правило з попередньо скомпільованими шаблонами."""
+
+    rule: Rule
+    index: int
+    regexes: tuple[re.Pattern[str], ...]
+    globs: tuple[re.Pattern[str], ...]
+    has_literals: bool
+    requires_pattern: bool
+    predicate: Predicate | None = None
+
+
+@dataclass(frozen=True)
+class RulePrefilter:
+    """Які логи можуть спрацювати хоч на одне правило набору.
+
+    ``apps``/``hosts`` — обʼєднання точних значень фільтрів; лог є
+    кандидатом, якщо його ``app`` або ``host`` входить у відповідну
+    множину. ``wildcard`` означає, що є правило без точного фільтра
+    (glob, лише ``severity`` або без фільтрів) і відсіяти нічого не можна.
+    """
+
+    apps: frozenset[str]
+    hosts: frozenset[str]
+    wildcard: bool
+
+    def admits(self, app: object, host: object) -> bool:
+        return self.wildcard or app in self.apps or host in self.hosts
+
+
+class LiteralMatcher:
+    """Мультишаблонний пошук підрядків за один прохід (аналог Aho-Corasick).
+
+    Усі літерали зводяться в префіксне дерево, яке компілюється в одну
+    регулярку; пошук відновлюється з позиції після початку попереднього
+    збігу, тож перекривні входження не губляться. Коротші літерали, що є
+    префіксами знайденого, враховуються через заздалегідь розкрите замикання.
+    """
+
+    def __init__(self, owners: Mapping[str, Iterable[int]]) -> None:
+        literals = {literal: frozenset(indexes) for literal, indexes in owners.items() if literal}
+        self._hits: dict[str, frozenset[int]] = {}
+        for literal, indexes in literals.items():
+            closure = set(indexes)
+            for other, other_indexes in literals.items():
+                if other != literal and literal.startswith(other):
+                    closure.update(other_indexes)
+            self._hits[literal] = frozenset(closure)
+        self._regex = re.compile(_trie_pattern(literals)) if literals else None
+
+    def scan(self, lowered: str) -> set[int]:
+        """Повертає індекси правил, чиї літерали входять у повідомлення."""
+
+        hits: set[int] = set()
+        if self._regex is None:
+            return hits
+        search = self._regex.search
+        match = search(lowered)
+        while match is not None:
+            hits.update(self._hits[match.group()])
+            match = search(lowered, match.start() + 1)
+        return hits
+
+
+_TrieNode = dict[str, "_TrieNode"]
+
+
+def _trie_pattern(words: Iterable[str]) -> str:
+    """Будує регулярку-дерево, що віддає найдовший літерал у кожній позиції."""
+
+    trie: _TrieNode = {}
+    for word in words:
+        node = trie
+        for char in word:
+            node = node.setdefault(char, {})
+        node[""] = {}
+
+    def build(node: _TrieNode) -> str:
+        branches = [re.escape(char) + build(child) for char, child in sorted(node.items()) if char]
+        if not branches:
+            return ""
+        if len(branches) == 1:
+            body = branches[0]
+            return f"(?:{body})?" if "" in node else body
+        body = "(?:" + "|".join(branches) + ")"
+        return body + "?" if "" in node else body
+
+    return build(trie)
+
+
+def _compile_where(rule: Rule, indicators: IndicatorRegistry | None) -> Predicate | None:
+    try:
+        return compile_conditions(rule.where, indicators)
+    except ValueError as exc:
+        raise ValueError(f"Правило {rule.id}: {exc}") from exc
+
+
+def _compile_rule(
+    rule: Rule,
+    index: int,
+    indicators: IndicatorRegistry | None = None,
+) -> tuple[CompiledRule, list[str]]:
+    regexes: list[re.Pattern[str]] = []
+    globs: list[re.Pattern[str]] = []
+    literals: list[str] = []
+    for pattern in rule.patterns:
+        if not pattern:
+            continue
+        if pattern.startswith("/") and pattern.endswith("/"):
+            try:
+                regexes.append(re.compile(pattern.strip("/"), re.IGNORECASE))
+            except re.error:
+                continue
+        elif _is_glob(pattern):
+            globs.append(re.compile(fnmatch.translate(pattern.lower())))
+        else:
+            literals.append(pattern.lower())
+    compiled = CompiledRule(
+        rule=rule,
+        index=index,
+        regexes=tuple(regexes),
+        globs=tuple(globs),
+        has_literals=bool(literals),
+        requires_pattern=bool(rule.patterns),
+        predicate=_compile_where(rule, indicators),
+    )
+    return compiled, literals
+
+
+FILTER_FIELDS = ("app", "host", "severity")
+# Спільний мультишаблонний пошук літералів профілюється окремим рядком
+LITERAL_SCAN_ID = "(literal-scan)"
+FilterKey = tuple[str | None, str | None, str | None]
+MatchKey = tuple[str, object, object, object]
+# Довгі повідомлення рідко повторюються дослівно, а в кеші займали б багато памʼяті
+MATCH_CACHE_MAX_MESSAGE = 2048
+
+
+class CompiledRuleSet:
+    """Незмінний набір правил, скомпільований один раз під час завантаження.
+
+    Правила з точними (без glob) значеннями фільтрів індексуються за цими
+    значеннями, решта потрапляє у невеликий залишковий список. Результат
+    фільтрації кешується для кожної різної трійки ``(host, app, severity)``.
+
+    Результат ``match`` залежить лише від повідомлення та цієї трійки, тож
+    для однакових повідомлень (health-check, cron, повторні 5xx) він
+    береться з LRU на ``match_cache_size`` записів. Кеш належить набору,
+    тому після перезавантаження правил нова версія починає з порожнього.
+    """
+
+    def __init__(
+        self,
+        rules: Sequence[Rule],
+        version: str = "",
+        filter_cache_size: int = 4096,
+        match_cache_size: int = 0,
+        indicators: IndicatorRegistry | None = None,
+    ) -> None:
+        self.rules: list[Rule] = list(rules)
+        self.version = version
+        self.compiled: list[CompiledRule] = []
+        owners: dict[str, set[int]] = {}
+        self._index: dict[str, dict[str, list[int]]] = {name: {} for name in FILTER_FIELDS}
+        self._residual: list[int] = []
+        for index, rule in enumerate(self.rules):
+            compiled, literals = _compile_rule(rule, index, indicators)
+            self.compiled.append(compiled)
+            for literal in literals:
+                owners.setdefault(literal, set()).add(index)
+            self._index_rule(rule, index)
+        self.literals = LiteralMatcher(owners)
+        self.quantile_rules: tuple[Rule, ...] = tuple(rule for rule in self.rules if rule.quantile)
+        self.prefilter = RulePrefilter(
+            apps=frozenset(self._index["app"]),
+            hosts=frozenset(self._index["host"]),
+            wildcard=bool(self._residual or self._index["severity"]),
+        )
+        self._filter_cache: OrderedDict[FilterKey, _Dispatch] = OrderedDict()
+        self._filter_cache_size = filter_cache_size
+        self._predicates = {
+            item.index: item.predicate for item in self.compiled if item.predicate is not None
+        }
+        self._match_cache: OrderedDict[MatchKey, tuple[int, ...]] = OrderedDict()
+        self._match_cache_size = match_cache_size
+
+    def _index_rule(self, rule: Rule, index: int) -> None:
+        if rule.sequence or rule.quantile:
+            # Послідовні правила веде RuleState, квантильні — закриті хвилинні скетчі
+            return
+        for name in FILTER_FIELDS:
+            allowed = rule.filters.get(name)
+            if allowed and not any(_is_glob(pattern) for pattern in allowed):
+                for value in allowed:
+                    self._index[name].setdefault(value, []).append(index)
+                return
+        self._residual.append(index)
+
+    def applicable(self, host: object, app: object, severity: object) -> tuple[Rule, ...]:
+        """Повертає правила, чиї фільтри пропускають цю трійку значень."""
+
+        return self._dispatch(host, app, severity).rules
+
+    def _dispatch(self, host: object, app: object, severity: object) -> _Dispatch:
+        key: FilterKey = (
+            None if host is None else str(host),
+            None if app is None else str(app),
+            None if severity is None else str(severity),
+        )
+        cached = self._filter_cache.get(key)
+        if cached is not None:
+            self._filter_cache.move_to_end(key)
+            return cached
+        values = {"host": key[0], "app": key[1], "severity": key[2]}
+        candidates = set(self._residual)
+        for name in FILTER_FIELDS:
+            value = values[name]
+            if value is not None:
+                candidates.update(self._index[name].get(value, ()))
+        dispatch = _Dispatch(
+            self.compiled[index]
+            for index in sorted(candidates)
+            if _check_filters(self.rules[index], values)
+        )
+        self._filter_cache[key] = dispatch
+        if len(self._filter_cache) > self._filter_cache_size:
+            self._filter_cache.popitem(last=False)
+        return dispatch
+
+    def match(self, record: Mapping[str, object]) -> list[Rule]:
+        """Повертає правила, що спрацювали для запису.
+
+        Кешується лише перевірка шаблонів; умови ``where`` залежать від
+        ``meta`` і перевіряються для кожного запису.
+        """
+
+        message = str(record.get("msg") or record.get("message") or "")
+        host, app, severity = record.get("host"), record.get("app"), record.get("severity")
+        if not self._match_cache_size or len(message) > MATCH_CACHE_MAX_MESSAGE:
+            return self._finish(self._evaluate(message, host, app, severity), record)
+        # Ключ — сам кортеж: словник порівнює його повністю, тож колізії хешу не дають хибних збігів
+        key = (message, host, app, severity)
+        cached = self._match_cache.get(key)
+        if cached is not None:
+            self._match_cache.move_to_end(key)
+            RULE_MATCH_CACHE_HITS.inc()
+            return self._finish(cached, record)
+        RULE_MATCH_CACHE_MISSES.inc()
+        matched = tuple(self._evaluate(message, host, app, severity))
+        self._match_cache[key] = matched
+        if len(self._match_cache) > self._match_cache_size:
+            self._match_cache.popitem(last=False)
+        return self._finish(matched, record)
+
+    def _finish(self, indexes: Sequence[int], record: Mapping[str, object]) -> list[Rule]:
+        predicates = self._predicates
+        if not predicates:
+            return [self.rules[index] for index in indexes]
+        return [
+            self.rules[index]
+            for index in indexes
+            if (predicate := predicates.get(index)) is None or predicate(record)
+        ]
+
+    def _evaluate(self, message: str, host: object, app: object, severity: object) -> list[int]:
+        dispatch = self._dispatch(host, app, severity)
+        if not dispatch.rules:
+            return []
+        matched = list(dispatch.unconditional)
+        if dispatch.literal_only or dispatch.expressive:
+            lowered = message.lower()
+            hits = self.literals.scan(lowered) if dispatch.scans_literals else set()
+            matched.extend(hits & dispatch.literal_only)
+            for compiled in dispatch.expressive:
+                if compiled.index in hits or _expressions_match(compiled, message, lowered):
+                    matched.append(compiled.index)
+            matched.sort()
+        return matched
+
+    def profile(
+        self,
+        record: Mapping[str, object],
+    ) -> tuple[list[Rule], list[tuple[str, bool, float]]]:
+        """Як ``match``, але ще й замірює перевірку шаблонів кожного правила.
+
+        Повертає спрацювання та ``(rule_id, збіг, секунди)`` для кожного
+        застосовного правила. Правила лише з літералами перевіряються
+        спільним пошуком, час якого записується під ``LITERAL_SCAN_ID``.
+        """
+
+        dispatch = self._dispatch(record.get("host"), record.get("app"), record.get("severity"))
+        if not dispatch.rules:
+            return [], []
+        costs = [(self.rules[index].id, True, 0.0) for index in dispatch.unconditional]
+        matched = list(dispatch.unconditional)
+        if dispatch.literal_only or dispatch.expressive:
+            message = str(record.get("msg") or record.get("message") or "")
+            lowered = message.lower()
+            hits: set[int] = set()
+            if dispatch.scans_literals:
+                started = perf_counter()
+                hits = self.literals.scan(lowered)
+                costs.append((LITERAL_SCAN_ID, bool(hits), perf_counter() - started))
+            for index in sorted(dispatch.literal_only):
+                costs.append((self.rules[index].id, index in hits, 0.0))
+                if index in hits:
+                    matched.append(index)
+            for compiled in dispatch.expressive:
+                started = perf_counter()
+                ok = compiled.index in hits or _expressions_match(compiled, message, lowered)
+                costs.append((compiled.rule.id, ok, perf_counter() - started))
+                if ok:
+                    matched.append(compiled.index)
+            matched.sort()
+        return self._finish(matched, record), costs
+
+
+class _Dispatch:
+    """Застосовні до трійки фільтрів правила, розкладені за способом перевірки."""
+
+    __slots__ = ("rules", "unconditional", "literal_only", "expressive", "scans_literals")
+
+    def __init__(self, compiled: Iterable[CompiledRule]) -> None:
+        items = list(compiled)
+        self.rules = tuple(item.rule for item in items)
+        self.unconditional = tuple(item.index for item in items if not item.requires_pattern)
+        self.literal_only = frozenset(
+            item.index
+            for item in items
+            if item.has_literals and not item.regexes and not item.globs
+        )
+        self.expressive = tuple(item for item in items if item.regexes or item.globs)
+        self.scans_literals = any(item.has_literals for item in items)
+
+
+def _is_glob(pattern: str) -> bool:
+    return any(char in pattern for char in "*?[]")
+
+
+def _expressions_match(compiled: CompiledRule, message: str, lowered: str) -> bool:
+    if any(regex.search(message) for regex in compiled.regexes):
+        return True
+    return any(glob.match(lowered) for glob in compiled.globs)
+
+
+def _check_filters(rule: Rule, values: Mapping[str, object]) -> bool:
+    for key, allowed in rule.filters.items():
+        if not allowed:
+            continue
+        value = values.get(key)
+        if value is None:
+            return False
+        str_value = str(value)
+        if not any(fnmatch.fnmatch(str_value, pattern) for pattern in allowed):
+            return False
+    return True
+
+
+def _validate(rules: Sequence[Rule]) -> None:
+    known = {rule.id for rule in rules}
+    for rule in rules:
+        if rule.threshold and not rule.window:
+            raise ValueError(f"Правило {rule.id}: threshold потребує window")
+        if rule.sequence:
+            if not rule.within:
+                raise ValueError(f"Правило {rule.id}: sequence потребує within")
+            for step in rule.sequence:
+                if step.get("rule") not in known:
+                    raise ValueError(f"Правило {rule.id}: невідомий крок {step.get('rule')!r}")
+        if rule.quantile is not None:
+            spec = rule.quantile
+            if not spec.get("field") or not 0 < float(spec.get("q", 0)) < 1:
+                raise ValueError(f"Правило {rule.id}: quantile потребує field і q у межах (0, 1)")
+            if spec.get("above") is None and spec.get("below") is None:
+                raise ValueError(f"Правило {rule.id}: quantile потребує above або below")
 
 
 class RuleEngine:
-    """Рушій, що застосовує правила до нормалізованих логів."""
+    """Рушій, що застосовує правила до нормалізованих логів.
+
+    Активний набір правил зберігається одним посиланням ``ruleset``: нова
+    версія компілюється повністю і лише потім підміняє стару, тож матчинг,
+    що вже виконується, ніколи не бачить напівзавантажений набір.
+    """
 
-    def __init__(self, rules_path: str | Path) -> None:
+    def __init__(
+        self,
+        rules_path: str | Path,
+        max_groups: int = 10000,
+        profile_sample: float = 0.0,
+        match_cache_size: int = 0,
+        indicators: IndicatorRegistry | None = None,
+    ) -> None:
         self.rules_path = Path(rules_path)
-        self.rules: List[Rule] = []
+        self.match_cache_size = match_cache_size
+        self.indicators = indicators
+        self.ruleset = CompiledRuleSet([])
+        self.state = RuleState(max_groups=max_groups)
+        self.profiler = RuleProfiler(profile_sample) if profile_sample > 0 else None
+        self._file_stamp: tuple[int, int] | None = None
         self._load_rules()
 
-    def _load_rules(self) -> None:
+    @property
+    def rules(self) -> list[Rule]:
+        return self.ruleset.rules
+
+    @property
+    def prefilter(self) -> RulePrefilter:
+        """Передфільтр логів для активного набору правил."""
+
+        return self.ruleset.prefilter
+
+    @property
+    def version(self) -> str:
+        """Версія активного набору (хеш вмісту файлу)."""
+
+        return self.ruleset.version
+
+    def _build(self) -> tuple[CompiledRuleSet, tuple[int, int]]:
         if not self.rules_path.exists():
             raise FileNotFoundError(f"Файл правил не знайдено: {self.rules_path}")
-        with self.rules_path.open("r", encoding="utf-8") as fh:
-            raw = yaml.safe_load(fh) or []
-        self.rules = [Rule(**item) for item in raw]
+        stat = self.rules_path.stat()
+        content = self.rules_path.read_bytes()
+        version = hashlib.sha256(content).hexdigest()[:16]
+        if version == self.ruleset.version:
+            return self.ruleset, (stat.st_mtime_ns, stat.st_size)
+        raw = yaml.safe_load(content.decode("utf-8")) or []
+        rules = [Rule(**item) for item in raw]
+        _validate(rules)
+        ruleset = CompiledRuleSet(
+            rules,
+            version=version,
+            match_cache_size=self.match_cache_size,
+            indicators=self.indicators,
+        )
+        return ruleset, (stat.st_mtime_ns, stat.st_size)
 
-    def reload(self) -> None:
-        """Перечитує файл правил."""
+    def _swap(self, ruleset: CompiledRuleSet, stamp: tuple[int, int]) -> bool:
+        self._file_stamp = stamp
+        if ruleset is self.ruleset:
+            return False
+        self.state.sync(ruleset.rules)
+        self.ruleset = ruleset
+        return True
 
-        self._load_rules()
+    def _load_rules(self) -> None:
+        self._swap(*self._build())
 
-    def match(self, record: dict) -> List[Rule]:
-        """Повертає правила, що спрацювали для запису."""
+    def reload(self) -> bool:
+        """Перечитує файл правил; повертає True, якщо версія змінилась."""
 
-        message = str(record.get("msg") or record.get("message") or "")
-        host = record.get("host")
-        app = record.get("app")
-        severity = record.get("severity")
-        matched: List[Rule] = []
-        for rule in self.rules:
-            if not self._check_filters(rule, host=host, app=app, severity=severity):
-                continue
-            if rule.patterns:
-                if not any(self._pattern_matches(pattern, message) for pattern in rule.patterns if pattern):
-                    continue
-            matched.append(rule)
-        return matched
+        return self._swap(*self._build())
 
-    def _pattern_matches(self, pattern: str, message: str) -> bool:
-        if pattern.startswith("/") and pattern.endswith("/"):
-            try:
-                regex = re.compile(pattern.strip("/"), re.IGNORECASE)
-                return bool(regex.search(message))
-            except re.error:
-                return False
-        if any(char in pattern for char in "*?[]"):
-            return fnmatch.fnmatch(message.lower(), pattern.lower())
-        return pattern.lower() in message.lower()
-
-    def _check_filters(self, rule: Rule, **values: object) -> bool:
-        for key, allowed in rule.filters.items():
-            if not allowed:
+    async def reload_async(self) -> bool:
+        """Компілює новий набір у потоці, не блокуючи цикл подій, і атомарно підміняє."""
+
+        ruleset, stamp = await asyncio.to_thread(self._build)
+        return self._swap(ruleset, stamp)
+
+    def changed_on_disk(self) -> bool:
+        """Перевіряє mtime та розмір файлу правил без його читання."""
+
+        try:
+            stat = self.rules_path.stat()
+        except OSError:
+            return False
+        return (stat.st_mtime_ns, stat.st_size) != self._file_stamp
+
+    def match(self, record: Mapping[str, Any]) -> list[Rule]:
+        """Повертає правила, що спрацювали для запису.
+
+        Порогові правила (``threshold``/``window``) повертаються лише тоді,
+        коли кількість збігів у вікні для їхньої групи досягла порогу;
+        послідовні (``sequence``/``within``) — коли ключ пройшов усі кроки.
+        """
+
+        profiler = self.profiler
+        if profiler is not None and profiler.should_sample():
+            matched, costs = self.ruleset.profile(record)
+            profiler.record(costs)
+        else:
+            matched = self.ruleset.match(record)
+        return self.state.apply(matched, record)
+
+    def match_quantiles(
+        self, field_name: str, values: Mapping[str, object], sketch: KllSketch,
+    ) -> list[tuple[Rule, float]]:
+        """Квантильні правила поля, чий поріг перетнув хвилинний скетч серії."""
+
+        hits: list[tuple[Rule, float]] = []
+        for rule in self.ruleset.quantile_rules:
+            spec = rule.quantile or {}
+            if spec.get("field") != field_name or sketch.count < int(spec.get("min_count", 1)):
+                continue
+            if not _check_filters(rule, values):
                 continue
-            value = values.get(key)
+            value = sketch.quantile(float(spec["q"]))
             if value is None:
-                return False
-            str_value = str(value)
-            if not any(fnmatch.fnmatch(str_value, pattern) for pattern in allowed):
-                return False
-        return True
+                continue
+            above, below = spec.get("above"), spec.get("below")
+            too_high = above is not None and value > float(above)
+            too_low = below is not None and value < float(below)
+            if too_high or too_low:
+                hits.append((rule, value))
+        return hits
+
+    def export_state(self) -> dict[str, object]:
+        """Знімок стану правил, придатний для серіалізації в JSON."""
+
+        return self.state.export_state()
+
+    def restore_state(self, snapshot: Mapping[str, object]) -> None:
+        """Відновлює стан правил зі знімка ``export_state``."""
+
+        self.state.restore_state(snapshot)
 
     def iter_rules(self) -> Iterable[Rule]:
         """Повертає всі правила."""
@@ -89,4 +567,12 @@ class RuleEngine:
         return iter(self.rules)
 
 
-__all__ = ["RuleEngine", "Rule"]
+__all__ = [
+    "LITERAL_SCAN_ID",
+    "CompiledRule",
+    "CompiledRuleSet",
+    "LiteralMatcher",
+    "Rule",
+    "RuleEngine",
+    "RulePrefilter",
+]
@@ -0,0 +1,121 @@
+"""Команда ``cortexwatcher-rules-profile``: вартість правил на корпусі логів.
+
+``cortexwatcher-rules-profile --rules rules/new.yaml corpus.log`` проганяє
+файл логів (syslog, NDJSON та інші формати, які розпізнає ``detect_format``)
+через набір правил і виводить швидкість у подіях за секунду, рейтинг правил
+за вартістю та regex-шаблони з ризиком катастрофічного бектрекінгу.
+"""
+from __future__ import annotations
+
+import argparse
+import sys
+from pathlib import Path
+from time import perf_counter
+from typing import Any
+
+from cortexwatcher.analyzer.correlate import build_correlation_key, extract_ips
+from cortexwatcher.analyzer.indicators import IndicatorRegistry
+from cortexwatcher.analyzer.profiler import RuleProfiler, regex_risks
+from cortexwatcher.analyzer.rules_engine import RuleEngine
+from cortexwatcher.config import get_settings
+from cortexwatcher.parsers import detect_stream, iter_content
+
+# Розмір шматка читання корпусу
+_READ_CHUNK = 1 << 20
+
+
+def _load_corpus(path: Path) -> list[dict[str, Any]]:
+    records = []
+    with path.open("rb") as handle:
+        fmt, lines = detect_stream(iter(lambda: handle.read(_READ_CHUNK), b""))
+        for item in iter_content(fmt, lines):
+            srcip, dstip = extract_ips(item)
+            records.append(
+                {
+                    "msg": str(item.get("message") or item.get("msg") or ""),
+                    "host": item.get("host"),
+                    "app": item.get("app"),
+                    "severity": item.get("severity"),
+                    "srcip": srcip,
+                    "dstip": dstip,
+                    "correlation_key": build_correlation_key(item),
+                    "ts": item.get("timestamp"),
+                    "meta": item,
+                },
+            )
+    return records
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(
+        prog="cortexwatcher-rules-profile",
+        description="Прогнати корпус логів через набір правил і показати вартість кожного правила",
+    )
+    parser.add_argument(
+        "corpus",
+        type=Path,
+        help="Файл логів (syslog, NDJSON, GELF, Suricata EVE, Wazuh)",
+    )
+    parser.add_argument("--rules", default=None, help="Файл правил (типово RULES_PATH)")
+    parser.add_argument("--repeat", type=int, default=1, help="Скільки разів прогнати корпус")
+    parser.add_argument("--top", type=int, default=20, help="Скільки найдорожчих правил показати")
+    return parser
+
+
+def main(argv: list[str] | None = None, out: Any = sys.stdout) -> None:
+    args = build_parser().parse_args(argv)
+    settings = get_settings()
+    rules_path = args.rules or settings.rules_path
+    indicator_paths = settings.indicator_set_paths()
+    indicators = IndicatorRegistry(indicator_paths) if indicator_paths else None
+    records = _load_corpus(args.corpus)
+    if not records:
+        raise SystemExit(f"У {args.corpus} не знайдено жодного розпізнаного запису")
+
+    # Швидкість міряється без профайлера, рейтинг — окремим прогоном із замірами кожного запису
+    engine = RuleEngine(rules_path, indicators=indicators)
+    started = perf_counter()
+    matched = 0
+    for _ in range(args.repeat):
+        for record in records:
+            matched += bool(engine.match(record))
+    elapsed = perf_counter() - started
+    events = len(records) * args.repeat
+    print(f"Правил: {len(engine.rules)}, подій: {events}, зі спрацюваннями: {matched}", file=out)
+    print(f"Швидкість: {events / elapsed:,.0f} подій/с ({elapsed:.3f} с)", file=out)
+
+    profiled = RuleEngine(rules_path, indicators=indicators)
+    profiler = profiled.profiler = RuleProfiler(1.0, export=False)
+    for _ in range(args.repeat):
+        for record in records:
+            profiled.match(record)
+    print(f"\nНайдорожчі правила (усього {len(profiler.stats)}):", file=out)
+    print(
+        f"{'правило':<40} {'перевірок':>10} {'збігів':>8} {'мкс/перев.':>10} {'сума, мс':>10}",
+        file=out,
+    )
+    for rule_id, cost in profiler.ranking(args.top):
+        print(
+            f"{rule_id:<40} {cost.evaluations:>10} {cost.matches:>8} "
+            f"{cost.micros_per_eval:>10.2f} {cost.seconds * 1000:>10.2f}",
+            file=out,
+        )
+
+    flagged = [
+        (rule.id, pattern, risks)
+        for rule in engine.rules
+        for pattern in rule.patterns
+        if pattern.startswith("/") and pattern.endswith("/") and len(pattern) > 1
+        for risks in [regex_risks(pattern.strip("/"))]
+        if risks
+    ]
+    print(f"\nRegex із ризиком катастрофічного бектрекінгу: {len(flagged)}", file=out)
+    for rule_id, pattern, risks in flagged:
+        print(f"  {rule_id}: {pattern} — {', '.join(risks)}", file=out)
+
+
+__all__ = ["build_parser", "main"]
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,492 @@
+"""Потокові скетчі: квантилі, найчастіші значення й кардинальність без зберігання подій."""
+from __future__ import annotations
+
+import heapq
+import random
+import struct
+from array import array
+from collections.abc import Iterable, Mapping, Sequence
+from dataclasses import dataclass
+from datetime import datetime
+
+from redis import Redis
+
+from cortexwatcher.analyzer.anomalies import _minute
+
+QUANTILES_KEY_PREFIX = "cortexwatcher:quantiles"
+TOP_KEY_PREFIX = "cortexwatcher:top"
+CARDINALITY_KEY_PREFIX = "cortexwatcher:cardinality"
+
+_KLL_HEADER = struct.Struct("<HQddB")
+_LEVEL_HEADER = struct.Struct("<I")
+_MIN_WIDTH = 8
+
+
+class KllSketch:
+    """Квантильний скетч KLL із гарантованою похибкою рангу ~1.7/k.
+
+    Значення лягають у рівні-компактори: коли рівень переповнюється, його
+    відсортований вміст проріджується через одне, а решта переходить на
+    рівень вище з подвоєною вагою. Місткість рівнів спадає геометрично
+    знизу вгору, тож памʼять — O(k) незалежно від кількості значень.
+    Скетчі з однаковим ``k`` зливаються (``merge``) без втрати гарантій.
+    """
+
+    __slots__ = ("k", "levels", "count", "min", "max", "_bottom_capacity")
+
+    def __init__(self, k: int = 200) -> None:
+        self.k = k
+        self.levels: list[list[float]] = [[]]
+        self.count = 0
+        self.min = float("inf")
+        self.max = float("-inf")
+        self._bottom_capacity = self._capacity(0)
+
+    def _capacity(self, level: int) -> int:
+        depth = len(self.levels) - level - 1
+        # Мінімальна ширина нижніх рівнів, щоб не стискати після кожних кількох значень
+        return max(_MIN_WIDTH, int(self.k * (2 / 3) ** depth + 0.5))
+
+    def update(self, value: float) -> None:
+        value = float(value)
+        self.count += 1
+        self.min = min(self.min, value)
+        self.max = max(self.max, value)
+        bottom = self.levels[0]
+        bottom.append(value)
+        if len(bottom) >= self._bottom_capacity:
+            self._compress()
+
+    def _compress(self) -> None:
+        level = 0
+        while level < len(self.levels):
+            items = self.levels[level]
+            if len(items) >= self._capacity(level):
+                if level + 1 == len(self.levels):
+                    self.levels.append([])
+                items.sort()
+                # Непарний залишок лишається на рівні, щоб вага зберігалась точно
+                keep = [items.pop()] if len(items) % 2 else []
+                self.levels[level + 1].extend(items[random.getrandbits(1) :: 2])
+                self.levels[level] = keep
+            level += 1
+        self._bottom_capacity = self._capacity(0)
+
+    def merge(self, other: KllSketch) -> None:
+        """Додає до скетча значення іншого скетча з тим самим ``k``."""
+
+        if other.k != self.k:
+            raise ValueError(f"Скетчі з різним k не зливаються: {self.k} і {other.k}")
+        if other.count == 0:
+            return
+        while len(self.levels) < len(other.levels):
+            self.levels.append([])
+        for level, items in enumerate(other.levels):
+            self.levels[level].extend(items)
+        self.count += other.count
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        self._compress()
+
+    def _weighted(self) -> list[tuple[float, int]]:
+        items = [
+            (value, 1 << level) for level, values in enumerate(self.levels) for value in values
+        ]
+        items.sort()
+        return items
+
+    def quantiles(self, qs: Sequence[float]) -> list[float | None]:
+        """Оцінки квантилів ``qs`` (0..1); None для порожнього скетча."""
+
+        if not self.count:
+            return [None for _ in qs]
+        items = self._weighted()
+        total = sum(weight for _, weight in items)
+        result: list[float | None] = []
+        for q in qs:
+            if q <= 0:
+                result.append(self.min)
+                continue
+            if q >= 1:
+                result.append(self.max)
+                continue
+            target = q * total
+            cumulative = 0
+            estimate = self.max
+            for value, weight in items:
+                cumulative += weight
+                if cumulative >= target:
+                    estimate = value
+                    break
+            result.append(estimate)
+        return result
+
+    def quantile(self, q: float) -> float | None:
+        return self.quantiles([q])[0]
+
+    def to_bytes(self) -> bytes:
+        parts = [_KLL_HEADER.pack(self.k, self.count, self.min, self.max, len(self.levels))]
+        for values in self.levels:
+            parts.append(_LEVEL_HEADER.pack(len(values)))
+            parts.append(array("d", values).tobytes())
+        return b"".join(parts)
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> KllSketch:
+        try:
+            k, count, low, high, depth = _KLL_HEADER.unpack_from(data)
+            offset = _KLL_HEADER.size
+            levels: list[list[float]] = []
+            for _ in range(depth):
+                (length,) = _LEVEL_HEADER.unpack_from(data, offset)
+                offset += _LEVEL_HEADER.size
+                values = array("d")
+                values.frombytes(data[offset : offset + 8 * length])
+                offset += 8 * length
+                levels.append(values.tolist())
+        except (struct.error, ValueError) as exc:
+            raise ValueError("Пошкоджений скетч") from exc
+        sketch = cls(k)
+        sketch.levels = levels or [[]]
+        sketch._bottom_capacity = sketch._capacity(0)
+        sketch.count = count
+        sketch.min = low
+        sketch.max = high
+        return sketch
+
+
+@dataclass
+class ClosedSketch:
+    """Скетч поля серії ``host|app`` за закриту хвилину."""
+
+    field: str
+    series: str
+    minute: int
+    sketch: KllSketch
+
+
+def _lookup(meta: Mapping[str, object], path: Sequence[str]) -> float | None:
+    value: object = meta
+    for part in path:
+        if not isinstance(value, Mapping):
+            return None
+        value = value.get(part)
+    if isinstance(value, bool) or value is None:
+        return None
+    if isinstance(value, (int, float)):
+        return float(value)
+    if isinstance(value, str):
+        try:
+            return float(value)
+        except ValueError:
+            return None
+    return None
+
+
+class QuantileTracker:
+    """Хвилинні KLL-скетчі числових полів ``meta_json`` для кожної серії ``host|app``.
+
+    ``fields`` задає назву сигналу й шлях до значення через крапку
+    (``{"request_time": "data.request_time"}``). Хвилина закривається, коли
+    приходить подія наступної хвилини або ``tick`` із поточним часом;
+    закриті скетчі віддає ``tick``. Події закритих хвилин не враховуються.
+    """
+
+    def __init__(self, fields: Mapping[str, str], k: int = 200, max_series: int = 10000) -> None:
+        self.fields = {name: tuple(path.split(".")) for name, path in fields.items()}
+        self.k = k
+        self.max_series = max_series
+        self.current: dict[tuple[str, str], KllSketch] = {}
+        self.head: int | None = None
+        self.dropped = 0
+        self._closed: list[ClosedSketch] = []
+
+    def observe(self, meta: object, host: str | None, app: str | None, timestamp: datetime) -> None:
+        if not self.fields or not isinstance(meta, Mapping):
+            return
+        values = [
+            (name, value)
+            for name, path in self.fields.items()
+            if (value := _lookup(meta, path)) is not None
+        ]
+        if not values:
+            return
+        minute = _minute(timestamp)
+        if self.head is None:
+            self.head = minute
+        elif minute > self.head:
+            self._close(minute)
+        elif minute < self.head:
+            return
+        series = f"{host or '*'}|{app or '*'}"
+        for name, value in values:
+            sketch = self.current.get((name, series))
+            if sketch is None:
+                if len(self.current) >= self.max_series:
+                    self.dropped += 1
+                    continue
+                sketch = self.current[(name, series)] = KllSketch(self.k)
+            sketch.update(value)
+
+    def _close(self, minute: int) -> None:
+        head = self.head
+        if head is None:
+            return
+        for (name, series), sketch in self.current.items():
+            self._closed.append(ClosedSketch(field=name, series=series, minute=head, sketch=sketch))
+        self.current = {}
+        self.head = minute
+
+    def tick(self, now: datetime | None = None) -> list[ClosedSketch]:
+        """Закриває хвилину до ``now`` (якщо задано) і віддає закриті скетчі."""
+
+        if now is not None and self.head is not None:
+            minute = _minute(now)
+            if minute > self.head:
+                self._close(minute)
+        closed, self._closed = self._closed, []
+        return closed
+
+
+def quantiles_key(field: str, minute: int) -> str:
+    return f"{QUANTILES_KEY_PREFIX}:{field}:{minute}"
+
+
+def persist_sketches(
+    redis: Redis, closed: Iterable[ClosedSketch], replica: str, retention_minutes: int,
+) -> None:
+    """Пише закриті скетчі в Redis: хеш на поле й хвилину, поле хеша — ``серія#репліка``.
+
+    Репліки пишуть окремі поля, а читач зливає їх, тож скетчі різних
+    процесів за ту саму хвилину не перезаписують один одного.
+    """
+
+    pipe = redis.pipeline(transaction=False)
+    keys: set[str] = set()
+    for item in closed:
+        key = quantiles_key(item.field, item.minute)
+        pipe.hset(key, f"{item.series}#{replica}", item.sketch.to_bytes())
+        keys.add(key)
+    for key in keys:
+        pipe.expire(key, retention_minutes * 60)
+    pipe.execute()
+
+
+class SpaceSaving:
+    """Space-Saving: ``capacity`` лічильників для найчастіших значень потоку.
+
+    Нове значення при заповненому наборі витісняє найменший лічильник і
+    успадковує його значення як похибку, тож лічильник завищує справжню
+    частоту щонайбільше на ``error``. Мінімум шукається лінивою купою:
+    застарілі записи оновлюються, лише коли спливають нагору.
+    """
+
+    __slots__ = ("capacity", "counts", "errors", "_heap")
+
+    def __init__(self, capacity: int = 100) -> None:
+        self.capacity = capacity
+        self.counts: dict[str, int] = {}
+        self.errors: dict[str, int] = {}
+        self._heap: list[tuple[int, str]] = []
+
+    def update(self, item: str, weight: int = 1) -> None:
+        counts = self.counts
+        if item in counts:
+            counts[item] += weight
+            return
+        if len(counts) < self.capacity:
+            counts[item] = weight
+            self.errors[item] = 0
+            heapq.heappush(self._heap, (weight, item))
+            return
+        heap = self._heap
+        while True:
+            count, victim = heapq.heappop(heap)
+            current = counts[victim]
+            if current == count:
+                break
+            heapq.heappush(heap, (current, victim))
+        del counts[victim]
+        del self.errors[victim]
+        counts[item] = count + weight
+        self.errors[item] = count
+        heapq.heappush(heap, (count + weight, item))
+
+    def top(self, limit: int | None = None) -> list[tuple[str, int, int]]:
+        """(значення, лічильник, похибка) за спаданням лічильника."""
+
+        items = sorted(self.counts.items(), key=lambda pair: (-pair[1], pair[0]))
+        return [(item, count, self.errors[item]) for item, count in items[:limit]]
+
+
+@dataclass
+class ClosedTop:
+    """Лічильники Space-Saving поля за закриту хвилину."""
+
+    field: str
+    minute: int
+    items: list[tuple[str, int, int]]
+
+
+def _resolve(record: Mapping[str, object], meta: object, name: str) -> str | None:
+    value = record.get(name)
+    if value is None and isinstance(meta, Mapping):
+        value = meta
+        for part in name.split("."):
+            if not isinstance(value, Mapping):
+                return None
+            value = value.get(part)
+    if value is None or value == "" or isinstance(value, (Mapping, list)):
+        return None
+    return str(value)
+
+
+class TrafficTracker:
+    """Хвилинні топ-K значень полів і множини різних значень у групах.
+
+    ``top_fields`` — поля, для яких рахується Space-Saving (``srcip``,
+    ``dstip``); ``cardinality`` — сигнали ``назва -> (поле значення, поле
+    групи)``, наприклад різні порти призначення на кожен ``srcip``. Поля
+    шукаються спершу у записі аналізатора (``srcip``, ``dstip``, ``host``,
+    ``app``…), потім у ``meta_json`` за шляхом через крапку.
+
+    Різні значення накопичуються лише до ``drain_distinct``, який
+    викликається після кожного пакета: самі HyperLogLog живуть у Redis
+    (``PFADD``), тож памʼять процесу обмежена розміром пакета.
+    """
+
+    def __init__(
+        self,
+        top_fields: Sequence[str],
+        cardinality: Mapping[str, tuple[str, str]],
+        capacity: int = 100,
+        max_groups: int = 10000,
+    ) -> None:
+        self.top_fields = tuple(top_fields)
+        self.cardinality = dict(cardinality)
+        self.capacity = capacity
+        self.max_groups = max_groups
+        self.current: dict[str, SpaceSaving] = {}
+        self.distinct: dict[tuple[str, int, str], set[str]] = {}
+        self.head: int | None = None
+        self.dropped = 0
+        self._closed: list[ClosedTop] = []
+
+    def observe(self, record: Mapping[str, object], meta: object, timestamp: datetime) -> None:
+        if not self.top_fields and not self.cardinality:
+            return
+        minute = _minute(timestamp)
+        if self.head is None:
+            self.head = minute
+        elif minute > self.head:
+            self._close(minute)
+        elif minute < self.head:
+            return
+        for name in self.top_fields:
+            value = _resolve(record, meta, name)
+            if value is None:
+                continue
+            sketch = self.current.get(name)
+            if sketch is None:
+                sketch = self.current[name] = SpaceSaving(self.capacity)
+            sketch.update(value)
+        for name, (value_field, group_field) in self.cardinality.items():
+            value = _resolve(record, meta, value_field)
+            group = _resolve(record, meta, group_field)
+            if value is None or group is None:
+                continue
+            key = (name, minute, group)
+            values = self.distinct.get(key)
+            if values is None:
+                if len(self.distinct) >= self.max_groups:
+                    self.dropped += 1
+                    continue
+                values = self.distinct[key] = set()
+            values.add(value)
+
+    def _close(self, minute: int) -> None:
+        head = self.head
+        if head is None:
+            return
+        for name, sketch in self.current.items():
+            self._closed.append(ClosedTop(field=name, minute=head, items=sketch.top()))
+        self.current = {}
+        self.head = minute
+
+    def tick(self, now: datetime | None = None) -> list[ClosedTop]:
+        """Закриває хвилину до ``now`` (якщо задано) і віддає закриті топ-K."""
+
+        if now is not None and self.head is not None:
+            minute = _minute(now)
+            if minute > self.head:
+                self._close(minute)
+        closed, self._closed = self._closed, []
+        return closed
+
+    def drain_distinct(self) -> dict[tuple[str, int, str], set[str]]:
+        """Віддає й очищає накопичені значення ``(сигнал, хвилина, група) -> множина``."""
+
+        distinct, self.distinct = self.distinct, {}
+        return distinct
+
+
+def top_key(field: str, minute: int) -> str:
+    return f"{TOP_KEY_PREFIX}:{field}:{minute}"
+
+
+def cardinality_key(name: str, minute: int, group: str) -> str:
+    return f"{CARDINALITY_KEY_PREFIX}:{name}:{minute}:{group}"
+
+
+def cardinality_groups_key(name: str, minute: int) -> str:
+    return f"{CARDINALITY_KEY_PREFIX}:{name}:{minute}"
+
+
+def persist_traffic(
+    redis: Redis,
+    closed: Iterable[ClosedTop],
+    distinct: Mapping[tuple[str, int, str], set[str]],
+    retention_minutes: int,
+) -> None:
+    """Пише хвилинні топ-K у ZSET (``ZINCRBY``) і різні значення в HyperLogLog (``PFADD``).
+
+    Лічильники реплік за ту саму хвилину додаються, а HLL зливаються самим
+    Redis; множина груп хвилини потрібна читачу, щоб знайти групи без ``SCAN``.
+    """
+
+    ttl = retention_minutes * 60
+    pipe = redis.pipeline(transaction=False)
+    keys: set[str] = set()
+    for item in closed:
+        key = top_key(item.field, item.minute)
+        for value, count, _ in item.items:
+            pipe.zincrby(key, count, value)
+        keys.add(key)
+    for (name, minute, group), values in distinct.items():
+        key = cardinality_key(name, minute, group)
+        pipe.pfadd(key, *values)
+        groups = cardinality_groups_key(name, minute)
+        pipe.sadd(groups, group)
+        keys.update((key, groups))
+    for key in keys:
+        pipe.expire(key, ttl)
+    pipe.execute()
+
+
+__all__ = [
+    "CARDINALITY_KEY_PREFIX",
+    "ClosedSketch",
+    "ClosedTop",
+    "KllSketch",
+    "QuantileTracker",
+    "QUANTILES_KEY_PREFIX",
+    "SpaceSaving",
+    "TOP_KEY_PREFIX",
+    "TrafficTracker",
+    "cardinality_groups_key",
+    "cardinality_key",
+    "persist_sketches",
+    "persist_traffic",
+    "quantiles_key",
+    "top_key",
+]
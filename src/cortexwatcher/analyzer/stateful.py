@@ -0,0 +1,374 @@
+"""Стан правил, що залежать від попередніх подій: пороги та послідовності."""
+from __future__ import annotations
+
+import heapq
+from collections import OrderedDict
+from collections.abc import Iterable, Mapping, Sequence
+from datetime import datetime
+from time import time
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from cortexwatcher.analyzer.rules_engine import Rule
+
+
+class _Group:
+    """Кільцевий буфер кошиків однієї групи."""
+
+    __slots__ = ("counts", "head", "total", "fired_until", "last_seen")
+
+    def __init__(self, buckets: int) -> None:
+        self.counts = [0] * buckets
+        self.head = -1
+        self.total = 0
+        self.fired_until = float("-inf")
+        self.last_seen = 0.0
+
+
+class SlidingWindowCounter:
+    """Ковзні лічильники по групах із обмеженою памʼяттю.
+
+    Вікно ділиться на ``buckets`` кошиків фіксованої ширини, тож кожна
+    група займає сталий обсяг. Групи впорядковані за останнім зверненням:
+    при перевищенні ``max_groups`` або простої довшому за вікно найдавніші
+    видаляються.
+    """
+
+    def __init__(self, window_seconds: float, buckets: int = 10, max_groups: int = 10000) -> None:
+        if window_seconds <= 0:
+            raise ValueError("Вікно має бути додатним")
+        self.window = float(window_seconds)
+        self.buckets = buckets
+        self.width = self.window / buckets
+        self.max_groups = max_groups
+        self.groups: OrderedDict[str, _Group] = OrderedDict()
+        self.evicted = 0
+
+    def hit(self, key: str, ts: float) -> int:
+        """Додає подію групи й повертає кількість подій у вікні."""
+
+        group = self.groups.get(key)
+        if group is None:
+            group = _Group(self.buckets)
+            self.groups[key] = group
+        else:
+            self.groups.move_to_end(key)
+        bucket = int(ts // self.width)
+        if bucket > group.head:
+            self._advance(group, bucket)
+        elif bucket <= group.head - self.buckets:
+            # Подія старша за вікно — не враховуємо
+            return group.total
+        slot = bucket % self.buckets
+        group.counts[slot] += 1
+        group.total += 1
+        group.last_seen = max(group.last_seen, ts)
+        self._evict(ts)
+        return group.total
+
+    def group(self, key: str) -> _Group | None:
+        return self.groups.get(key)
+
+    def _advance(self, group: _Group, bucket: int) -> None:
+        start = max(group.head + 1, bucket - self.buckets + 1)
+        for stale in range(start, bucket + 1):
+            slot = stale % self.buckets
+            group.total -= group.counts[slot]
+            group.counts[slot] = 0
+        group.head = bucket
+
+    def _evict(self, now: float) -> None:
+        while len(self.groups) > self.max_groups:
+            self.groups.popitem(last=False)
+            self.evicted += 1
+        idle_before = now - self.window
+        while self.groups:
+            key, oldest = next(iter(self.groups.items()))
+            if oldest.last_seen >= idle_before or oldest.fired_until > now:
+                break
+            del self.groups[key]
+            self.evicted += 1
+
+
+class ThresholdTracker:
+    """Правило «N збігів за T секунд у межах ключа групування»."""
+
+    def __init__(self, rule: Rule, max_groups: int = 10000) -> None:
+        if not rule.threshold or not rule.window:
+            raise ValueError(f"Правило {rule.id}: threshold потребує window")
+        self.threshold = int(rule.threshold)
+        self.group_by: tuple[str, ...] = tuple(rule.group_by)
+        self.counter = SlidingWindowCounter(rule.window, max_groups=max_groups)
+
+    def signature(self) -> tuple[object, ...]:
+        return (self.threshold, self.counter.window, self.group_by)
+
+    def group_key(self, record: Mapping[str, object]) -> str:
+        return "|".join(str(record.get(field) or "*") for field in self.group_by) or "*"
+
+    def export_state(self) -> list[list[object]]:
+        result: list[list[object]] = []
+        for key, group in self.counter.groups.items():
+            fired_until = group.fired_until if group.fired_until != float("-inf") else None
+            result.append([key, group.head, list(group.counts), fired_until, group.last_seen])
+        return result
+
+    def restore_state(self, items: Iterable[Sequence[object]]) -> None:
+        counter = self.counter
+        for key, head, counts, fired_until, last_seen in items:
+            if not isinstance(counts, list) or len(counts) != counter.buckets:
+                continue
+            group = _Group(counter.buckets)
+            try:
+                group.head = int(_restored_number(head))
+                group.counts = [int(_restored_number(value)) for value in counts]
+                if fired_until is not None:
+                    group.fired_until = _restored_number(fired_until)
+                group.last_seen = _restored_number(last_seen)
+            except ValueError:
+                continue
+            group.total = sum(group.counts)
+            counter.groups[str(key)] = group
+        while len(counter.groups) > counter.max_groups:
+            counter.groups.popitem(last=False)
+
+    def observe(self, record: Mapping[str, object]) -> bool:
+        """Враховує збіг і повертає True не частіше одного разу за вікно."""
+
+        key = self.group_key(record)
+        ts = event_time(record)
+        count = self.counter.hit(key, ts)
+        if count < self.threshold:
+            return False
+        group = self.counter.group(key)
+        if group is None or ts < group.fired_until:
+            return False
+        group.fired_until = ts + self.counter.window
+        return True
+
+
+class _SequenceState:
+    """Прогрес однієї послідовності для ключа кореляції."""
+
+    __slots__ = ("step", "count", "started", "expires", "token")
+
+    def __init__(self, step: int, count: int, started: float, expires: float, token: int) -> None:
+        self.step = step
+        self.count = count
+        self.started = started
+        self.expires = expires
+        self.token = token
+
+
+class SequenceTracker:
+    """Правило «подія A, потім B протягом T для того самого ключа».
+
+    Для кожного ключа тримається лише номер кроку, лічильник і час
+    завершення; моменти завершення впорядковані в купі (з лінивим
+    видаленням), тож прострочені стани прибираються за O(log n) без
+    перебору всіх ключів. Кількість одночасних ключів обмежена
+    ``max_keys``: при переповненні витісняється стан, що завершився б
+    найраніше.
+    """
+
+    def __init__(self, rule: Rule, max_keys: int = 10000) -> None:
+        if not rule.sequence or not rule.within:
+            raise ValueError(f"Правило {rule.id}: sequence потребує within")
+        self.steps: tuple[tuple[str, int], ...] = tuple(
+            (str(step["rule"]), int(step.get("count", 1))) for step in rule.sequence
+        )
+        self.within = float(rule.within)
+        self.group_by: tuple[str, ...] = tuple(rule.group_by) or ("correlation_key",)
+        self.max_keys = max_keys
+        self.states: dict[str, _SequenceState] = {}
+        self._expiry: list[tuple[float, int, str]] = []
+        self._tokens = 0
+        self.evicted = 0
+
+    def signature(self) -> tuple[object, ...]:
+        return (self.steps, self.within, self.group_by)
+
+    def group_key(self, record: Mapping[str, object]) -> str:
+        return "|".join(str(record.get(field) or "*") for field in self.group_by)
+
+    def observe(self, matched_ids: set[str], record: Mapping[str, object]) -> bool:
+        """Просуває послідовність ключа; True — усі кроки пройдено вчасно."""
+
+        ts = event_time(record)
+        self._expire(ts)
+        key = self.group_key(record)
+        state = self.states.get(key)
+        if state is None:
+            first_rule, _ = self.steps[0]
+            if first_rule not in matched_ids:
+                return False
+            state = self._open(key, ts)
+        rule_id, needed = self.steps[state.step]
+        if rule_id not in matched_ids:
+            return False
+        state.count += 1
+        if state.count < needed:
+            return False
+        state.step += 1
+        state.count = 0
+        if state.step < len(self.steps):
+            return False
+        del self.states[key]
+        return True
+
+    def _open(self, key: str, ts: float) -> _SequenceState:
+        while len(self.states) >= self.max_keys and self._expiry:
+            _, token, victim = heapq.heappop(self._expiry)
+            current = self.states.get(victim)
+            if current is not None and current.token == token:
+                del self.states[victim]
+                self.evicted += 1
+        return self._push(key, _SequenceState(0, 0, ts, ts + self.within, 0))
+
+    def _push(self, key: str, state: _SequenceState) -> _SequenceState:
+        self._tokens += 1
+        state.token = self._tokens
+        self.states[key] = state
+        heapq.heappush(self._expiry, (state.expires, state.token, key))
+        return state
+
+    def _expire(self, now: float) -> None:
+        expiry = self._expiry
+        while expiry and expiry[0][0] < now:
+            _, token, key = heapq.heappop(expiry)
+            current = self.states.get(key)
+            if current is not None and current.token == token:
+                del self.states[key]
+
+    def export_state(self) -> list[list[object]]:
+        return [[key, st.step, st.count, st.started, st.expires] for key, st in self.states.items()]
+
+    def restore_state(self, items: Iterable[Sequence[object]]) -> None:
+        for key, step, count, started, expires in items:
+            try:
+                state = _SequenceState(
+                    int(_restored_number(step)),
+                    int(_restored_number(count)),
+                    _restored_number(started),
+                    _restored_number(expires),
+                    0,
+                )
+            except ValueError:
+                continue
+            if state.step >= len(self.steps):
+                continue
+            self._push(str(key), state)
+
+
+class RuleState:
+    """Стан порогових і послідовних правил рушія, що переживає перезавантаження."""
+
+    def __init__(self, max_groups: int = 10000) -> None:
+        self.max_groups = max_groups
+        self.trackers: dict[str, ThresholdTracker] = {}
+        self.sequences: dict[str, SequenceTracker] = {}
+        self._sequence_rules: dict[str, Rule] = {}
+
+    def sync(self, rules: Iterable[Rule]) -> None:
+        """Узгоджує трекери з новим набором, зберігаючи стан незмінених правил."""
+
+        trackers: dict[str, ThresholdTracker] = {}
+        sequences: dict[str, SequenceTracker] = {}
+        sequence_rules: dict[str, Rule] = {}
+        for rule in rules:
+            if rule.sequence:
+                sequence = SequenceTracker(rule, self.max_groups)
+                existing_sequence = self.sequences.get(rule.id)
+                if (
+                    existing_sequence is not None
+                    and existing_sequence.signature() == sequence.signature()
+                ):
+                    sequence = existing_sequence
+                sequences[rule.id] = sequence
+                sequence_rules[rule.id] = rule
+            elif rule.threshold:
+                tracker = ThresholdTracker(rule, self.max_groups)
+                existing = self.trackers.get(rule.id)
+                if existing is not None and existing.signature() == tracker.signature():
+                    tracker = existing
+                trackers[rule.id] = tracker
+        self.trackers = trackers
+        self.sequences = sequences
+        self._sequence_rules = sequence_rules
+
+    def apply(self, matched: Sequence[Rule], record: Mapping[str, object]) -> list[Rule]:
+        """Пропускає безстанові збіги, порогові — в момент спрацювання, а
+        послідовні — коли ключ кореляції пройшов усі кроки."""
+
+        if not self.trackers and not self.sequences:
+            return list(matched)
+        result: list[Rule] = []
+        for rule in matched:
+            tracker = self.trackers.get(rule.id)
+            if tracker is None or tracker.observe(record):
+                result.append(rule)
+        if self.sequences:
+            matched_ids = {rule.id for rule in matched}
+            for rule_id, sequence in self.sequences.items():
+                if sequence.observe(matched_ids, record):
+                    result.append(self._sequence_rules[rule_id])
+        return result
+
+    def export_state(self) -> dict[str, object]:
+        """Знімок стану порогів і послідовностей для відновлення після рестарту."""
+
+        return {
+            "thresholds": {
+                rule_id: {"signature": repr(tracker.signature()), "groups": tracker.export_state()}
+                for rule_id, tracker in self.trackers.items()
+            },
+            "sequences": {
+                rule_id: {"signature": repr(tracker.signature()), "states": tracker.export_state()}
+                for rule_id, tracker in self.sequences.items()
+            },
+        }
+
+    def restore_state(self, snapshot: Mapping[str, object]) -> None:
+        """Відновлює стан; записи правил зі зміненими параметрами пропускаються."""
+
+        thresholds = snapshot.get("thresholds")
+        if isinstance(thresholds, Mapping):
+            for rule_id, payload in thresholds.items():
+                tracker = self.trackers.get(rule_id)
+                if tracker is None or not isinstance(payload, Mapping):
+                    continue
+                if payload.get("signature") != repr(tracker.signature()):
+                    continue
+                tracker.restore_state(payload.get("groups") or [])
+        sequences = snapshot.get("sequences")
+        if not isinstance(sequences, Mapping):
+            return
+        for rule_id, payload in sequences.items():
+            sequence = self.sequences.get(rule_id)
+            if sequence is None or not isinstance(payload, Mapping):
+                continue
+            if payload.get("signature") != repr(sequence.signature()):
+                continue
+            sequence.restore_state(payload.get("states") or [])
+
+
+def _restored_number(value: object) -> float:
+    """Число зі знімка стану; інше значення — ``ValueError``, запис пропускається."""
+
+    if isinstance(value, bool) or not isinstance(value, (int, float)):
+        raise ValueError(f"Некоректне число у знімку стану: {value!r}")
+    return float(value)
+
+
+def event_time(record: Mapping[str, object]) -> float:
+    """Час події з запису (``ts``/``timestamp``) у секундах epoch."""
+
+    value = record.get("ts") or record.get("timestamp")
+    if isinstance(value, datetime):
+        return value.timestamp()
+    if isinstance(value, (int, float)):
+        return float(value)
+    return time()
+
+
+__all__ = ["SlidingWindowCounter", "ThresholdTracker", "SequenceTracker", "RuleState", "event_time"]
@@ -0,0 +1,231 @@
+"""Векторизований бекенд детектора аномалій на NumPy."""
+from __future__ import annotations
+
+from datetime import UTC, datetime
+from typing import Any
+
+from cortexwatcher.analyzer.anomalies import (
+    _MIN_FILLED,
+    _MIN_VARIANCE,
+    AnomalyHit,
+    WindowStat,
+    _minute,
+)
+from cortexwatcher.analyzer.metrics import ANOMALY_SERIES_EVICTED, ANOMALY_SERIES_TRACKED
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover - numpy є опційною залежністю
+    np = None  # type: ignore[assignment]
+
+METHODS = ("zscore", "mad")
+# Масштаб MAD до стандартного відхилення нормального розподілу
+_MAD_SCALE = 0.6745
+
+
+class VectorizedAnomalyDetector:
+    """Тримає всі серії у 2-D масиві (серії × хвилинні кошики).
+
+    Кошики спільні для всіх серій: стовпець — це хвилина за модулем розміру
+    вікна. Події лише накопичуються в буфері, а при закритті хвилини
+    (подія наступної хвилини або ``tick``) буфер додається одним
+    ``np.add.at`` і z-score (чи робастний median/MAD) рахується для всіх
+    серій разом. Тому ``update`` завжди повертає ``(False, 0.0)``, а
+    аномалії віддає ``tick``.
+    """
+
+    def __init__(  # noqa: PLR0913 - налаштування детектора з конфігурації
+        self,
+        window_minutes: int,
+        threshold: float = 3.0,
+        max_series: int = 100_000,
+        idle_minutes: int | None = None,
+        *,
+        method: str = "zscore",
+        capacity: int = 1024,
+    ) -> None:
+        if np is None:
+            raise RuntimeError(
+                "Бекенд numpy потребує пакета numpy: pip install 'cortexwatcher[numpy]'",
+            )
+        if method not in METHODS:
+            raise ValueError(f"Невідомий метод детектора: {method}")
+        self.window_minutes = window_minutes
+        self.threshold = threshold
+        self.max_series = max_series
+        if idle_minutes is None:
+            idle_minutes = max(window_minutes * 2, 10)
+        self.idle_minutes = idle_minutes
+        self.method = method
+        self.size = window_minutes + 1
+        capacity = max(1, min(capacity, max_series))
+        self.counts = np.zeros((capacity, self.size), dtype=np.uint32)
+        self.first = np.zeros(capacity, dtype=np.int64)
+        self.last = np.zeros(capacity, dtype=np.int64)
+        self.active = np.zeros(capacity, dtype=bool)
+        self.keys: list[str | None] = [None] * capacity
+        self.index: dict[str, int] = {}
+        self.head: int | None = None
+        self.evicted: dict[str, int] = {"capacity": 0, "idle": 0}
+        self._free = list(range(capacity - 1, -1, -1))
+        self._rows: list[int] = []
+        self._minutes: list[int] = []
+        self._ready: list[AnomalyHit] = []
+
+    def update(
+        self, host: str | None, app: str | None, severity: str | None, timestamp: datetime,
+    ) -> tuple[bool, float]:
+        minute = _minute(timestamp)
+        if self.head is None:
+            self.head = minute
+        elif minute > self.head:
+            self._close(minute)
+        elif self.head - minute >= self.size:
+            # Подія старша за вікно — базову лінію не змінює
+            return False, 0.0
+        key = f"{host or '*'}|{app or '*'}|{severity or '*'}"
+        row = self.index.get(key)
+        if row is None:
+            row = self._allocate(key, minute)
+        self._rows.append(row)
+        self._minutes.append(minute)
+        return False, 0.0
+
+    def tick(self, now: datetime | None = None) -> list[AnomalyHit]:
+        """Закриває хвилини до ``now`` (якщо задано) і віддає знайдені аномалії."""
+
+        if now is not None and self.head is not None:
+            minute = _minute(now)
+            if minute > self.head:
+                self._close(minute)
+        ready, self._ready = self._ready, []
+        return ready
+
+    def _allocate(self, key: str, minute: int) -> int:
+        if not self._free:
+            if len(self.index) < self.max_series:
+                self._grow()
+            else:
+                # Перед витісненням зводимо буфер, щоб не переплутати рядки
+                self._flush()
+                candidates = np.where(self.active, self.last, np.iinfo(np.int64).max)
+                self._release(int(np.argmin(candidates)), "capacity")
+        row = self._free.pop()
+        self.keys[row] = key
+        self.index[key] = row
+        self.active[row] = True
+        self.first[row] = minute
+        self.last[row] = minute
+        return row
+
+    def _grow(self) -> None:
+        capacity = len(self.keys)
+        grown = min(capacity * 2, self.max_series)
+        counts = np.zeros((grown, self.size), dtype=np.uint32)
+        counts[:capacity] = self.counts
+        self.counts = counts
+        self.first = np.concatenate([self.first, np.zeros(grown - capacity, dtype=np.int64)])
+        self.last = np.concatenate([self.last, np.zeros(grown - capacity, dtype=np.int64)])
+        self.active = np.concatenate([self.active, np.zeros(grown - capacity, dtype=bool)])
+        self.keys.extend([None] * (grown - capacity))
+        self._free.extend(range(grown - 1, capacity - 1, -1))
+
+    def _release(self, row: int, reason: str) -> None:
+        key = self.keys[row]
+        if key is not None:
+            del self.index[key]
+        self.keys[row] = None
+        self.active[row] = False
+        self.counts[row] = 0
+        self._free.append(row)
+        self.evicted[reason] += 1
+        ANOMALY_SERIES_EVICTED.labels(reason=reason).inc()
+
+    def _flush(self) -> None:
+        if not self._rows:
+            return
+        rows = np.asarray(self._rows, dtype=np.intp)
+        minutes = np.asarray(self._minutes, dtype=np.int64)
+        np.add.at(self.counts, (rows, minutes % self.size), 1)
+        np.maximum.at(self.last, rows, minutes)
+        np.minimum.at(self.first, rows, minutes)
+        self._rows = []
+        self._minutes = []
+
+    def _close(self, minute: int) -> None:
+        """Оцінює хвилину ``head`` по всіх серіях і зсуває вікно до ``minute``."""
+
+        if self.head is None:
+            return
+        self._flush()
+        closed = self.head
+        rows, scores, current, ok = self._score(closed)
+        hits = np.flatnonzero(ok & (scores >= self.threshold))
+        if hits.size:
+            timestamp = datetime.fromtimestamp(closed * 60, tz=UTC)
+            for index in hits.tolist():
+                self._ready.append(
+                    AnomalyHit(
+                        signal=self.keys[rows[index]],
+                        score=float(scores[index]),
+                        timestamp=timestamp,
+                        value=int(current[index]),
+                    ),
+                )
+        gap = minute - closed
+        if gap >= self.size:
+            self.counts[:] = 0
+        else:
+            self.counts[:, [(closed + step) % self.size for step in range(1, gap + 1)]] = 0
+        self.head = minute
+        idle = np.flatnonzero(self.active & (self.last < minute - self.idle_minutes))
+        for row in idle.tolist():
+            self._release(row, "idle")
+
+    def _score(self, minute: int) -> tuple[Any, Any, Any, Any]:
+        rows = np.flatnonzero(self.active)
+        counts = self.counts[rows].astype(np.float64)
+        filled = np.minimum(minute - self.first[rows] + 1, self.size)
+        current = counts[:, minute % self.size]
+        scores = np.zeros(rows.size)
+        if self.method == "zscore":
+            # Стовпці поза заповненою частиною вікна нульові, тож сума їх не враховує
+            mean = counts.sum(axis=1) / filled
+            variance = (counts * counts).sum(axis=1) / filled - mean * mean
+            ok = (filled >= _MIN_FILLED) & (variance > _MIN_VARIANCE)
+            scores[ok] = (current[ok] - mean[ok]) / np.sqrt(variance[ok])
+        else:
+            ages = (minute - np.arange(self.size)) % self.size
+            values = np.where(ages[None, :] < filled[:, None], counts, np.nan)
+            if rows.size:
+                median = np.nanmedian(values, axis=1)
+                mad = np.nanmedian(np.abs(values - median[:, None]), axis=1)
+            else:
+                median = mad = np.zeros(0)
+            ok = (filled >= _MIN_FILLED) & (mad > 0)
+            scores[ok] = _MAD_SCALE * (current[ok] - median[ok]) / mad[ok]
+        return rows, scores, current, ok
+
+    def report_metrics(self) -> None:
+        ANOMALY_SERIES_TRACKED.set(len(self.index))
+
+    def snapshot(self) -> dict[str, list[WindowStat]]:
+        """Повертає копію статистик (включно з нульовими хвилинами)."""
+
+        self._flush()
+        result: dict[str, list[WindowStat]] = {}
+        if self.head is None:
+            return result
+        for key, row in self.index.items():
+            filled = int(min(self.head - self.first[row] + 1, self.size))
+            result[key] = [
+                WindowStat(
+                    timestamp=datetime.fromtimestamp(minute * 60, tz=UTC),
+                    value=int(self.counts[row, minute % self.size]),
+                )
+                for minute in range(self.head - filled + 1, self.head + 1)
+            ]
+        return result
+
+
+__all__ = ["VectorizedAnomalyDetector", "METHODS"]
@@ -1,13 +1,18 @@
 """FastAPI застосунок."""
 from __future__ import annotations
 
+import asyncio
 from contextlib import asynccontextmanager
 
 from fastapi import FastAPI
+from redis import Redis
+from redis.asyncio import Redis as AsyncRedis
 
-from cortexwatcher.api.routers import health, ingest, metrics, query
+from cortexwatcher.analyzer.inline import InlineAnalyzer
+from cortexwatcher.api.routers import analytics, health, ingest, metrics, query, rules
 from cortexwatcher.config import get_settings
 from cortexwatcher.logging import configure_logging
+from cortexwatcher.parsers.parallel import ParsePool
 from cortexwatcher.storage import get_storage
 
 
@@ -18,9 +23,29 @@ async def lifespan(app: FastAPI):
     settings = get_settings()
     app.state.settings = settings
     app.state.storage = get_storage()
+    app.state.redis = AsyncRedis.from_url(settings.redis_url)
+    app.state.parse_pool = ParsePool(
+        settings.ingest_parse_workers,
+        inline_max_chars=settings.ingest_inline_max_kb * 1024,
+        chunk_chars=settings.ingest_parse_chunk_kb * 1024,
+    )
+    await app.state.parse_pool.start()
+    inline_redis: Redis | None = None
+    app.state.inline_analyzer = None
+    if settings.inline_sources():
+        # Inline-аналізатор працює в потоках, тож має власний синхронний клієнт Redis
+        inline_redis = Redis.from_url(settings.redis_url)
+        app.state.inline_analyzer = InlineAnalyzer(inline_redis)
+        await asyncio.to_thread(app.state.inline_analyzer.start)
     try:
         yield
     finally:
+        if app.state.inline_analyzer is not None:
+            await asyncio.to_thread(app.state.inline_analyzer.close)
+        if inline_redis is not None:
+            inline_redis.close()
+        app.state.parse_pool.close()
+        await app.state.redis.aclose()
         storage = getattr(app.state, "storage", None)
         close = getattr(storage, "close", None)
         if callable(close):
@@ -34,6 +59,8 @@ app.include_router(health.router)
 app.include_router(metrics.router)
 app.include_router(ingest.router)
 app.include_router(query.router)
+app.include_router(rules.router)
+app.include_router(analytics.router)
 
 
 __all__ = ["app"]
@@ -0,0 +1,159 @@
+"""Ендпоінти потокової аналітики (скетчі аналізатора)."""
+from __future__ import annotations
+
+import fnmatch
+from datetime import UTC, datetime
+from typing import Any
+
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from redis.asyncio import Redis as AsyncRedis
+from redis.exceptions import RedisError
+
+from cortexwatcher.analyzer.sketches import (
+    KllSketch,
+    cardinality_groups_key,
+    cardinality_key,
+    quantiles_key,
+    top_key,
+)
+
+router = APIRouter(prefix="/analytics")
+
+
+async def get_redis_from_app(request: Request) -> AsyncRedis:
+    """Спільний клієнт Redis, створений у ``lifespan`` застосунку."""
+
+    redis: AsyncRedis | None = getattr(request.app.state, "redis", None)
+    if redis is None:
+        raise HTTPException(status_code=500, detail="Redis не ініціалізовано")
+    return redis
+
+
+# Залежності з викликами в сигнатурі ruff вважає B008, тож вони винесені сюди
+_QUANTILES_QUERY = Query(default=[0.5, 0.95, 0.99])
+_REDIS = Depends(get_redis_from_app)
+
+
+def _closed_minutes(minutes: int) -> range:
+    now_minute = int(datetime.now(UTC).timestamp() // 60)
+    return range(now_minute - minutes, now_minute)
+
+
+def _text(value: bytes | str) -> str:
+    return value.decode() if isinstance(value, bytes) else str(value)
+
+
+@router.get("/quantiles")
+async def quantiles(  # noqa: PLR0913, PLR0917 - параметри запиту FastAPI
+    field: str = Query(..., description="Назва числового сигналу з QUANTILE_FIELDS"),
+    minutes: int = Query(default=5, ge=1, le=1440),
+    series: str = Query(default="*", description="glob серії host|app"),
+    q: list[float] = _QUANTILES_QUERY,
+    merge: bool = Query(default=False, description="Злити всі серії в одну оцінку"),
+    client: AsyncRedis = _REDIS,
+) -> dict[str, Any]:
+    """Квантилі поля за останні ``minutes`` закритих хвилин, злиті з усіх реплік."""
+
+    keys = [quantiles_key(field, minute) for minute in _closed_minutes(minutes)]
+    try:
+        pipe = client.pipeline(transaction=False)
+        for key in keys:
+            pipe.hgetall(key)
+        buckets = await pipe.execute()
+    except RedisError as exc:
+        return {"status": "error", "detail": str(exc), "field": field, "series": {}}
+
+    merged: dict[str, KllSketch] = {}
+    for bucket in buckets:
+        for raw_field, payload in (bucket or {}).items():
+            name = _text(raw_field).rsplit("#", 1)[0]
+            if not fnmatch.fnmatchcase(name, series):
+                continue
+            target = "*" if merge else name
+            try:
+                sketch = KllSketch.from_bytes(payload)
+                if target in merged:
+                    merged[target].merge(sketch)
+                else:
+                    merged[target] = sketch
+            except ValueError:
+                # Пошкоджений скетч або скетч репліки з іншим k
+                continue
+
+    labels = [f"p{value * 100:g}" for value in q]
+    result = {
+        name: {
+            "count": sketch.count,
+            "min": sketch.min,
+            "max": sketch.max,
+            "quantiles": dict(zip(labels, sketch.quantiles(q), strict=True)),
+        }
+        for name, sketch in sorted(merged.items())
+    }
+    return {"status": "ok", "field": field, "minutes": minutes, "series": result}
+
+
+@router.get("/top")
+async def top(
+    field: str = Query(..., description="Поле з TOP_FIELDS, напр. srcip"),
+    minutes: int = Query(default=5, ge=1, le=1440),
+    limit: int = Query(default=10, ge=1, le=1000),
+    client: AsyncRedis = _REDIS,
+) -> dict[str, Any]:
+    """Найчастіші значення поля за останні закриті хвилини (сума по всіх репліках)."""
+
+    try:
+        pipe = client.pipeline(transaction=False)
+        for minute in _closed_minutes(minutes):
+            pipe.zrevrange(top_key(field, minute), 0, -1, withscores=True)
+        buckets = await pipe.execute()
+    except RedisError as exc:
+        return {"status": "error", "detail": str(exc), "field": field, "items": []}
+
+    totals: dict[str, float] = {}
+    for bucket in buckets:
+        for value, count in bucket or []:
+            name = _text(value)
+            totals[name] = totals.get(name, 0) + count
+    ranked = sorted(totals.items(), key=lambda pair: (-pair[1], pair[0]))[:limit]
+    items = [{"value": value, "count": int(count)} for value, count in ranked]
+    return {"status": "ok", "field": field, "minutes": minutes, "items": items}
+
+
+@router.get("/cardinality")
+async def cardinality(
+    field: str = Query(..., description="Сигнал з CARDINALITY_FIELDS, напр. dst_ports"),
+    minutes: int = Query(default=5, ge=1, le=1440),
+    group: str | None = Query(default=None, description="Конкретна група, напр. srcip"),
+    limit: int = Query(default=10, ge=1, le=1000),
+    client: AsyncRedis = _REDIS,
+) -> dict[str, Any]:
+    """Оцінка кількості різних значень у групах за останні закриті хвилини.
+
+    Для кожної групи ``PFCOUNT`` рахує обʼєднання хвилинних HyperLogLog,
+    тож значення, що повторюються в різних хвилинах, враховуються один раз.
+    """
+
+    window = _closed_minutes(minutes)
+    try:
+        if group is not None:
+            groups = [group]
+        else:
+            pipe = client.pipeline(transaction=False)
+            for minute in window:
+                pipe.smembers(cardinality_groups_key(field, minute))
+            members = await pipe.execute()
+            groups = sorted({_text(item) for bucket in members for item in bucket or ()})
+        pipe = client.pipeline(transaction=False)
+        for name in groups:
+            pipe.pfcount(*[cardinality_key(field, minute, name) for minute in window])
+        counts = await pipe.execute() if groups else []
+    except RedisError as exc:
+        return {"status": "error", "detail": str(exc), "field": field, "groups": []}
+
+    ranked = sorted(zip(groups, counts, strict=True), key=lambda pair: (-pair[1], pair[0]))[:limit]
+    items = [{"group": name, "distinct": int(count)} for name, count in ranked]
+    return {"status": "ok", "field": field, "minutes": minutes, "groups": items}
+
+
+__all__ = ["router"]
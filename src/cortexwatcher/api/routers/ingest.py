@@ -1,7 +1,9 @@
 """Ендпоінти прийому логів."""
 from __future__ import annotations
 
+import asyncio
 import hashlib
+from collections.abc import Mapping
 from datetime import datetime, timezone
 from typing import Any, List
 
@@ -9,20 +11,18 @@ from fastapi import APIRouter, Depends, HTTPException, Request, status
 from pydantic import BaseModel, Field
 
 from cortexwatcher.analyzer.correlate import build_correlation_key
+from cortexwatcher.analyzer.inline import InlineAnalyzer, inline_analysis_enabled
 from cortexwatcher.config import get_settings
 from cortexwatcher.db.models import LogNormalized, LogRaw
-from cortexwatcher.parsers import (
-    detect_format,
-    parse_gelf,
-    parse_json_lines,
-    parse_suricata,
-    parse_syslog,
-    parse_wazuh_alert,
-)
+from cortexwatcher.parsers import detect_format, parse_content
+from cortexwatcher.parsers.parallel import ParsePool
 from cortexwatcher.storage.base import LogStorage
 
 router = APIRouter()
 
+# Більші пачки записів перетворюються на ORM-обʼєкти в окремому потоці
+NORMALIZE_INLINE_MAX = 1000
+
 
 def _ensure_utc(ts: datetime | None) -> datetime | None:
     if ts is None:
@@ -65,8 +65,12 @@ async def ingest_logs(
     if not content.strip():
         raise HTTPException(status_code=400, detail="Порожнє повідомлення")
 
-    fmt = detect_format(content)
-    parsed = _parse_by_format(fmt, content)
+    pool: ParsePool | None = getattr(request.app.state, "parse_pool", None)
+    if pool is None:
+        fmt = detect_format(content)
+        parsed = parse_content(fmt, content)
+    else:
+        fmt, parsed = await pool.parse(content)
 
     received_at = datetime.now(timezone.utc)
     raw = LogRaw(
@@ -76,6 +80,25 @@ async def ingest_logs(
         format=fmt,
         hash=hashlib.sha256(content.encode()).hexdigest(),
     )
+    if len(parsed) > NORMALIZE_INLINE_MAX:
+        # Побудова обʼєктів SQLAlchemy дорожча за сам розбір; потік витісняється
+        # інтерпретатором, тож цикл подій тим часом обслуговує інші запити
+        normalized = await asyncio.to_thread(_normalize, parsed, received_at)
+    else:
+        normalized = _normalize(parsed, received_at)
+
+    await storage.store_raw_batch([raw])
+    raw_id = getattr(raw, "id", None)
+    for item in normalized:
+        item.raw_id = raw_id or 0
+    await storage.store_normalized_batch(normalized)
+    inline: InlineAnalyzer | None = getattr(request.app.state, "inline_analyzer", None)
+    if normalized and inline is not None and inline_analysis_enabled(source):
+        await inline.analyze(storage, normalized)
+    return {"stored": len(normalized), "format": fmt}
+
+
+def _normalize(parsed: list[Mapping[str, Any]], received_at: datetime) -> list[LogNormalized]:
     normalized: list[LogNormalized] = []
     for item in parsed:
         ts_raw = item.get("timestamp")
@@ -92,13 +115,7 @@ async def ingest_logs(
                 correlation_key=build_correlation_key(item),
             )
         )
-
-    await storage.store_raw_batch([raw])
-    raw_id = getattr(raw, "id", None)
-    for item in normalized:
-        item.raw_id = raw_id or 0
-    await storage.store_normalized_batch(normalized)
-    return {"stored": len(normalized), "format": fmt}
+    return normalized
 
 
 def _ensure_string(item: Any) -> str:
@@ -113,18 +130,4 @@ def json_dumps(item: Any) -> str:
     return json.dumps(item, ensure_ascii=False)
 
 
-def _parse_by_format(fmt: str, content: str) -> list[dict[str, Any]]:
-    if fmt == "syslog":
-        return parse_syslog(content)
-    if fmt == "json_lines":
-        return parse_json_lines(content)
-    if fmt == "gelf":
-        return parse_gelf(content)
-    if fmt == "suricata":
-        return parse_suricata(content)
-    if fmt == "wazuh":
-        return parse_wazuh_alert(content)
-    return []
-
-
 __all__ = ["router"]
@@ -0,0 +1,42 @@
+"""Ендпоінти стану наборів правил."""
+from __future__ import annotations
+
+from typing import Any
+
+from fastapi import APIRouter
+from redis.asyncio import Redis as AsyncRedis
+from redis.exceptions import RedisError
+
+from cortexwatcher.analyzer.reload import RULES_VERSIONS_KEY, live_replicas
+from cortexwatcher.config import get_settings
+
+router = APIRouter()
+
+
+@router.get("/rules")
+async def rules_versions() -> dict[str, Any]:
+    """Повертає активну версію правил для кожної живої репліки.
+
+    Записи реплік без свіжого ``seen_at`` (процес зупинився без ``close``)
+    не враховуються.
+    """
+
+    settings = get_settings()
+    client = AsyncRedis.from_url(settings.redis_url, encoding="utf-8", decode_responses=True)
+    try:
+        raw = await client.hgetall(RULES_VERSIONS_KEY)
+    except RedisError as exc:
+        return {"status": "error", "detail": str(exc), "replicas": {}, "versions": []}
+    finally:
+        await client.aclose()
+
+    replicas, _ = live_replicas(raw)
+    versions = sorted({str(item.get("version")) for item in replicas.values()})
+    return {
+        "status": "ok" if len(versions) <= 1 else "diverged",
+        "replicas": replicas,
+        "versions": versions,
+    }
+
+
+__all__ = ["router"]
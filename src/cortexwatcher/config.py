@@ -18,10 +18,43 @@ class Settings(BaseSettings):
     clickhouse_url: str | None = Field(None, alias="CLICKHOUSE_URL")
     clickhouse_enabled: bool = Field(False, alias="CLICKHOUSE")
     ingest_max_file_mb: int = Field(50, alias="INGEST_MAX_FILE_MB")
+    ingest_parse_workers: int = Field(2, alias="INGEST_PARSE_WORKERS")
+    ingest_inline_max_kb: int = Field(256, alias="INGEST_INLINE_MAX_KB")
+    ingest_parse_chunk_kb: int = Field(1024, alias="INGEST_PARSE_CHUNK_KB")
     alert_min_level: int = Field(5, alias="ALERT_MIN_LEVEL")
     anomaly_window_min: int = Field(5, alias="ANOMALY_WINDOW_MIN")
+    anomaly_max_series: int = Field(100000, alias="ANOMALY_MAX_SERIES")
+    anomaly_idle_min: int = Field(60, alias="ANOMALY_IDLE_MIN")
+    anomaly_backend: str = Field("python", alias="ANOMALY_BACKEND")
+    anomaly_method: str = Field("zscore", alias="ANOMALY_METHOD")
+    anomaly_model: str = Field("window", alias="ANOMALY_MODEL")
+    anomaly_models: str = Field("", alias="ANOMALY_MODELS")
     api_auth_token: str = Field(..., alias="API_AUTH_TOKEN")
     rules_path: str = Field("src/cortexwatcher/rules/sample_rules.yaml", alias="RULES_PATH")
+    inline_analysis_sources: str = Field("", alias="INLINE_ANALYSIS_SOURCES")
+    alert_suppress_window: int = Field(300, alias="ALERT_SUPPRESS_WINDOW")
+    notify_outbox: bool = Field(True, alias="NOTIFY_OUTBOX")
+    notify_chat_per_min: int = Field(20, alias="NOTIFY_CHAT_PER_MIN")
+    notify_global_per_sec: int = Field(25, alias="NOTIFY_GLOBAL_PER_SEC")
+    notify_digest_threshold: int = Field(10, alias="NOTIFY_DIGEST_THRESHOLD")
+    rule_state_max_groups: int = Field(10000, alias="RULE_STATE_MAX_GROUPS")
+    rule_profile_sample: float = Field(0.01, alias="RULE_PROFILE_SAMPLE")
+    rule_match_cache_size: int = Field(10000, alias="RULE_MATCH_CACHE_SIZE")
+    indicator_sets: str = Field("", alias="INDICATOR_SETS")
+    analyzer_metrics_port: int = Field(0, alias="ANALYZER_METRICS_PORT")
+    quantile_fields: str = Field(
+        "request_time=data.request_time,flow_bytes=raw.flow.bytes_toserver",
+        alias="QUANTILE_FIELDS",
+    )
+    top_fields: str = Field("srcip,dstip", alias="TOP_FIELDS")
+    cardinality_fields: str = Field(
+        "dst_ports=raw.dest_port@srcip,dst_hosts=dstip@srcip",
+        alias="CARDINALITY_FIELDS",
+    )
+    top_k_capacity: int = Field(200, alias="TOP_K_CAPACITY")
+    sketch_retention_min: int = Field(120, alias="SKETCH_RETENTION_MIN")
+    analyzer_checkpoint_interval: int = Field(60, alias="ANALYZER_CHECKPOINT_INTERVAL")
+    analyzer_checkpoint_path: str = Field("", alias="ANALYZER_CHECKPOINT_PATH")
 
     model_config = SettingsConfigDict(env_file=".env", env_file_encoding="utf-8", case_sensitive=False)
 
@@ -52,6 +85,58 @@ class Settings(BaseSettings):
                 continue
         return result
 
+    def inline_sources(self) -> set[str]:
+        """Джерела, для яких правила застосовуються одразу під час інжесту ("*" — усі)."""
+
+        parts = self.inline_analysis_sources.split(",")
+        return {part.strip().lower() for part in parts if part.strip()}
+
+    def quantile_field_paths(self) -> dict[str, str]:
+        """Назви числових сигналів і шляхи до них у ``meta_json`` (``назва=шлях,...``)."""
+
+        fields: dict[str, str] = {}
+        for part in self.quantile_fields.split(","):
+            name, sep, path = part.partition("=")
+            if sep and name.strip() and path.strip():
+                fields[name.strip()] = path.strip()
+        return fields
+
+    def indicator_set_paths(self) -> dict[str, str]:
+        """Набори індикаторів для умов ``in set`` (``назва=шлях,...``)."""
+
+        sets: dict[str, str] = {}
+        for part in self.indicator_sets.split(","):
+            name, sep, path = part.partition("=")
+            if sep and name.strip() and path.strip():
+                sets[name.strip()] = path.strip()
+        return sets
+
+    def top_field_names(self) -> list[str]:
+        """Поля для підрахунку найчастіших значень (``TOP_FIELDS`` через кому)."""
+
+        return [part.strip() for part in self.top_fields.split(",") if part.strip()]
+
+    def cardinality_specs(self) -> dict[str, tuple[str, str]]:
+        """Сигнали кардинальності ``назва=поле@група`` -> (поле значення, поле групи)."""
+
+        specs: dict[str, tuple[str, str]] = {}
+        for part in self.cardinality_fields.split(","):
+            name, sep, spec = part.partition("=")
+            value, at, group = spec.partition("@")
+            if sep and at and name.strip() and value.strip() and group.strip():
+                specs[name.strip()] = (value.strip(), group.strip())
+        return specs
+
+    def anomaly_model_rules(self) -> list[tuple[str, str]]:
+        """Пари (glob сигналу, модель) з ``ANOMALY_MODELS`` у форматі ``шаблон=модель,...``."""
+
+        rules: list[tuple[str, str]] = []
+        for part in self.anomaly_models.split(","):
+            pattern, sep, model = part.partition("=")
+            if sep and pattern.strip() and model.strip():
+                rules.append((pattern.strip(), model.strip().lower()))
+        return rules
+
 
 @lru_cache(maxsize=1)
 def get_settings() -> Settings:
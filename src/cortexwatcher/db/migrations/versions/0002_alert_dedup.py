@@ -0,0 +1,27 @@
+"""Лічильник повторів алертів для дедуплікації."""
+from __future__ import annotations
+
+import sqlalchemy as sa
+from alembic import op
+
+revision = "0002_alert_dedup"
+down_revision = "0001_initial"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column("alerts", sa.Column("correlation_key", sa.String(length=255), nullable=True))
+    op.add_column(
+        "alerts",
+        sa.Column("occurrences", sa.Integer(), nullable=False, server_default="1"),
+    )
+    op.add_column("alerts", sa.Column("last_seen_at", sa.DateTime(), nullable=True))
+    op.create_index("ix_alerts_rule_corr", "alerts", ["rule_id", "correlation_key"], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index("ix_alerts_rule_corr", table_name="alerts")
+    op.drop_column("alerts", "last_seen_at")
+    op.drop_column("alerts", "occurrences")
+    op.drop_column("alerts", "correlation_key")
@@ -65,6 +65,13 @@ class Alert(Base):
     description: Mapped[str] = mapped_column(Text, nullable=False)
     tags: Mapped[list[str]] = mapped_column(JSONB, default=list)
     evidence_json: Mapped[dict[str, Any]] = mapped_column(JSONB, nullable=False, default=dict)
+    correlation_key: Mapped[str | None] = mapped_column(String(255))
+    occurrences: Mapped[int] = mapped_column(nullable=False, default=1)
+    last_seen_at: Mapped[datetime | None] = mapped_column()
+
+    __table_args__ = (
+        Index("ix_alerts_rule_corr", "rule_id", "correlation_key"),
+    )
 
 
 class Anomaly(Base):
@@ -1,14 +1,53 @@
 """Парсери логів."""
+from __future__ import annotations
+
+from collections.abc import Iterator, Mapping
+from typing import Any
 
 from .detect import detect_format
-from .gelf import parse_gelf
-from .json_lines import parse_json_lines
-from .suricata import parse_suricata
-from .syslog import parse_syslog
-from .wazuh import parse_wazuh_alert
+from .gelf import iter_gelf, parse_gelf
+from .json_lines import iter_json_lines, parse_json_lines
+from .stream import LineSource, aiter_line_batches, detect_stream, iter_lines
+from .suricata import iter_suricata, parse_suricata
+from .syslog import iter_syslog, parse_syslog
+from .wazuh import iter_wazuh_alerts, parse_wazuh_alert
+
+
+def iter_content(fmt: str, source: LineSource) -> Iterator[Mapping[str, Any]]:
+    """Ліниво розбирає джерело парсером формату ``fmt`` (результат ``detect_format``)."""
+
+    if fmt == "syslog":
+        return iter_syslog(source)
+    if fmt == "json_lines":
+        return iter_json_lines(source)
+    if fmt == "gelf":
+        return iter_gelf(source)
+    if fmt == "suricata":
+        return iter_suricata(source)
+    if fmt == "wazuh":
+        return iter_wazuh_alerts(source)
+    return iter(())
+
+
+def parse_content(fmt: str, content: LineSource) -> list[Mapping[str, Any]]:
+    """Розбирає вміст парсером формату ``fmt`` (результат ``detect_format``)."""
+
+    return list(iter_content(fmt, content))
+
 
 __all__ = [
+    "LineSource",
+    "aiter_line_batches",
     "detect_format",
+    "detect_stream",
+    "iter_content",
+    "iter_gelf",
+    "iter_json_lines",
+    "iter_lines",
+    "iter_suricata",
+    "iter_syslog",
+    "iter_wazuh_alerts",
+    "parse_content",
     "parse_gelf",
     "parse_json_lines",
     "parse_suricata",
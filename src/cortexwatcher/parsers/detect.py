@@ -5,22 +5,40 @@ import json
 import re
 from typing import Iterable
 
+_NON_SPACE = re.compile(r"\S")
 SYSLOG_HINT = re.compile(r"<\d+>[A-Z][a-z]{2} +\d{1,2} \d{2}:\d{2}:\d{2}")
 GELF_HINT_KEYS = {"short_message", "full_message", "_id"}
 WAZUH_HINT_KEYS = {"rule", "agent", "decoder"}
 SURICATA_HINT_KEYS = {"event_type", "flow_id", "src_ip", "dest_ip", "alert"}
 
+# Скільки тексту дивиться detect_format; перший рядок довший за межу читається повністю
+DETECT_PREFIX_CHARS = 64 * 1024
+DETECT_MAX_LINES = 200
+
 
 def detect_format(sample: str | Iterable[str]) -> str:
-    """Повертає рядок формату: syslog/json_lines/gelf/wazuh/unknown."""
+    """Повертає рядок формату: syslog/json_lines/gelf/wazuh/unknown.
+
+    Дивиться лише на перші ``DETECT_PREFIX_CHARS`` символів і не більше
+    ``DETECT_MAX_LINES`` рядків. Ітератор при цьому частково вичитується;
+    щоб не втратити рядки потоку, користуйтеся ``detect_stream``.
+    """
 
     if isinstance(sample, str):
-        text = sample.strip()
-        first_line = text.splitlines()[0] if text else ""
+        first = _NON_SPACE.search(sample)
+        start = first.start() if first else len(sample)
+        newline = sample.find("\n", start)
+        end = max(start + DETECT_PREFIX_CHARS, newline if newline != -1 else len(sample))
+        lines = sample[start:end].splitlines()[:DETECT_MAX_LINES]
     else:
-        lines = list(sample)
-        first_line = next((line.strip() for line in lines if line.strip()), "")
-        text = "\n".join(lines)
+        lines = []
+        size = 0
+        for line in sample:
+            lines.append(line)
+            size += len(line)
+            if size >= DETECT_PREFIX_CHARS or len(lines) >= DETECT_MAX_LINES:
+                break
+    first_line = next((line.strip() for line in lines if line.strip()), "")
 
     if not first_line:
         return "unknown"
@@ -45,7 +63,8 @@ def detect_format(sample: str | Iterable[str]) -> str:
     if first_line.count(" ") >= 2 and first_line.split(" ")[1].isdigit():
         return "syslog"
 
-    if text.count("\n") > 0 and all(line.strip().startswith("{") for line in text.splitlines() if line.strip()):
+    stripped = [line.strip() for line in lines if line.strip()]
+    if len(stripped) > 1 and all(line.startswith("{") for line in stripped):
         return "json_lines"
 
     return "unknown"
@@ -2,8 +2,12 @@
 from __future__ import annotations
 
 import json
-from datetime import datetime, timezone
-from typing import Dict, List, TypedDict
+from collections.abc import Iterator
+from datetime import datetime
+from typing import TypedDict
+
+from cortexwatcher.parsers.stream import LineSource, iter_lines
+from cortexwatcher.parsers.timestamps import parse_timestamp
 
 
 class GelfRecord(TypedDict, total=False):
@@ -28,50 +32,53 @@ LEVELS = {
 }
 
 
-def parse_gelf(payload: str | Dict[str, object]) -> List[GelfRecord]:
+def parse_gelf(payload: LineSource | dict[str, object]) -> list[GelfRecord]:
     """Парсить GELF JSON або рядок."""
 
+    if isinstance(payload, dict):
+        return list(_convert_document(payload))
+    return list(iter_gelf(payload))
+
+
+def iter_gelf(payload: LineSource) -> Iterator[GelfRecord]:
+    """Ліниво парсить GELF: один JSON-документ (обʼєкт чи масив) або NDJSON.
+
+    Рядок спершу розбирається як цілий документ; якщо це не вдалося
+    (кілька документів по рядку), він, як і файли та потоки, читається
+    построково.
+    """
+
     if isinstance(payload, str):
         try:
             data = json.loads(payload)
         except json.JSONDecodeError:
-            return []
-    else:
-        data = payload
-
-    if isinstance(data, dict) and "_id" in data:
-        return [_convert_entry(data)]
-    if isinstance(data, list):
-        return [_convert_entry(item) for item in data if isinstance(item, dict)]
-    if isinstance(data, dict):
-        return [_convert_entry(data)]
-    return []
+            pass
+        else:
+            yield from _convert_document(data)
+            return
+    for raw in iter_lines(payload):
+        line = raw.strip()
+        if not line:
+            continue
+        try:
+            data = json.loads(line)
+        except json.JSONDecodeError:
+            continue
+        yield from _convert_document(data)
 
 
-def _ensure_utc(ts: datetime) -> datetime:
-    if ts.tzinfo is None:
-        return ts.replace(tzinfo=timezone.utc)
-    return ts.astimezone(timezone.utc)
+def _convert_document(data: object) -> Iterator[GelfRecord]:
+    if isinstance(data, dict):
+        yield _convert_entry(data)
+    elif isinstance(data, list):
+        for item in data:
+            if isinstance(item, dict):
+                yield _convert_entry(item)
 
 
-def _convert_entry(entry: Dict[str, object]) -> GelfRecord:
+def _convert_entry(entry: dict[str, object]) -> GelfRecord:
     timestamp = entry.get("timestamp")
-    ts: datetime | None
-    if isinstance(timestamp, (float, int)):
-        ts = datetime.fromtimestamp(float(timestamp), tz=timezone.utc)
-    elif isinstance(timestamp, str):
-        try:
-            from dateutil import parser as date_parser
-
-            ts = date_parser.parse(timestamp)
-        except (ValueError, TypeError):
-            ts = None
-        else:
-            ts = _ensure_utc(ts)
-    elif isinstance(timestamp, datetime):
-        ts = _ensure_utc(timestamp)
-    else:
-        ts = None
+    ts = parse_timestamp(timestamp)
     level = entry.get("level")
     severity = LEVELS.get(int(level)) if isinstance(level, (int, float)) else None
     record: GelfRecord = {
@@ -86,4 +93,4 @@ def _convert_entry(entry: Dict[str, object]) -> GelfRecord:
     return record
 
 
-__all__ = ["parse_gelf", "GelfRecord"]
+__all__ = ["iter_gelf", "parse_gelf", "GelfRecord"]
@@ -2,8 +2,12 @@
 from __future__ import annotations
 
 import json
-from datetime import datetime, timezone
-from typing import Iterable, List, TypedDict
+from collections.abc import Iterator
+from datetime import datetime
+from typing import TypedDict
+
+from cortexwatcher.parsers.stream import LineSource, iter_lines
+from cortexwatcher.parsers.timestamps import parse_timestamp
 
 
 class JsonLineRecord(TypedDict, total=False):
@@ -15,15 +19,16 @@ class JsonLineRecord(TypedDict, total=False):
     data: dict
 
 
-def parse_json_lines(lines: str | Iterable[str]) -> List[JsonLineRecord]:
+def parse_json_lines(lines: LineSource) -> list[JsonLineRecord]:
     """Парсить JSON lines у список словників."""
 
-    if isinstance(lines, str):
-        items = lines.splitlines()
-    else:
-        items = list(lines)
-    records: List[JsonLineRecord] = []
-    for raw in items:
+    return list(iter_json_lines(lines))
+
+
+def iter_json_lines(lines: LineSource) -> Iterator[JsonLineRecord]:
+    """Ліниво парсить JSON lines з рядка, файлу чи потоку шматків."""
+
+    for raw in iter_lines(lines):
         raw = raw.strip()
         if not raw:
             continue
@@ -39,32 +44,11 @@ def parse_json_lines(lines: str | Iterable[str]) -> List[JsonLineRecord]:
             "message": payload.get("message") or payload.get("msg"),
             "data": payload,
         }
-        records.append(record)
-    return records
-
-
-def _ensure_utc(ts: datetime) -> datetime:
-    if ts.tzinfo is None:
-        return ts.replace(tzinfo=timezone.utc)
-    return ts.astimezone(timezone.utc)
+        yield record
 
 
 def coerce_timestamp(value: object) -> datetime | None:
-    if value is None:
-        return None
-    if isinstance(value, (int, float)):
-        return datetime.fromtimestamp(float(value), tz=timezone.utc)
-    if isinstance(value, str):
-        try:
-            from dateutil import parser as date_parser
-
-            parsed = date_parser.parse(value)
-        except (ValueError, TypeError):
-            return None
-        return _ensure_utc(parsed)
-    if isinstance(value, datetime):
-        return _ensure_utc(value)
-    return None
+    return parse_timestamp(value)
 
 
-__all__ = ["parse_json_lines", "JsonLineRecord", "coerce_timestamp"]
+__all__ = ["iter_json_lines", "parse_json_lines", "JsonLineRecord", "coerce_timestamp"]
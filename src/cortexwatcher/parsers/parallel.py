@@ -0,0 +1,107 @@
+"""Розбір великих тіл інжесту в пулі процесів.
+
+Парсинг — чиста робота CPU під GIL: синхронний розбір тіла на десятки
+мегабайтів у async-обробнику зупиняє цикл подій і всі інші запити
+воркера uvicorn. ``ParsePool`` визначає формат за префіксом у циклі
+подій (це дешево), малі тіла розбирає на місці, а великі ріже на шматки
+по межах рядків і розбирає паралельно в процесах, зберігаючи порядок
+записів. Пул створюється один раз у ``lifespan`` застосунку.
+"""
+from __future__ import annotations
+
+import asyncio
+import multiprocessing
+from collections.abc import Mapping
+from concurrent.futures import Executor, ProcessPoolExecutor
+from typing import Any
+
+from cortexwatcher.parsers import detect_format, parse_content
+
+# Формати, де один JSON-документ може займати кілька рядків: різати їх не можна
+_WHOLE_DOCUMENT_FORMATS = frozenset({"gelf", "wazuh"})
+
+
+def split_line_chunks(content: str, chunk_chars: int) -> list[str]:
+    """Ріже текст на шматки приблизно по ``chunk_chars`` символів по межах рядків."""
+
+    if chunk_chars <= 0 or len(content) <= chunk_chars:
+        return [content]
+    chunks: list[str] = []
+    start = 0
+    length = len(content)
+    while start < length:
+        end = content.find("\n", min(start + chunk_chars, length))
+        if end == -1:
+            chunks.append(content[start:])
+            break
+        chunks.append(content[start : end + 1])
+        start = end + 1
+    return chunks
+
+
+def _parse_chunk(fmt: str, chunk: str) -> list[Mapping[str, Any]]:
+    return parse_content(fmt, chunk)
+
+
+def _warm_up() -> None:
+    """Порожнє завдання, щоб процеси пулу стартували й імпортували парсери заздалегідь."""
+
+
+class ParsePool:
+    """Пул процесів для розбору тіл інжесту з порогом розміру.
+
+    ``workers == 0`` вимикає пул: великі тіла тоді розбираються в окремому
+    потоці, що не зупиняє цикл подій повністю, але й не дає паралелізму.
+    """
+
+    def __init__(self, workers: int, inline_max_chars: int, chunk_chars: int) -> None:
+        self.workers = max(0, workers)
+        self.inline_max_chars = inline_max_chars
+        self.chunk_chars = chunk_chars
+        self._executor: Executor | None = None
+        if self.workers:
+            # spawn, а не fork: батьківський процес uvicorn уже має потоки й відкриті зʼєднання
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+
+    async def start(self) -> None:
+        if self._executor is None:
+            return
+        loop = asyncio.get_running_loop()
+        await asyncio.gather(
+            *(loop.run_in_executor(self._executor, _warm_up) for _ in range(self.workers)),
+        )
+
+    async def parse(self, content: str) -> tuple[str, list[Mapping[str, Any]]]:
+        """Повертає формат і записи; порядок записів збігається з порядком рядків."""
+
+        fmt = detect_format(content)
+        if fmt == "unknown":
+            return fmt, []
+        if len(content) <= self.inline_max_chars:
+            return fmt, parse_content(fmt, content)
+        if self._executor is None:
+            return fmt, await asyncio.to_thread(parse_content, fmt, content)
+
+        loop = asyncio.get_running_loop()
+        if fmt in _WHOLE_DOCUMENT_FORMATS:
+            chunks = [content]
+        else:
+            chunks = split_line_chunks(content, self.chunk_chars)
+        results = await asyncio.gather(
+            *(loop.run_in_executor(self._executor, _parse_chunk, fmt, chunk) for chunk in chunks),
+        )
+        records: list[Mapping[str, Any]] = []
+        for part in results:
+            records.extend(part)
+        return fmt, records
+
+    def close(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+
+__all__ = ["ParsePool", "split_line_chunks"]
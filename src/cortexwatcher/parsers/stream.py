@@ -0,0 +1,148 @@
+"""Потокове читання рядків для парсерів.
+
+Парсери ``iter_*`` приймають ``LineSource``: рядок, ``bytes``/``mmap``
+або будь-який ітерований обʼєкт. Елементи-``str`` вважаються вже
+готовими рядками (текстовий файл, список рядків), елементи-``bytes`` —
+довільними шматками потоку (бінарний файл, тіло HTTP-запиту), які
+розрізаються на рядки з інкрементальним декодуванням UTF-8. У памʼяті
+одночасно лежить лише поточний рядок чи шматок.
+"""
+from __future__ import annotations
+
+import codecs
+import mmap
+from collections.abc import AsyncIterable, AsyncIterator, Iterable, Iterator
+from itertools import chain
+
+from cortexwatcher.parsers.detect import DETECT_MAX_LINES, DETECT_PREFIX_CHARS, detect_format
+
+BytesLike = bytes | bytearray | memoryview | mmap.mmap
+LineSource = str | BytesLike | Iterable[str | bytes]
+
+
+def _split_text(text: str) -> Iterator[str]:
+    start = 0
+    length = len(text)
+    while start < length:
+        end = text.find("\n", start)
+        if end == -1:
+            end = length
+        line = text[start:end]
+        start = end + 1
+        if "\r" not in line:
+            yield line
+            continue
+        # "\r\n" і окремий "\r" теж завершують рядок, як у str.splitlines()
+        pieces = line.split("\r")
+        if not pieces[-1]:
+            pieces.pop()
+        yield from pieces
+
+
+def _split_buffer(buffer: BytesLike) -> Iterator[str]:
+    if isinstance(buffer, memoryview):
+        buffer = buffer.tobytes()
+    start = 0
+    length = len(buffer)
+    while start < length:
+        end = buffer.find(b"\n", start)
+        if end == -1:
+            end = length
+        # Зріз mmap/bytes копіює лише цей рядок
+        yield buffer[start:end].decode("utf-8", errors="replace").removesuffix("\r")
+        start = end + 1
+
+
+def _split_chunks(chunks: Iterable[str | bytes]) -> Iterator[str]:
+    decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+    # Частини незавершеного рядка: склеюються лише тоді, коли рядок закінчився
+    parts: list[str] = []
+    for chunk in chunks:
+        if isinstance(chunk, str):
+            if parts:
+                yield "".join(parts)
+                parts = []
+            yield chunk.rstrip("\r\n")
+            continue
+        yield from _feed(decoder.decode(chunk), parts)
+    parts.append(decoder.decode(b"", final=True))
+    tail = "".join(parts)
+    if tail:
+        yield tail
+
+
+def _feed(text: str, parts: list[str]) -> list[str]:
+    """Додає текст до незавершеного рядка; повертає рядки, що завершилися."""
+
+    if "\n" not in text:
+        parts.append(text)
+        return []
+    lines = text.split("\n")
+    parts.append(lines[0])
+    lines[0] = "".join(parts)
+    parts.clear()
+    if lines[-1]:
+        parts.append(lines[-1])
+    return [line.removesuffix("\r") for line in lines[:-1]]
+
+
+def iter_lines(source: LineSource) -> Iterator[str]:
+    """Ліниво розбиває джерело на рядки (без символу переведення рядка)."""
+
+    if isinstance(source, str):
+        return _split_text(source)
+    if isinstance(source, (bytes, bytearray, memoryview, mmap.mmap)):
+        return _split_buffer(source)
+    return _split_chunks(source)
+
+
+def detect_stream(source: LineSource) -> tuple[str, Iterator[str]]:
+    """Визначає формат за префіксом і повертає рядки джерела повністю.
+
+    Прочитані для визначення рядки не губляться: повернутий ітератор
+    починається з них, тож джерело (файл, потік) читається один раз.
+    """
+
+    lines = iter_lines(source)
+    head: list[str] = []
+    size = 0
+    for line in lines:
+        head.append(line)
+        size += len(line)
+        if size >= DETECT_PREFIX_CHARS or len(head) >= DETECT_MAX_LINES:
+            break
+    return detect_format(head), chain(head, lines)
+
+
+async def aiter_line_batches(
+    stream: AsyncIterable[str | bytes],
+    batch_size: int = 1000,
+) -> AsyncIterator[list[str]]:
+    """Пачки рядків з асинхронного потоку шматків (наприклад, ``request.stream()``).
+
+    Кожну пачку можна передати будь-якому ``iter_*``: памʼять обмежена
+    розміром пачки, а не всього тіла.
+    """
+
+    decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+    parts: list[str] = []
+    batch: list[str] = []
+    async for chunk in stream:
+        batch.extend(_feed(chunk if isinstance(chunk, str) else decoder.decode(chunk), parts))
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    parts.append(decoder.decode(b"", final=True))
+    tail = "".join(parts)
+    if tail:
+        batch.append(tail)
+    if batch:
+        yield batch
+
+
+__all__ = [
+    "LineSource",
+    "aiter_line_batches",
+    "detect_stream",
+    "iter_lines",
+]
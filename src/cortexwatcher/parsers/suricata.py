@@ -2,10 +2,12 @@
 from __future__ import annotations
 
 import json
+from collections.abc import Iterator
 from datetime import datetime, timezone
 from typing import Any
 
 from cortexwatcher.parsers.json_lines import coerce_timestamp
+from cortexwatcher.parsers.stream import LineSource, iter_lines
 
 
 def _build_message(event: dict[str, Any]) -> str:
@@ -29,11 +31,16 @@ def _build_message(event: dict[str, Any]) -> str:
     return event.get("message") or ""
 
 
-def parse_suricata(content: str) -> list[dict[str, Any]]:
+def parse_suricata(content: LineSource) -> list[dict[str, Any]]:
     """Парсить NDJSON із Suricata, повертаючи нормалізовані події."""
 
-    events: list[dict[str, Any]] = []
-    for line in content.splitlines():
+    return list(iter_suricata(content))
+
+
+def iter_suricata(content: LineSource) -> Iterator[dict[str, Any]]:
+    """Ліниво парсить EVE JSON з рядка, файлу чи потоку шматків."""
+
+    for line in iter_lines(content):
         line = line.strip()
         if not line:
             continue
@@ -64,8 +71,7 @@ def parse_suricata(content: str) -> list[dict[str, Any]]:
             event_record.setdefault("src_ip", payload["src_ip"])
         if "dest_ip" in payload:
             event_record.setdefault("dest_ip", payload["dest_ip"])
-        events.append(event_record)
-    return events
+        yield event_record
 
 
-__all__ = ["parse_suricata"]
+__all__ = ["iter_suricata", "parse_suricata"]
@@ -2,10 +2,12 @@
 from __future__ import annotations
 
 import re
-from datetime import datetime, timezone
-from typing import Iterable, List, TypedDict
+from collections.abc import Iterator
+from datetime import UTC, datetime
+from typing import TypedDict
 
-from dateutil import parser as date_parser
+from cortexwatcher.parsers.stream import LineSource, iter_lines
+from cortexwatcher.parsers.timestamps import parse_rfc3164, parse_timestamp_text
 
 
 class SyslogRecord(TypedDict, total=False):
@@ -36,21 +38,18 @@ SEVERITY_MAP = {
 }
 
 
-def _ensure_utc(ts: datetime) -> datetime:
-    if ts.tzinfo is None:
-        return ts.replace(tzinfo=timezone.utc)
-    return ts.astimezone(timezone.utc)
+def parse_syslog(lines: LineSource) -> list[SyslogRecord]:
+    """Парсить syslog у список словників."""
 
+    return list(iter_syslog(lines))
 
-def parse_syslog(lines: str | Iterable[str]) -> List[SyslogRecord]:
-    """Парсить syslog у список словників."""
 
-    if isinstance(lines, str):
-        items = lines.splitlines()
-    else:
-        items = list(lines)
-    records: List[SyslogRecord] = []
-    for raw in items:
+def iter_syslog(lines: LineSource) -> Iterator[SyslogRecord]:
+    """Ліниво парсить syslog з рядка, файлу чи потоку шматків."""
+
+    # Рік для міток RFC3164 визначається один раз на виклик, а не для кожного рядка
+    year = datetime.now(UTC).year
+    for raw in iter_lines(lines):
         raw = raw.strip()
         if not raw:
             continue
@@ -58,7 +57,7 @@ def parse_syslog(lines: str | Iterable[str]) -> List[SyslogRecord]:
         if match:
             pri = match.group("pri")
             severity = SEVERITY_MAP.get(int(pri) % 8) if pri else None
-            ts = _ensure_utc(date_parser.parse(match.group("ts")))
+            ts = parse_timestamp_text(match.group("ts")) or datetime.now(UTC)
             record: SyslogRecord = {
                 "timestamp": ts,
                 "host": match.group("host"),
@@ -67,15 +66,13 @@ def parse_syslog(lines: str | Iterable[str]) -> List[SyslogRecord]:
                 "severity": severity,
                 "message": match.group("msg"),
             }
-            records.append(record)
+            yield record
             continue
         match = RFC3164_REGEX.match(raw)
         if match:
             pri = match.group("pri")
             severity = SEVERITY_MAP.get(int(pri) % 8) if pri else None
-            now = datetime.now(timezone.utc)
-            ts = date_parser.parse(match.group("ts"), default=now)
-            ts = _ensure_utc(ts).replace(year=now.year)
+            ts = parse_rfc3164(match.group("ts"), year) or datetime.now(UTC)
             record = {
                 "timestamp": ts,
                 "host": match.group("host"),
@@ -84,8 +81,7 @@ def parse_syslog(lines: str | Iterable[str]) -> List[SyslogRecord]:
                 "severity": severity,
                 "message": match.group("msg"),
             }
-            records.append(record)
-    return records
+            yield record
 
 
-__all__ = ["parse_syslog", "SyslogRecord"]
+__all__ = ["iter_syslog", "parse_syslog", "SyslogRecord"]
@@ -0,0 +1,166 @@
+"""Розбір часових міток з швидким шляхом для типових форматів.
+
+Спершу пробується ``datetime.fromisoformat`` (ISO 8601, RFC3339 і RFC5424,
+зокрема ``Z``, зсув без двокрапки та дріб будь-якої довжини), далі —
+скомпільовані регулярки фіксованих форматів: RFC3164 (``Mmm dd hh:mm:ss``),
+Apache/nginx CLF, RFC 2822 та Unix-час рядком. ``dateutil`` лишається
+запасним варіантом для рідкісних форматів.
+
+Мітки RFC3164 не мають року й мають секундну точність, тож у пачці логів
+одна мітка повторюється десятки разів; їхній розбір кешується в LRU на
+``RFC3164_CACHE_SIZE`` значень разом із роком.
+"""
+from __future__ import annotations
+
+import re
+from collections.abc import Callable
+from datetime import UTC, datetime, timedelta, timezone
+from email.utils import parsedate_to_datetime
+from functools import lru_cache
+
+from dateutil import parser as date_parser
+
+RFC3164_CACHE_SIZE = 4096
+
+MONTHS = {
+    name: index
+    for index, name in enumerate(
+        ("Jan", "Feb", "Mar", "Apr", "May", "Jun", "Jul", "Aug", "Sep", "Oct", "Nov", "Dec"),
+        start=1,
+    )
+}
+
+_RFC3164 = re.compile(r"^([A-Z][a-z]{2}) +(\d{1,2}) (\d{2}):(\d{2}):(\d{2})$")
+_CLF = re.compile(
+    r"^(\d{1,2})/([A-Z][a-z]{2})/(\d{4}):(\d{2}):(\d{2}):(\d{2}) ([+-])(\d{2})(\d{2})$",
+)
+_RFC2822 = re.compile(r"^(?:[A-Z][a-z]{2}, )?\d{1,2} [A-Z][a-z]{2} \d{4} \d{2}:\d{2}")
+_EPOCH = re.compile(r"^\d{9,10}(?:\.\d+)?$")
+
+
+def ensure_utc(ts: datetime) -> datetime:
+    """Наївний час вважається UTC, решта переводиться в UTC."""
+
+    if ts.tzinfo is None:
+        return ts.replace(tzinfo=UTC)
+    return ts.astimezone(UTC)
+
+
+@lru_cache(maxsize=RFC3164_CACHE_SIZE)
+def parse_rfc3164(text: str, year: int) -> datetime | None:
+    """``Mmm dd hh:mm:ss`` у заданому році (UTC); None, якщо мітка некоректна."""
+
+    match = _RFC3164.match(text)
+    if match is None:
+        return None
+    month = MONTHS.get(match.group(1))
+    if month is None:
+        return None
+    try:
+        return datetime(
+            year,
+            month,
+            int(match.group(2)),
+            int(match.group(3)),
+            int(match.group(4)),
+            int(match.group(5)),
+            tzinfo=UTC,
+        )
+    except ValueError:
+        return None
+
+
+def _parse_clf(text: str) -> datetime | None:
+    match = _CLF.match(text)
+    if match is None or match.group(2) not in MONTHS:
+        return None
+    day, month_name, year, hour, minute, second, sign, off_hours, off_minutes = match.groups()
+    offset = timedelta(hours=int(off_hours), minutes=int(off_minutes))
+    try:
+        ts = datetime(
+            int(year),
+            MONTHS[month_name],
+            int(day),
+            int(hour),
+            int(minute),
+            int(second),
+            tzinfo=timezone(-offset if sign == "-" else offset),
+        )
+    except ValueError:
+        return None
+    return ts.astimezone(UTC)
+
+
+def _parse_rfc2822(text: str) -> datetime | None:
+    if _RFC2822.match(text) is None:
+        return None
+    try:
+        return ensure_utc(parsedate_to_datetime(text))
+    except (TypeError, ValueError):
+        return None
+
+
+def _parse_epoch(text: str) -> datetime | None:
+    if _EPOCH.match(text) is None:
+        return None
+    return datetime.fromtimestamp(float(text), tz=UTC)
+
+
+def _parse_rfc3164_now(text: str) -> datetime | None:
+    if _RFC3164.match(text) is None:
+        return None
+    return parse_rfc3164(text, datetime.now(UTC).year)
+
+
+_FIXED_FORMATS: tuple[Callable[[str], datetime | None], ...] = (
+    _parse_rfc3164_now,
+    _parse_clf,
+    _parse_rfc2822,
+    _parse_epoch,
+)
+
+
+def parse_timestamp_text(text: str) -> datetime | None:
+    """Розбирає рядок мітки часу в UTC; None, якщо не вдалося жодним способом."""
+
+    text = text.strip()
+    if not text:
+        return None
+    try:
+        return ensure_utc(datetime.fromisoformat(text))
+    except ValueError:
+        pass
+    for parse in _FIXED_FORMATS:
+        parsed = parse(text)
+        if parsed is not None:
+            return parsed
+    try:
+        return ensure_utc(date_parser.parse(text))
+    except (ValueError, TypeError, OverflowError):
+        return None
+
+
+def parse_timestamp(value: object) -> datetime | None:
+    """Мітка часу з рядка, Unix-часу (секунди) або ``datetime``."""
+
+    if value is None or isinstance(value, bool):
+        return None
+    if isinstance(value, str):
+        return parse_timestamp_text(value)
+    if isinstance(value, datetime):
+        return ensure_utc(value)
+    if isinstance(value, (int, float)):
+        try:
+            return datetime.fromtimestamp(float(value), tz=UTC)
+        except (OverflowError, OSError, ValueError):
+            return None
+    return None
+
+
+__all__ = [
+    "RFC3164_CACHE_SIZE",
+    "ensure_utc",
+    "parse_rfc3164",
+    "parse_timestamp",
+    "parse_timestamp_text",
+]
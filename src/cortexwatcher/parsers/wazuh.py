@@ -2,8 +2,12 @@
 from __future__ import annotations
 
 import json
-from datetime import datetime, timezone
-from typing import Dict, List, TypedDict
+from collections.abc import Iterator
+from datetime import datetime
+from typing import TypedDict
+
+from cortexwatcher.parsers.stream import LineSource, iter_lines
+from cortexwatcher.parsers.timestamps import parse_timestamp
 
 
 class WazuhRecord(TypedDict, total=False):
@@ -16,48 +20,54 @@ class WazuhRecord(TypedDict, total=False):
     full: dict
 
 
-def parse_wazuh_alert(payload: str | Dict[str, object]) -> List[WazuhRecord]:
+def parse_wazuh_alert(payload: LineSource | dict[str, object]) -> list[WazuhRecord]:
     """Парсить alert від Wazuh."""
 
+    if isinstance(payload, dict):
+        return list(_convert_document(payload))
+    return list(iter_wazuh_alerts(payload))
+
+
+def iter_wazuh_alerts(payload: LineSource) -> Iterator[WazuhRecord]:
+    """Ліниво парсить алерти Wazuh: один JSON-документ або ``alerts.json`` по рядку.
+
+    Рядок спершу розбирається як цілий документ; якщо це не вдалося, він,
+    як і файли та потоки, читається построково.
+    """
+
     if isinstance(payload, str):
         try:
             data = json.loads(payload)
         except json.JSONDecodeError:
-            return []
-    else:
-        data = payload
-
-    if isinstance(data, dict):
-        return [_convert(data)]
-    if isinstance(data, list):
-        return [_convert(item) for item in data if isinstance(item, dict)]
-    return []
+            pass
+        else:
+            yield from _convert_document(data)
+            return
+    for raw in iter_lines(payload):
+        line = raw.strip()
+        if not line:
+            continue
+        try:
+            data = json.loads(line)
+        except json.JSONDecodeError:
+            continue
+        yield from _convert_document(data)
 
 
-def _ensure_utc(ts: datetime) -> datetime:
-    if ts.tzinfo is None:
-        return ts.replace(tzinfo=timezone.utc)
-    return ts.astimezone(timezone.utc)
+def _convert_document(data: object) -> Iterator[WazuhRecord]:
+    if isinstance(data, dict):
+        yield _convert(data)
+    elif isinstance(data, list):
+        for item in data:
+            if isinstance(item, dict):
+                yield _convert(item)
 
 
-def _convert(entry: Dict[str, object]) -> WazuhRecord:
+def _convert(entry: dict[str, object]) -> WazuhRecord:
     rule = entry.get("rule") if isinstance(entry.get("rule"), dict) else {}
     agent = entry.get("agent") if isinstance(entry.get("agent"), dict) else {}
     timestamp_raw = entry.get("timestamp")
-    ts: datetime | None
-    if isinstance(timestamp_raw, str):
-        try:
-            from dateutil import parser as date_parser
-
-            ts = date_parser.parse(timestamp_raw)
-        except (ValueError, TypeError):
-            ts = None
-        else:
-            ts = _ensure_utc(ts)
-    elif isinstance(timestamp_raw, datetime):
-        ts = _ensure_utc(timestamp_raw)
-    else:
-        ts = None
+    ts = parse_timestamp(timestamp_raw)
     record: WazuhRecord = {
         "rule_id": str(rule.get("id")) if rule else None,
         "level": int(rule.get("level")) if rule and rule.get("level") is not None else None,
@@ -70,4 +80,4 @@ def _convert(entry: Dict[str, object]) -> WazuhRecord:
     return record
 
 
-__all__ = ["parse_wazuh_alert", "WazuhRecord"]
+__all__ = ["iter_wazuh_alerts", "parse_wazuh_alert", "WazuhRecord"]
@@ -2,11 +2,15 @@
 from __future__ import annotations
 
 from abc import ABC, abstractmethod
+from collections.abc import AsyncIterator, Iterable, Mapping, Sequence
 from datetime import datetime
-from typing import Iterable, Sequence
+from typing import TYPE_CHECKING
 
 from cortexwatcher.db.models import Alert, Anomaly, LogNormalized, LogRaw
 
+if TYPE_CHECKING:
+    from cortexwatcher.analyzer.rules_engine import RulePrefilter
+
 
 class LogStorage(ABC):
     """Абстрактний клас для різних реалізацій сховищ."""
@@ -32,10 +36,40 @@ class LogStorage(ABC):
     ) -> list[LogNormalized]:
         """Повертає список логів із фільтрами."""
 
+    @abstractmethod
+    def iter_logs(
+        self,
+        start: datetime,
+        end: datetime,
+        batch_size: int = 1000,
+        prefilter: RulePrefilter | None = None,
+    ) -> AsyncIterator[LogNormalized]:
+        """Потоково віддає логи з ``[start, end)`` за зростанням часу.
+
+        На відміну від ``list_logs`` не обмежується ``limit`` і не тримає всю
+        вибірку в памʼяті; потрібне для ретроспективного прогону правил.
+        З ``prefilter`` повертаються лише логи, що можуть спрацювати на
+        правила (``RulePrefilter.admits``).
+        """
+
     @abstractmethod
     async def store_alert(self, alert: Alert) -> Alert:
         """Зберігає алерт та повертає його з id."""
 
+    async def store_alerts_batch(self, alerts: Sequence[Alert]) -> list[Alert]:
+        """Зберігає пакет алертів; типово — по одному через ``store_alert``."""
+
+        return [await self.store_alert(alert) for alert in alerts]
+
+    async def add_alert_occurrences(self, counts: Mapping[int, tuple[int, datetime]]) -> None:
+        """Додає повтори до відкритих алертів: ``id -> (кількість, час останнього)``.
+
+        Типово нічого не робить — сховища без оновлення записів зберігають
+        лише перший алерт інциденту.
+        """
+
+        return
+
     @abstractmethod
     async def list_alerts(self, limit: int = 100) -> list[Alert]:
         """Повертає останні алерти."""
@@ -44,6 +78,11 @@ class LogStorage(ABC):
     async def store_anomaly(self, anomaly: Anomaly) -> Anomaly:
         """Зберігає аномалію."""
 
+    async def store_anomalies_batch(self, anomalies: Sequence[Anomaly]) -> list[Anomaly]:
+        """Зберігає пакет аномалій; типово — по одній через ``store_anomaly``."""
+
+        return [await self.store_anomaly(anomaly) for anomaly in anomalies]
+
     @abstractmethod
     async def list_anomalies(self, limit: int = 100) -> list[Anomaly]:
         """Повертає останні аномалії."""
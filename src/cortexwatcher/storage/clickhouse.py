@@ -1,12 +1,16 @@
 """Легка реалізація для ClickHouse (in-memory заглушка)."""
 from __future__ import annotations
 
+from collections.abc import AsyncIterator, Iterable, Mapping, Sequence
 from datetime import datetime
-from typing import Iterable, Sequence
+from typing import TYPE_CHECKING
 
 from cortexwatcher.db.models import Alert, Anomaly, LogNormalized, LogRaw
 from cortexwatcher.storage.base import LogStorage
 
+if TYPE_CHECKING:
+    from cortexwatcher.analyzer.rules_engine import RulePrefilter
+
 
 class ClickHouseStorage(LogStorage):
     """Проста in-memory реалізація, що імітує ClickHouse."""
@@ -53,11 +57,31 @@ class ClickHouseStorage(LogStorage):
             result = [item for item in result if text.lower() in item.msg.lower()]
         return list(sorted(result, key=lambda x: x.ts, reverse=True))[:limit]
 
+    async def iter_logs(
+        self,
+        start: datetime,
+        end: datetime,
+        batch_size: int = 1000,
+        prefilter: RulePrefilter | None = None,
+    ) -> AsyncIterator[LogNormalized]:
+        for item in sorted(self._normalized, key=lambda x: x.ts):
+            if not start <= item.ts < end:
+                continue
+            if prefilter is None or prefilter.admits(item.app, item.host):
+                yield item
+
     async def store_alert(self, alert: Alert) -> Alert:
         alert.id = len(self._alerts) + 1  # type: ignore[assignment]
         self._alerts.append(alert)
         return alert
 
+    async def add_alert_occurrences(self, counts: Mapping[int, tuple[int, datetime]]) -> None:
+        for alert in self._alerts:
+            if alert.id in counts:
+                count, last_seen = counts[alert.id]
+                alert.occurrences = (alert.occurrences or 1) + count
+                alert.last_seen_at = max(alert.last_seen_at or last_seen, last_seen)
+
     async def list_alerts(self, limit: int = 100) -> list[Alert]:
         return list(self._alerts)[-limit:][::-1]
 
@@ -1,16 +1,32 @@
 """Реалізація сховища на PostgreSQL."""
 from __future__ import annotations
 
+from collections.abc import AsyncIterator, Iterable, Mapping, Sequence
 from datetime import datetime
-from typing import Iterable, Sequence
-
-from sqlalchemy import Select, select
+from typing import TYPE_CHECKING, Any, cast
+
+from sqlalchemy import (
+    BindParameter,
+    Select,
+    Table,
+    bindparam,
+    case,
+    false,
+    insert,
+    or_,
+    select,
+    update,
+)
 from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.sql.schema import CallableColumnDefault, ScalarElementColumnDefault
 
 from cortexwatcher.db import async_session_maker
 from cortexwatcher.db.models import Alert, Anomaly, LogNormalized, LogRaw
 from cortexwatcher.storage.base import LogStorage
 
+if TYPE_CHECKING:
+    from cortexwatcher.analyzer.rules_engine import RulePrefilter
+
 
 class PostgresStorage(LogStorage):
     """Збереження логів у PostgreSQL."""
@@ -18,6 +34,33 @@ class PostgresStorage(LogStorage):
     def _session(self) -> AsyncSession:
         return async_session_maker()
 
+    async def _insert_returning_ids(self, table: Table, records: Sequence[Any]) -> None:
+        """Один багаторядковий ``INSERT ... RETURNING id`` замість add/flush/refresh на запис."""
+
+        if not records:
+            return
+        columns = [column.key for column in table.columns if column.key != "id"]
+        rows: list[dict[str, Any]] = []
+        for record in records:
+            row: dict[str, Any] = {}
+            for key in columns:
+                value = getattr(record, key)
+                default = table.c[key].default
+                if value is None and isinstance(default, CallableColumnDefault):
+                    value = default.arg(None)  # type: ignore[arg-type]  # контекст обгортці не потрібен
+                elif value is None and isinstance(default, ScalarElementColumnDefault):
+                    value = default.arg
+                setattr(record, key, value)
+                row[key] = value
+            rows.append(row)
+        stmt = insert(table).returning(table.c.id, sort_by_parameter_order=True)
+        async with self._session() as session:
+            result = await session.execute(stmt, rows)
+            ids = [row_id for (row_id,) in result]
+            await session.commit()
+        for record, row_id in zip(records, ids, strict=True):
+            record.id = row_id
+
     async def store_raw_batch(self, records: Sequence[LogRaw]) -> None:
         async with self._session() as session:
             session.add_all(records)
@@ -56,6 +99,28 @@ class PostgresStorage(LogStorage):
             result = await session.execute(stmt)
             return list(result.scalars().all())
 
+    async def iter_logs(
+        self,
+        start: datetime,
+        end: datetime,
+        batch_size: int = 1000,
+        prefilter: RulePrefilter | None = None,
+    ) -> AsyncIterator[LogNormalized]:
+        """Серверний курсор: рядки підтягуються пакетами по ``batch_size``."""
+
+        stmt = (
+            select(LogNormalized)
+            .where(LogNormalized.ts >= start, LogNormalized.ts < end)
+            .order_by(LogNormalized.ts, LogNormalized.id)
+            .execution_options(yield_per=batch_size)
+        )
+        if prefilter is not None and not prefilter.wildcard:
+            stmt = stmt.where(_prefilter_clause(prefilter))
+        async with self._session() as session:
+            result = await session.stream_scalars(stmt)
+            async for log in result:
+                yield log
+
     async def store_alert(self, alert: Alert) -> Alert:
         async with self._session() as session:
             session.add(alert)
@@ -64,6 +129,35 @@ class PostgresStorage(LogStorage):
             await session.refresh(alert)
             return alert
 
+    async def store_alerts_batch(self, alerts: Sequence[Alert]) -> list[Alert]:
+        await self._insert_returning_ids(cast(Table, Alert.__table__), alerts)
+        return list(alerts)
+
+    async def add_alert_occurrences(self, counts: Mapping[int, tuple[int, datetime]]) -> None:
+        if not counts:
+            return
+        table = cast(Table, Alert.__table__)
+        last_seen: BindParameter[datetime] = bindparam("last_seen")
+        # Один executemany на всі відкриті інциденти замість UPDATE на кожен повтор
+        stmt = (
+            update(table)
+            .where(table.c.id == bindparam("alert_id"))
+            .values(
+                occurrences=table.c.occurrences + bindparam("count"),
+                last_seen_at=case(
+                    (table.c.last_seen_at > last_seen, table.c.last_seen_at),
+                    else_=last_seen,
+                ),
+            )
+        )
+        params = [
+            {"alert_id": alert_id, "count": count, "last_seen": seen}
+            for alert_id, (count, seen) in counts.items()
+        ]
+        async with self._session() as session:
+            await session.execute(stmt, params)
+            await session.commit()
+
     async def list_alerts(self, limit: int = 100) -> list[Alert]:
         stmt: Select[tuple[Alert]] = select(Alert).order_by(Alert.created_at.desc()).limit(limit)
         async with self._session() as session:
@@ -78,6 +172,10 @@ class PostgresStorage(LogStorage):
             await session.refresh(anomaly)
             return anomaly
 
+    async def store_anomalies_batch(self, anomalies: Sequence[Anomaly]) -> list[Anomaly]:
+        await self._insert_returning_ids(cast(Table, Anomaly.__table__), anomalies)
+        return list(anomalies)
+
     async def list_anomalies(self, limit: int = 100) -> list[Anomaly]:
         stmt: Select[tuple[Anomaly]] = select(Anomaly).order_by(Anomaly.created_at.desc()).limit(limit)
         async with self._session() as session:
@@ -95,4 +193,13 @@ class PostgresStorage(LogStorage):
             await session.commit()
 
 
+def _prefilter_clause(prefilter: RulePrefilter) -> Any:
+    conditions = []
+    if prefilter.apps:
+        conditions.append(LogNormalized.app.in_(sorted(prefilter.apps)))
+    if prefilter.hosts:
+        conditions.append(LogNormalized.host.in_(sorted(prefilter.hosts)))
+    return or_(*conditions) if conditions else false()
+
+
 __all__ = ["PostgresStorage"]
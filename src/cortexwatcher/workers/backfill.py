@@ -0,0 +1,418 @@
+"""Ретроспективний прогін правил і детектора по збережених логах (backfill).
+
+Запуск: ``cortexwatcher-backfill --start 2026-10-12 --end 2026-10-19 --rules rules/new.yaml``.
+Діапазон ділиться на шматки по ``--chunk-minutes``; кожен шматок окремий
+процес читає серверним курсором із ``logs_normalized``, проганяє через
+скомпільовані правила та детектор аномалій і пакетно зберігає результат.
+Алерти мають тег ``backfill`` та ідентифікатор прогону в ``evidence_json``,
+а ``created_at`` — час логу, що спрацював. Сповіщення не надсилаються.
+З ``--rules-only`` детектор не запускається, а з бази читаються лише логи,
+чиї ``app``/``host`` потрапляють під точні фільтри правил (``RulePrefilter``).
+
+Готові шматки записуються у файл стану, тож перерваний прогін із тими самими
+параметрами та тим самим файлом правил продовжується з місця зупинки.
+Шматок, перерваний посередині, проганяється знову цілком, тож частина його
+алертів може задублюватися — їх видно за ``run_id`` у ``evidence_json``.
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import hashlib
+import json
+import multiprocessing
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from dataclasses import asdict, dataclass
+from datetime import UTC, datetime, timedelta
+from pathlib import Path
+from time import perf_counter
+from typing import Any
+
+from cortexwatcher.analyzer import RuleEngine
+from cortexwatcher.analyzer.inline import (
+    AnalysisOutputs,
+    build_detector,
+    build_indicators,
+    rule_record,
+)
+from cortexwatcher.config import get_settings
+from cortexwatcher.db import session as db_session
+from cortexwatcher.db.models import Alert, Anomaly
+from cortexwatcher.storage import get_storage
+from cortexwatcher.storage.base import LogStorage
+from cortexwatcher.workers.tasks import ensure_utc
+
+BACKFILL_TAG = "backfill"
+
+
+@dataclass(frozen=True)
+class Chunk:
+    """Напіввідкритий інтервал ``[start, end)``."""
+
+    start: datetime
+    end: datetime
+
+    @property
+    def key(self) -> str:
+        return self.start.isoformat()
+
+
+@dataclass
+class ChunkResult:
+    key: str
+    logs: int = 0
+    alerts: int = 0
+    anomalies: int = 0
+    seconds: float = 0.0
+
+
+def plan_chunks(start: datetime, end: datetime, minutes: int) -> list[Chunk]:
+    """Ділить ``[start, end)`` на шматки по ``minutes`` хвилин (останній може бути коротшим)."""
+
+    if minutes <= 0:
+        raise ValueError("Розмір шматка має бути додатним")
+    step = timedelta(minutes=minutes)
+    chunks = []
+    cursor = start
+    while cursor < end:
+        chunks.append(Chunk(cursor, min(cursor + step, end)))
+        cursor += step
+    return chunks
+
+
+def run_id_for(
+    start: datetime,
+    end: datetime,
+    chunk_minutes: int,
+    rules_path: str | Path,
+    rules_only: bool = False,
+) -> str:
+    """Ідентифікатор прогону: залежить від діапазону, розміру шматка, режиму й вмісту правил."""
+
+    digest = hashlib.sha256(Path(rules_path).read_bytes())
+    digest.update(f"{start.isoformat()}|{end.isoformat()}|{chunk_minutes}|{int(rules_only)}".encode())
+    return digest.hexdigest()[:12]
+
+
+class BackfillState:
+    """Файл стану з результатами завершених шматків одного прогону.
+
+    Якщо у файлі інший ``run_id`` (змінилися правила чи параметри), він
+    ігнорується і прогін починається спочатку.
+    """
+
+    def __init__(self, path: str | Path, run_id: str) -> None:
+        self.path = Path(path)
+        self.run_id = run_id
+        self.done: dict[str, ChunkResult] = {}
+        self._load()
+
+    def _load(self) -> None:
+        try:
+            payload = json.loads(self.path.read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            return
+        if payload.get("run_id") != self.run_id:
+            return
+        for item in payload.get("done", []):
+            result = ChunkResult(**item)
+            self.done[result.key] = result
+
+    def mark(self, result: ChunkResult) -> None:
+        self.done[result.key] = result
+        self.save()
+
+    def save(self) -> None:
+        payload = {"run_id": self.run_id, "done": [asdict(item) for item in self.done.values()]}
+        tmp = self.path.with_suffix(self.path.suffix + ".tmp")
+        tmp.write_text(json.dumps(payload, ensure_ascii=False), encoding="utf-8")
+        os.replace(tmp, self.path)
+
+
+async def process_chunk(  # noqa: PLR0913 - параметри прогону з командного рядка
+    chunk: Chunk,
+    rules_path: str | Path,
+    run_id: str,
+    *,
+    storage: LogStorage | None = None,
+    batch_size: int = 1000,
+    dry_run: bool = False,
+    rules_only: bool = False,
+) -> ChunkResult:
+    """Проганяє правила й детектор по одному шматку.
+
+    Рушій і детектор створюються заново й розігріваються логами за
+    ``ANOMALY_WINDOW_MIN`` хвилин до початку шматка: пороги, послідовності
+    й базова лінія детектора бачать попередню історію, але алерти та
+    аномалії з розігріву відкидаються (їх зберігає попередній шматок).
+    """
+
+    settings = get_settings()
+    storage = storage or get_storage()
+    engine = RuleEngine(
+        rules_path,
+        max_groups=settings.rule_state_max_groups,
+        match_cache_size=settings.rule_match_cache_size,
+        indicators=build_indicators(),
+    )
+    detector = None if rules_only else build_detector()
+    # Без детектора решта логів нікому не потрібна — відсіюємо їх ще в запиті
+    prefilter = engine.prefilter if rules_only else None
+    result = ChunkResult(key=chunk.key)
+    outputs = AnalysisOutputs()
+    started = perf_counter()
+
+    async def flush() -> None:
+        result.alerts += len(outputs.alerts)
+        result.anomalies += len(outputs.anomalies)
+        if not dry_run:
+            if outputs.alerts:
+                await storage.store_alerts_batch(outputs.alerts)
+            if outputs.anomalies:
+                await storage.store_anomalies_batch(outputs.anomalies)
+        outputs.alerts = []
+        outputs.anomalies = []
+
+    warmup_start = chunk.start - timedelta(minutes=settings.anomaly_window_min)
+    async for log in storage.iter_logs(warmup_start, chunk.end, batch_size, prefilter=prefilter):
+        ts = ensure_utc(log.ts) or chunk.start
+        live = ts >= chunk.start
+        matches = engine.match(rule_record(log))
+        anomaly, score = (False, 0.0)
+        if detector is not None:
+            anomaly, score = detector.update(log.host, log.app, log.severity, ts)
+        if not live:
+            continue
+        result.logs += 1
+        for rule in matches:
+            if rule.severity < settings.alert_min_level:
+                continue
+            outputs.alerts.append(
+                Alert(
+                    created_at=ts,
+                    rule_id=rule.id,
+                    level=rule.severity,
+                    title=rule.title,
+                    description=rule.description,
+                    tags=[*rule.tags, BACKFILL_TAG],
+                    evidence_json={"log_id": log.id, "msg": log.msg, BACKFILL_TAG: run_id},
+                    correlation_key=log.correlation_key,
+                ),
+            )
+        if anomaly:
+            outputs.anomalies.append(
+                Anomaly(
+                    created_at=ts,
+                    signal=f"{log.host}|{log.app}|{log.severity}",
+                    score=score,
+                    window=settings.anomaly_window_min,
+                    details_json={"log_id": log.id, BACKFILL_TAG: run_id},
+                ),
+            )
+        if len(outputs.alerts) >= batch_size or len(outputs.anomalies) >= batch_size:
+            await flush()
+
+    # Пакетний бекенд детектора оцінює хвилини при закритті
+    hits = detector.tick(chunk.end) if detector is not None else []
+    for hit in hits:
+        minute = ensure_utc(hit.timestamp)
+        if minute is None or minute < chunk.start:
+            continue
+        outputs.anomalies.append(
+            Anomaly(
+                created_at=hit.timestamp,
+                signal=hit.signal,
+                score=hit.score,
+                window=settings.anomaly_window_min,
+                details_json={
+                    "minute": hit.timestamp.isoformat(),
+                    "count": hit.value,
+                    BACKFILL_TAG: run_id,
+                },
+            ),
+        )
+    await flush()
+    result.seconds = perf_counter() - started
+    return result
+
+
+def _run_chunk(  # noqa: PLR0913, PLR0917 - пул процесів передає аргументи позиційно
+    chunk: Chunk,
+    rules_path: str,
+    run_id: str,
+    batch_size: int,
+    dry_run: bool,
+    rules_only: bool,
+) -> ChunkResult:
+    """Точка входу процесу пулу: окремий event loop на шматок."""
+
+    async def job() -> ChunkResult:
+        try:
+            return await process_chunk(
+                chunk,
+                rules_path,
+                run_id,
+                batch_size=batch_size,
+                dry_run=dry_run,
+                rules_only=rules_only,
+            )
+        finally:
+            # Зʼєднання пулу привʼязані до event loop, який зараз закриється
+            await db_session.engine.dispose()
+
+    return asyncio.run(job())
+
+
+def _format_progress(index: int, total: int, chunk_key: str, result: ChunkResult) -> str:
+    rate = result.logs / result.seconds if result.seconds > 0 else 0.0
+    return (
+        f"[{index}/{total}] {chunk_key}: логів {result.logs}, алертів {result.alerts}, "
+        f"аномалій {result.anomalies}, {rate:.0f} логів/с"
+    )
+
+
+def run_backfill(  # noqa: PLR0913 - параметри прогону з командного рядка
+    start: datetime,
+    end: datetime,
+    rules_path: str | Path,
+    *,
+    chunk_minutes: int = 60,
+    workers: int = 1,
+    state_path: str | Path | None = None,
+    batch_size: int = 1000,
+    dry_run: bool = False,
+    rules_only: bool = False,
+    out: Any = sys.stderr,
+) -> dict[str, Any]:
+    """Проганяє всі незавершені шматки й повертає підсумок прогону."""
+
+    chunks = plan_chunks(start, end, chunk_minutes)
+    run_id = run_id_for(start, end, chunk_minutes, rules_path, rules_only)
+    # Пробний прогін нічого не записує, тож і продовжувати його нема з чого
+    state = None if dry_run else BackfillState(state_path or f"backfill-{run_id}.json", run_id)
+    results: dict[str, ChunkResult] = dict(state.done) if state is not None else {}
+    pending = [chunk for chunk in chunks if chunk.key not in results]
+    total = len(chunks)
+    if results:
+        print(
+            f"Продовження прогону {run_id}: готово {len(results)} з {total} шматків",
+            file=out,
+            flush=True,
+        )
+
+    started = perf_counter()
+    processed = 0
+
+    def record(result: ChunkResult) -> None:
+        nonlocal processed
+        processed += result.logs
+        results[result.key] = result
+        if state is not None:
+            state.mark(result)
+        print(_format_progress(len(results), total, result.key, result), file=out, flush=True)
+
+    args = (str(rules_path), run_id, batch_size, dry_run, rules_only)
+    if workers <= 1:
+        for chunk in pending:
+            record(_run_chunk(chunk, *args))
+    else:
+        context = multiprocessing.get_context("spawn")
+        with ProcessPoolExecutor(max_workers=workers, mp_context=context) as pool:
+            futures = [pool.submit(_run_chunk, chunk, *args) for chunk in pending]
+            try:
+                for future in as_completed(futures):
+                    record(future.result())
+            except BaseException:
+                pool.shutdown(wait=False, cancel_futures=True)
+                raise
+
+    elapsed = perf_counter() - started
+    return {
+        "run_id": run_id,
+        "chunks": total,
+        "logs": sum(item.logs for item in results.values()),
+        "alerts": sum(item.alerts for item in results.values()),
+        "anomalies": sum(item.anomalies for item in results.values()),
+        "seconds": round(elapsed, 3),
+        "logs_per_second": round(processed / elapsed, 1) if elapsed > 0 else 0.0,
+    }
+
+
+def _parse_time(value: str) -> datetime:
+    parsed = datetime.fromisoformat(value)
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=UTC)
+    return parsed.astimezone(UTC)
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(
+        prog="cortexwatcher-backfill",
+        description="Прогнати набір правил по збережених логах за період",
+    )
+    parser.add_argument(
+        "--start",
+        required=True,
+        type=_parse_time,
+        help="Початок періоду (ISO 8601, типово UTC)",
+    )
+    parser.add_argument(
+        "--end",
+        required=True,
+        type=_parse_time,
+        help="Кінець періоду, не включно",
+    )
+    parser.add_argument("--rules", default=None, help="Файл правил (типово RULES_PATH)")
+    parser.add_argument("--chunk-minutes", type=int, default=60, help="Розмір шматка, хвилин")
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=os.cpu_count() or 1,
+        help="Кількість процесів",
+    )
+    parser.add_argument(
+        "--batch-size",
+        type=int,
+        default=1000,
+        help="Розмір пакета читання й запису",
+    )
+    parser.add_argument(
+        "--state",
+        default=None,
+        help="Файл стану для продовження (типово backfill-<id>.json)",
+    )
+    parser.add_argument(
+        "--dry-run",
+        action="store_true",
+        help="Лише порахувати спрацювання, нічого не записувати",
+    )
+    parser.add_argument(
+        "--rules-only",
+        action="store_true",
+        help="Без детектора аномалій; читати лише логи, що підходять під фільтри правил",
+    )
+    return parser
+
+
+def main(argv: list[str] | None = None) -> None:
+    args = build_parser().parse_args(argv)
+    if args.end <= args.start:
+        raise SystemExit("--end має бути пізніше за --start")
+    summary = run_backfill(
+        args.start,
+        args.end,
+        args.rules or get_settings().rules_path,
+        chunk_minutes=args.chunk_minutes,
+        workers=args.workers,
+        state_path=args.state,
+        batch_size=args.batch_size,
+        dry_run=args.dry_run,
+        rules_only=args.rules_only,
+    )
+    print(json.dumps(summary, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
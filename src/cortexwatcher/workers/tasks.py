@@ -4,20 +4,56 @@ from __future__ import annotations
 import asyncio
 import json
 import sys
+from collections.abc import Iterable, Sequence
+from dataclasses import dataclass
 from datetime import datetime, timezone
 from statistics import mean
 from time import time
-from typing import Any, Iterable
+from typing import Any
 from uuid import uuid4
 
+from aiogram import Bot
+from aiogram.client.default import DefaultBotProperties
+from aiogram.enums import ParseMode
+from prometheus_client import start_http_server
 from redis import Redis
+from redis.asyncio import Redis as AsyncRedis
 from redis.exceptions import RedisError
-from rq import Queue
+from rq import Queue, SimpleWorker
 
 from cortexwatcher.analyzer import AlertNotifier, AnomalyDetector, RuleEngine, build_correlation_key
+from cortexwatcher.analyzer.anomalies import AnomalyBackend
+from cortexwatcher.analyzer.checkpoint import (
+    AnalyzerCheckpoint,
+    CheckpointStore,
+    FileCheckpointStore,
+    RedisCheckpointStore,
+)
+from cortexwatcher.analyzer.inline import (
+    PROCESSED_LOGS_KEY,
+    AnalysisOutputs,
+    InlineAnalyzer,
+    build_dedup,
+    build_detector,
+    build_engine,
+    build_notifier,
+    build_quantile_tracker,
+    build_traffic_tracker,
+    bump_alert_metrics,
+    collect_closed_anomalies,
+    evaluate_log,
+    flush_quantiles,
+    flush_traffic,
+    inline_analysis_enabled,
+    persist_outputs,
+)
+from cortexwatcher.analyzer.outbox import OutboxSender
+from cortexwatcher.analyzer.reload import RuleReloader, default_replica_id
+from cortexwatcher.analyzer.sketches import QuantileTracker, TrafficTracker
 from cortexwatcher.config import get_settings
-from cortexwatcher.db.models import Alert, Anomaly, LogNormalized, LogRaw
-from cortexwatcher.parsers import detect_format, parse_gelf, parse_json_lines, parse_syslog, parse_wazuh_alert
+from cortexwatcher.db.models import LogNormalized, LogRaw
+from cortexwatcher.logging import logger
+from cortexwatcher.parsers import detect_format, parse_content
 from cortexwatcher.storage import get_storage
 from cortexwatcher.storage.base import LogStorage
 
@@ -26,6 +62,25 @@ redis_conn = Redis.from_url(settings.redis_url)
 queue = Queue("ingest", connection=redis_conn)
 
 
+@dataclass
+class InlineState:
+    """Спільний для процесу стан inline-аналізу; живе між задачами воркера."""
+
+    analyzer: InlineAnalyzer | None = None
+
+
+_inline = InlineState()
+
+
+def get_inline_analyzer() -> InlineAnalyzer:
+    """Inline-аналізатор процесу воркера, створений при першій задачі."""
+
+    if _inline.analyzer is None:
+        _inline.analyzer = InlineAnalyzer(redis_conn)
+        _inline.analyzer.start()
+    return _inline.analyzer
+
+
 def enqueue_ingest(source: str, payload: dict[str, Any], immediate: bool = False) -> Any:
     """Додає задачу у чергу або виконує негайно."""
 
@@ -61,7 +116,7 @@ async def _process_ingest(source: str, payload: dict[str, Any]) -> dict[str, Any
         return {"stored": 0, "format": "unknown"}
 
     fmt = detect_format(content)
-    parsed = _parse(fmt, content)
+    parsed = parse_content(fmt, content)
     received_at = datetime.now(timezone.utc)
     raw = LogRaw(
         source=source,
@@ -73,7 +128,7 @@ async def _process_ingest(source: str, payload: dict[str, Any]) -> dict[str, Any
     normalized = []
     for item in parsed:
         ts_raw = item.get("timestamp")
-        ts = _ensure_utc(ts_raw) if isinstance(ts_raw, datetime) else None
+        ts = ensure_utc(ts_raw) if isinstance(ts_raw, datetime) else None
         normalized.append(
             LogNormalized(
                 raw_id=0,
@@ -88,32 +143,45 @@ async def _process_ingest(source: str, payload: dict[str, Any]) -> dict[str, Any
         )
     await storage.store_raw_batch([raw])
     raw_id = getattr(raw, "id", None)
-    for item in normalized:
-        item.raw_id = raw_id or 0
+    for log in normalized:
+        log.raw_id = raw_id or 0
     await storage.store_normalized_batch(normalized)
     _bump_metrics(len(normalized), _calculate_latencies(normalized, received_at))
+    if normalized and inline_analysis_enabled(source):
+        await get_inline_analyzer().analyze(storage, normalized)
     return {"stored": len(normalized), "format": fmt}
 
 
+def build_checkpoint(detector: AnomalyBackend, engine: RuleEngine) -> AnalyzerCheckpoint | None:
+    """Знімки стану аналізатора: у файл, якщо заданий шлях, інакше в Redis."""
+
+    if settings.analyzer_checkpoint_interval <= 0:
+        return None
+    if not isinstance(detector, AnomalyDetector):
+        logger.warning(
+            "Знімки стану підтримує лише бекенд детектора python",
+            backend=settings.anomaly_backend,
+        )
+        return None
+    store: CheckpointStore
+    if settings.analyzer_checkpoint_path:
+        store = FileCheckpointStore(settings.analyzer_checkpoint_path)
+    else:
+        store = RedisCheckpointStore(redis_conn)
+    return AnalyzerCheckpoint(
+        detector, engine, store, interval=settings.analyzer_checkpoint_interval,
+    )
+
+
 def _hash(content: str) -> str:
     import hashlib
 
     return hashlib.sha256(content.encode()).hexdigest()
 
 
-def _parse(fmt: str, content: str) -> list[dict[str, Any]]:
-    if fmt == "syslog":
-        return parse_syslog(content)
-    if fmt == "json_lines":
-        return parse_json_lines(content)
-    if fmt == "gelf":
-        return parse_gelf(content)
-    if fmt == "wazuh":
-        return parse_wazuh_alert(content)
-    return []
-
+def ensure_utc(dt: datetime | None) -> datetime | None:
+    """Приводить час до UTC; наївний час вважається вже записаним в UTC."""
 
-def _ensure_utc(dt: datetime | None) -> datetime | None:
     if dt is None:
         return None
     if dt.tzinfo is None:
@@ -123,14 +191,14 @@ def _ensure_utc(dt: datetime | None) -> datetime | None:
 
 def _calculate_latencies(logs: Iterable[LogNormalized], received_at: datetime) -> list[float]:
     latencies: list[float] = []
-    reference = _ensure_utc(received_at)
+    reference = ensure_utc(received_at)
     if reference is None:
         return latencies
     for log in logs:
         ts = getattr(log, "ts", None)
         if not isinstance(ts, datetime):
             continue
-        normalized_ts = _ensure_utc(ts)
+        normalized_ts = ensure_utc(ts)
         if normalized_ts is None:
             continue
         latency_ms = (reference - normalized_ts).total_seconds() * 1000
@@ -169,20 +237,8 @@ def _bump_metrics(count: int, latencies: Iterable[float]) -> None:
         pass
 
 
-def _bump_alert_metrics() -> None:
-    now_iso = datetime.now(timezone.utc).isoformat()
-    timestamp = time()
-    member_id = f"{int(timestamp * 1000)}:1:{uuid4().hex}"
-    try:
-        pipe = redis_conn.pipeline()
-        pipe.hincrby("cortexwatcher:metrics", "alerts_total", 1)
-        pipe.hset("cortexwatcher:metrics", mapping={"last_alert_ts": now_iso})
-        pipe.zadd("cortexwatcher:metrics:alerts_window", {member_id: timestamp})
-        pipe.zremrangebyscore("cortexwatcher:metrics:alerts_window", 0, timestamp - 600)
-        pipe.expire("cortexwatcher:metrics:alerts_window", 3600)
-        pipe.execute()
-    except RedisError:
-        pass
+def _bump_alert_metrics(count: int = 1) -> None:
+    bump_alert_metrics(redis_conn, count)
 
 
 def _status_snapshot() -> dict[str, Any]:
@@ -200,93 +256,166 @@ def _status_snapshot() -> dict[str, Any]:
 
 async def run_analyzer_loop() -> None:
     storage = get_storage()
-    engine = RuleEngine(settings.rules_path)
-    notifier = AlertNotifier(storage)
-    detector = AnomalyDetector(window_minutes=settings.anomaly_window_min)
-
-    processed_key = "cortexwatcher:analyzer:processed_logs"
+    engine = build_engine()
+    notifier = build_notifier(storage, build_dedup(redis_conn), redis_conn)
+    detector = build_detector()
+    quantiles = build_quantile_tracker()
+    traffic = build_traffic_tracker()
+    if settings.analyzer_metrics_port:
+        start_http_server(settings.analyzer_metrics_port)
+    reloader = RuleReloader(engine, redis_conn, default_replica_id("analyzer"))
+    reloader.start()
+    checkpoint = build_checkpoint(detector, engine)
+    if checkpoint is not None:
+        checkpoint.restore()
+
+    processed_key = PROCESSED_LOGS_KEY
     ttl_seconds = 86400  # 24 години
     cleanup_interval = 300  # 5 хвилин
     last_cleanup = time()
 
-    while True:
-        now_ts = time()
-        # Очищення старих записів
-        if now_ts - last_cleanup > cleanup_interval:
-            try:
-                redis_conn.zremrangebyscore(processed_key, 0, now_ts - ttl_seconds)
-                last_cleanup = now_ts
-            except RedisError:
-                pass
-
-        logs = await storage.list_logs(limit=500)
-        for log in logs:
-            try:
-                # Додаємо лог у Redis sorted set з NX (тільки якщо не існує)
-                added = redis_conn.zadd(processed_key, {log.id: now_ts}, nx=True)
-                if added == 0:
-                    # Лог вже оброблявся, пропускаємо
-                    continue
-            except RedisError:
-                # Якщо Redis недоступний, все одно обробляємо (fail-open)
-                pass
-
-            await _evaluate_log(storage, engine, notifier, detector, log)
-
-        await asyncio.sleep(10)
-
-
-async def _evaluate_log(
+    try:
+        while True:
+            now_ts = time()
+            await reloader.poll()
+            # Очищення старих записів
+            if now_ts - last_cleanup > cleanup_interval:
+                try:
+                    redis_conn.zremrangebyscore(processed_key, 0, now_ts - ttl_seconds)
+                    last_cleanup = now_ts
+                except RedisError:
+                    pass
+
+            logs = await storage.list_logs(limit=500)
+            outputs = AnalysisOutputs()
+            for log in logs:
+                try:
+                    # Додаємо лог у Redis sorted set з NX (тільки якщо не існує)
+                    added = redis_conn.zadd(processed_key, {str(log.id): now_ts}, nx=True)
+                    if added == 0:
+                        # Лог вже оброблявся, пропускаємо
+                        continue
+                except RedisError:
+                    # Якщо Redis недоступний, все одно обробляємо (fail-open)
+                    pass
+
+                await _evaluate_log(
+                    storage,
+                    engine,
+                    notifier,
+                    detector,
+                    log,
+                    quantiles,
+                    traffic,
+                    outputs,
+                )
+
+            _collect_closed_anomalies(detector, outputs)
+            _flush_quantiles(engine, quantiles, reloader.replica_id, outputs)
+            await _persist_outputs(storage, notifier, outputs)
+            _flush_traffic(traffic)
+            await notifier.flush_occurrences()
+            detector.report_metrics()
+            if checkpoint is not None:
+                checkpoint.maybe_save()
+            await asyncio.sleep(10)
+    finally:
+        if checkpoint is not None:
+            checkpoint.save()
+        reloader.close()
+
+
+async def _evaluate_log(  # noqa: PLR0913, PLR0917 - кроки конвеєра аналізатора
     storage: LogStorage,
     engine: RuleEngine,
     notifier: AlertNotifier,
-    detector: AnomalyDetector,
+    detector: AnomalyBackend,
     log: LogNormalized,
+    quantiles: QuantileTracker | None = None,
+    traffic: TrafficTracker | None = None,
+    outputs: AnalysisOutputs | None = None,
 ) -> None:
-    record = {
-        "msg": log.msg,
-        "host": log.host,
-        "app": log.app,
-        "severity": log.severity,
-        "srcip": log.meta_json.get("srcip") if isinstance(log.meta_json, dict) else None,
-        "dstip": log.meta_json.get("dstip") if isinstance(log.meta_json, dict) else None,
-    }
-    matches = engine.match(record)
-    for rule in matches:
-        if rule.severity < settings.alert_min_level:
-            continue
-        alert = Alert(
-            created_at=datetime.now(timezone.utc),
-            rule_id=rule.id,
-            level=rule.severity,
-            title=rule.title,
-            description=rule.description,
-            tags=list(rule.tags),
-            evidence_json={"log_id": log.id, "msg": log.msg},
-        )
-        await notifier.persist_and_notify(alert)
-        _bump_alert_metrics()
-    anomaly, score = detector.update(log.host, log.app, log.severity, log.ts)
-    if anomaly:
-        anomaly_obj = Anomaly(
-            created_at=datetime.now(timezone.utc),
-            signal=f"{log.host}|{log.app}|{log.severity}",
-            score=score,
-            window=detector.window_minutes,
-            details_json={"log_id": log.id},
-        )
-        await storage.store_anomaly(anomaly_obj)
+    """Застосовує правила й детектор до запису.
+
+    Алерти й аномалії додаються в ``outputs`` і зберігаються пакетом після
+    всього пакета логів; без ``outputs`` вони зберігаються одразу.
+    """
+
+    pending = outputs if outputs is not None else AnalysisOutputs()
+    evaluate_log(engine, detector, log, pending, quantiles=quantiles, traffic=traffic)
+    if outputs is None:
+        await _persist_outputs(storage, notifier, pending)
+
+
+async def _persist_outputs(
+    storage: LogStorage,
+    notifier: AlertNotifier,
+    outputs: AnalysisOutputs,
+) -> None:
+    """Зберігає накопичені аномалії та алерти пакетними вставками."""
+
+    saved = await persist_outputs(storage, notifier, outputs)
+    if saved:
+        _bump_alert_metrics(saved)
+
+
+def _collect_closed_anomalies(detector: AnomalyBackend, outputs: AnalysisOutputs) -> None:
+    collect_closed_anomalies(detector, outputs)
+
+
+def _flush_quantiles(
+    engine: RuleEngine,
+    quantiles: QuantileTracker,
+    replica: str,
+    outputs: AnalysisOutputs,
+) -> None:
+    flush_quantiles(redis_conn, engine, quantiles, replica, outputs)
+
+
+def _flush_traffic(traffic: TrafficTracker) -> None:
+    flush_traffic(redis_conn, traffic)
+
+
+async def run_sender() -> None:
+    """Окремий процес, що відправляє сповіщення з черги в Telegram."""
+
+    bot = Bot(
+        token=settings.tg_bot_token,
+        default=DefaultBotProperties(parse_mode=ParseMode.MARKDOWN),
+    )
+    client = AsyncRedis.from_url(settings.redis_url)
+    sender = OutboxSender(
+        client,
+        bot.send_message,
+        chat_per_minute=settings.notify_chat_per_min,
+        global_per_second=settings.notify_global_per_sec,
+        digest_threshold=settings.notify_digest_threshold,
+    )
+    try:
+        await sender.run()
+    finally:
+        await client.aclose()
+        await bot.session.close()
+
+
+def build_worker(queues: Sequence[Queue]) -> SimpleWorker:
+    """RQ-воркер, що виконує задачі у власному процесі.
+
+    Звичайний ``rq.Worker`` форкає окремий процес на кожну задачу, і стан
+    inline-аналізу (скомпільовані правила, порогові й послідовні лічильники,
+    базові лінії детектора, скетчі) зникав би разом із ним після задачі.
+    """
+
+    return SimpleWorker(list(queues), connection=queues[0].connection)
 
 
 def main() -> None:
     if len(sys.argv) > 1 and sys.argv[1] == "analyzer":
         asyncio.run(run_analyzer_loop())
+    elif len(sys.argv) > 1 and sys.argv[1] == "sender":
+        asyncio.run(run_sender())
     else:
-        from rq import Worker
-
-        with queue.connection:
-            worker = Worker([queue])
-            worker.work()
+        build_worker([queue]).work()
 
 
 if __name__ == "__main__":
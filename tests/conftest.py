@@ -64,7 +64,7 @@ def pytest_configure(config: pytest.Config) -> None:
 
 
 @pytest.hookimpl(tryfirst=True)
-def pytest_pyfunc_call(pyfuncitem: pytest.Function) -> bool:
+def pytest_pyfunc_call(pyfuncitem: pytest.Function) -> bool | None:
     """Дозволяє виконувати async def тести без додаткових плагінів."""
 
     if inspect.iscoroutinefunction(pyfuncitem.obj):
@@ -78,7 +78,7 @@ def pytest_pyfunc_call(pyfuncitem: pytest.Function) -> bool:
         finally:
             manager.close()
         return True
-    return False
+    return None
 
 
 @pytest.hookimpl(tryfirst=True)
@@ -0,0 +1,169 @@
+"""Тести детектора аномалій."""
+from __future__ import annotations
+
+import os
+from datetime import UTC, datetime, timedelta
+
+import pytest
+
+# Модуль збирається раніше за test_api і першим кешує налаштування,
+# тому значення мають збігатися з тими, на які розраховує test_api
+os.environ.setdefault("TG_BOT_TOKEN", "test")
+os.environ.setdefault("ALLOWED_CHAT_IDS", "1")
+os.environ.setdefault("DATABASE_URL", "sqlite+aiosqlite:///:memory:")
+os.environ.setdefault("REDIS_URL", "redis://localhost:6379/0")
+os.environ.setdefault("API_AUTH_TOKEN", "token")
+os.environ.setdefault("CLICKHOUSE", "1")
+os.environ.setdefault("CLICKHOUSE_URL", "http://localhost")
+os.environ.setdefault("RULES_PATH", "src/cortexwatcher/rules/sample_rules.yaml")
+
+from cortexwatcher.analyzer.anomalies import AnomalyDetector
+
+START = datetime(2024, 1, 1, tzinfo=UTC)
+THRESHOLD = 2.5
+
+
+def _feed(detector: AnomalyDetector, minute: int, count: int) -> tuple[bool, float]:
+    result = (False, 0.0)
+    for _ in range(count):
+        timestamp = START + timedelta(minutes=minute, seconds=5)
+        result = detector.update("web", "nginx", "err", timestamp)
+    return result
+
+
+def test_detects_spike_against_baseline() -> None:
+    detector = AnomalyDetector(window_minutes=10, threshold=THRESHOLD)
+    for minute in range(10):
+        _feed(detector, minute, 2)
+    anomaly, score = _feed(detector, 10, 30)
+    assert anomaly is True
+    assert score > THRESHOLD
+
+
+def test_missing_minutes_are_zero_filled() -> None:
+    detector = AnomalyDetector(window_minutes=5)
+    _feed(detector, 0, 4)
+    _feed(detector, 3, 1)
+    values = [stat.value for stat in detector.snapshot()["web|nginx|err"]]
+    assert values == [4, 0, 0, 1]
+
+    anomaly, score = _feed(detector, 10, 1)
+    # Усе вікно, крім поточної хвилини, порожнє
+    assert [stat.value for stat in detector.snapshot()["web|nginx|err"]] == [0, 0, 0, 0, 0, 1]
+    assert anomaly is False
+    assert score == pytest.approx((1 - 1 / 6) / ((1 / 6) - (1 / 6) ** 2) ** 0.5)
+
+
+def test_running_sums_match_full_recalculation() -> None:
+    detector = AnomalyDetector(window_minutes=4)
+    pattern = [3, 0, 5, 1, 7, 2, 0, 4, 6]
+    for minute, count in enumerate(pattern):
+        _feed(detector, minute, count)
+    series = detector.history["web|nginx|err"]
+    values = series.values()
+    assert values == pattern[-5:]
+    assert series.total == sum(values)
+    assert series.total_sq == sum(value * value for value in values)
+
+
+def test_series_cap_evicts_least_recently_updated() -> None:
+    detector = AnomalyDetector(window_minutes=5, max_series=2)
+    detector.update("a", "app", "err", START)
+    detector.update("b", "app", "err", START)
+    detector.update("a", "app", "err", START)
+    detector.update("c", "app", "err", START)
+    assert list(detector.history) == ["a|app|err", "c|app|err"]
+    assert detector.evicted["capacity"] == 1
+
+
+def test_idle_series_are_evicted() -> None:
+    detector = AnomalyDetector(window_minutes=5, idle_minutes=10)
+    detector.update("quiet", "app", "err", START)
+    detector.update("busy", "app", "err", START + timedelta(minutes=5))
+    detector.update("busy", "app", "err", START + timedelta(minutes=11))
+    assert list(detector.history) == ["busy|app|err"]
+    assert detector.evicted["idle"] == 1
+
+
+def test_idle_sweep_skips_retained_seasonal_series() -> None:
+    detector = AnomalyDetector(window_minutes=5, idle_minutes=10, models=[("night|*", "hw_daily")])
+    detector.update("night", "app", "err", START)
+    detector.update("quiet", "app", "err", START + timedelta(minutes=1))
+    for minute in range(20, 25):
+        detector.update("busy", "app", "err", START + timedelta(minutes=minute))
+    # Сезонна серія в голові черги не затримує витіснення звичайних за нею
+    assert list(detector.history) == ["night|app|err", "busy|app|err"]
+    assert detector.evicted == {"capacity": 0, "idle": 1}
+
+    detector.update("busy", "app", "err", START + timedelta(days=1, minutes=1))
+    assert list(detector.history) == ["busy|app|err"]
+    assert detector.evicted == {"capacity": 0, "idle": 2}
+
+
+def test_capacity_eviction_keeps_expiry_queues_in_sync() -> None:
+    detector = AnomalyDetector(
+        window_minutes=5, max_series=2, idle_minutes=10, models=[("night|*", "hw_daily")],
+    )
+    detector.update("night", "app", "err", START)
+    detector.update("a", "app", "err", START)
+    detector.update("b", "app", "err", START)
+    detector.update("b", "app", "err", START + timedelta(minutes=30))
+    assert list(detector.history) == ["b|app|err"]
+    assert detector.evicted == {"capacity": 1, "idle": 1}
+
+
+# Робочі години у синтетичному трафіку: 9:00-12:00
+BUSY_START, BUSY_END = 540, 720
+
+
+def _daily_traffic(detector: AnomalyDetector, days: int, spike_at: int | None = None) -> list[int]:
+    """Три години «робочого» навантаження на добу; повертає хвилини спрацювань останньої доби."""
+
+    fired = []
+    for minute in range(days * 1440):
+        count = 20 if BUSY_START <= minute % 1440 < BUSY_END else 2
+        count += minute % 3 - 1
+        if minute == spike_at:
+            count = 60
+        for _ in range(count):
+            anomaly, _ = detector.update("web", "nginx", "err", START + timedelta(minutes=minute))
+        if anomaly and minute >= (days - 1) * 1440:
+            fired.append(minute % 1440)
+    return fired
+
+
+def test_holt_winters_learns_daily_ramp() -> None:
+    window = AnomalyDetector(window_minutes=30, idle_minutes=1440)
+    assert BUSY_START in _daily_traffic(window, days=3)
+
+    seasonal = AnomalyDetector(window_minutes=30, default_model="hw_daily")
+    assert _daily_traffic(seasonal, days=3) == []
+
+    seasonal = AnomalyDetector(window_minutes=30, default_model="hw_daily")
+    assert _daily_traffic(seasonal, days=3, spike_at=2 * 1440 + 180) == [180]
+
+
+def test_models_are_selected_per_signal_and_survive_packing() -> None:
+    detector = AnomalyDetector(window_minutes=5, models=[("web|*", "ewma"), ("db|*", "hw_weekly")])
+    for minute in range(20):
+        for host in ("web", "db", "cache"):
+            detector.update(host, "app", "err", START + timedelta(minutes=minute, seconds=minute))
+    kinds = {key: type(series).__name__ for key, series in detector.history.items()}
+    assert kinds == {
+        "web|app|err": "_Ewma",
+        "db|app|err": "_HoltWintersWeekly",
+        "cache|app|err": "_Series",
+    }
+
+    restored = AnomalyDetector(window_minutes=5)
+    restored.restore_series((key, detector.export_series(key)) for key in detector.history)  # type: ignore[misc]
+    for key, series in detector.history.items():
+        copy = restored.history[key]
+        assert type(copy) is type(series)
+        assert copy.score() == series.score()
+    # 168 слотів сезонності й дисперсії по 4 байти плюс заголовок
+    weekly_limit = 1500
+    assert len(detector.export_series("db|app|err") or b"") < weekly_limit
+
+    with pytest.raises(ValueError):
+        AnomalyDetector(window_minutes=5, default_model="arima")
@@ -1,8 +1,11 @@
 """Інтеграційні тести FastAPI."""
 from __future__ import annotations
 
+import json
 import os
 import time
+from datetime import UTC, datetime, timedelta
+from http import HTTPStatus
 
 import pytest
 from fastapi.testclient import TestClient
@@ -18,8 +21,9 @@ os.environ.setdefault("RULES_PATH", "src/cortexwatcher/rules/sample_rules.yaml")
 
 from redis.exceptions import RedisError
 
+from cortexwatcher.analyzer.sketches import KllSketch
 from cortexwatcher.api.main import app
-from cortexwatcher.api.routers import health
+from cortexwatcher.api.routers import health, rules
 from cortexwatcher.storage.clickhouse import ClickHouseStorage
 
 
@@ -180,3 +184,116 @@ def test_status_endpoint_handles_redis_error(monkeypatch: pytest.MonkeyPatch) ->
     assert body["components"]["queue"]["status"] == "error"
     assert body["components"]["metrics"]["status"] == "error"
 
+
+
+def test_rules_endpoint_reports_replica_versions(monkeypatch: pytest.MonkeyPatch) -> None:
+    class DummyRedis:
+        @classmethod
+        def from_url(cls, *_: object, **__: object) -> DummyRedis:
+            return cls()
+
+        async def hgetall(self, key: str) -> dict[str, str]:
+            assert key == "cortexwatcher:rules:versions"
+            seen = datetime.now(UTC).isoformat()
+            dead = (datetime.now(UTC) - timedelta(hours=1)).isoformat()
+            return {
+                "analyzer:a:1": json.dumps({"version": "abc", "rules": 3, "seen_at": seen}),
+                "analyzer:b:2": json.dumps({"version": "def", "rules": 4, "seen_at": seen}),
+                "inline:c:3": json.dumps({"version": "old", "rules": 1, "seen_at": dead}),
+            }
+
+        async def aclose(self) -> None:
+            pass
+
+    monkeypatch.setattr(rules, "AsyncRedis", DummyRedis)
+
+    client = TestClient(app)
+    response = client.get("/rules")
+    assert response.status_code == HTTPStatus.OK
+    body = response.json()
+    assert body["status"] == "diverged"
+    assert body["versions"] == ["abc", "def"]
+    assert body["replicas"]["analyzer:a:1"]["version"] == "abc"
+    assert "inline:c:3" not in body["replicas"]
+
+
+def test_quantiles_endpoint_merges_replica_sketches(monkeypatch: pytest.MonkeyPatch) -> None:
+    def sketch(values: range) -> bytes:
+        item = KllSketch()
+        for value in values:
+            item.update(value)
+        return item.to_bytes()
+
+    buckets = [
+        {b"web|nginx#a": sketch(range(0, 50)), b"db|pg#a": sketch(range(1000, 1010))},
+        {b"web|nginx#b": sketch(range(50, 100))},
+    ]
+
+    class DummyPipeline:
+        def __init__(self) -> None:
+            self.keys: list[str] = []
+
+        def hgetall(self, key: str) -> None:
+            assert key.startswith("cortexwatcher:quantiles:request_time:")
+            self.keys.append(key)
+
+        async def execute(self) -> list[dict[bytes, bytes]]:
+            return buckets + [{} for _ in self.keys[len(buckets):]]
+
+    class DummyRedis:
+        def pipeline(self, transaction: bool = True) -> DummyPipeline:
+            return DummyPipeline()
+
+    monkeypatch.setattr(app.state, "redis", DummyRedis(), raising=False)
+
+    client = TestClient(app)
+    params = {"field": "request_time", "series": "web|*", "q": [0.5, 0.99]}
+    response = client.get("/analytics/quantiles", params=params)
+    assert response.status_code == HTTPStatus.OK
+    body = response.json()
+    assert list(body["series"]) == ["web|nginx"]
+    web = body["series"]["web|nginx"]
+    assert (web["count"], web["quantiles"]) == (100, {"p50": 49.0, "p99": 98.0})
+
+
+# Вікно аналітичних ендпоінтів за замовчуванням, у закритих хвилинах
+DEFAULT_ANALYTICS_MINUTES = 5
+
+
+def test_top_and_cardinality_endpoints(monkeypatch: pytest.MonkeyPatch) -> None:
+    class DummyPipeline:
+        def __init__(self) -> None:
+            self.results: list[object] = []
+
+        def zrevrange(self, key: str, start: int, end: int, withscores: bool = False) -> None:
+            assert key.startswith("cortexwatcher:top:srcip:") and withscores
+            buckets = [[(b"10.0.0.1", 5.0), (b"10.0.0.2", 1.0)], [(b"10.0.0.2", 7.0)]]
+            index = len(self.results)
+            self.results.append(buckets[index] if index < len(buckets) else [])
+
+        def smembers(self, key: str) -> None:
+            assert key.startswith("cortexwatcher:cardinality:dst_ports:")
+            self.results.append({b"10.0.0.1", b"10.0.0.2"} if not self.results else set())
+
+        def pfcount(self, *keys: str) -> None:
+            assert len(keys) == DEFAULT_ANALYTICS_MINUTES
+            self.results.append(40 if keys[0].endswith(":10.0.0.1") else 3)
+
+        async def execute(self) -> list[object]:
+            return self.results
+
+    class DummyRedis:
+        def pipeline(self, transaction: bool = True) -> DummyPipeline:
+            return DummyPipeline()
+
+    monkeypatch.setattr(app.state, "redis", DummyRedis(), raising=False)
+    client = TestClient(app)
+
+    top = client.get("/analytics/top", params={"field": "srcip", "limit": 1}).json()
+    assert top["items"] == [{"value": "10.0.0.2", "count": 8}]
+
+    body = client.get("/analytics/cardinality", params={"field": "dst_ports"}).json()
+    assert body["groups"] == [
+        {"group": "10.0.0.1", "distinct": 40},
+        {"group": "10.0.0.2", "distinct": 3},
+    ]
@@ -0,0 +1,169 @@
+"""Тести знімків стану аналізатора."""
+from __future__ import annotations
+
+import os
+from collections.abc import Callable
+from datetime import UTC, datetime, timedelta
+from pathlib import Path
+
+os.environ.setdefault("TG_BOT_TOKEN", "test")
+os.environ.setdefault("DATABASE_URL", "sqlite+aiosqlite:///:memory:")
+os.environ.setdefault("REDIS_URL", "redis://localhost:6379/0")
+os.environ.setdefault("API_AUTH_TOKEN", "token")
+
+from cortexwatcher.analyzer.anomalies import AnomalyDetector
+from cortexwatcher.analyzer.checkpoint import (
+    AnalyzerCheckpoint,
+    FileCheckpointStore,
+    RedisCheckpointStore,
+    encode_header,
+)
+from cortexwatcher.analyzer.rules_engine import RuleEngine
+
+START = datetime(2024, 1, 1, tzinfo=UTC)
+
+THRESHOLD_RULES = """
+- id: burst
+  title: "Сплеск"
+  description: ""
+  severity: 6
+  patterns: ["failed"]
+  threshold: 3
+  window: 60
+  group_by: [host]
+"""
+
+
+class FakePipeline:
+    def __init__(self, redis: FakeRedis) -> None:
+        self.redis = redis
+        self.ops: list[tuple[str, tuple[object, ...], dict[str, object]]] = []
+
+    def __getattr__(self, name: str) -> Callable[..., None]:
+        return lambda *args, **kwargs: self.ops.append((name, args, kwargs))
+
+    def execute(self) -> None:
+        for name, args, kwargs in self.ops:
+            getattr(self.redis, name)(*args, **kwargs)
+
+
+class FakeRedis:
+    def __init__(self) -> None:
+        self.hashes: dict[str, dict[bytes, bytes]] = {}
+        self.writes = 0
+
+    def pipeline(self, transaction: bool = True) -> FakePipeline:
+        return FakePipeline(self)
+
+    def hgetall(self, key: str) -> dict[bytes, bytes]:
+        return dict(self.hashes.get(key, {}))
+
+    def hset(self, key: str, mapping: dict[object, bytes]) -> int:
+        bucket = self.hashes.setdefault(key, {})
+        for field, value in mapping.items():
+            bucket[field.encode() if isinstance(field, str) else field] = value  # type: ignore[union-attr]
+            self.writes += 1
+        return len(mapping)
+
+    def hdel(self, key: str, *fields: str) -> int:
+        bucket = self.hashes.get(key, {})
+        return sum(bucket.pop(field.encode(), None) is not None for field in fields)
+
+    def delete(self, key: str) -> int:
+        return int(self.hashes.pop(key, None) is not None)
+
+
+def _series_fields(redis: FakeRedis) -> set[bytes]:
+    return {field for field in redis.hashes["cp"] if not field.startswith(b"__")}
+
+
+def _engine(tmp_path: Path) -> RuleEngine:
+    rules_file = tmp_path / "rules.yaml"
+    rules_file.write_text(THRESHOLD_RULES, encoding="utf-8")
+    return RuleEngine(rules_file)
+
+
+def _warm(detector: AnomalyDetector, hosts: int = 3) -> None:
+    for minute in range(6):
+        for host in range(hosts):
+            for _ in range(minute + host):
+                detector.update(f"h{host}", "sshd", "warn", START + timedelta(minutes=minute))
+
+
+def test_file_checkpoint_restores_detector_and_rule_state(tmp_path: Path) -> None:
+    engine = _engine(tmp_path)
+    detector = AnomalyDetector(window_minutes=5)
+    checkpoint = AnalyzerCheckpoint(detector, engine, FileCheckpointStore(tmp_path / "state.bin"))
+    _warm(detector)
+    ts = START.timestamp()
+    for offset in range(2):
+        engine.match({"msg": "failed login", "host": "web", "ts": ts + offset})
+    assert checkpoint.save()
+
+    restored_engine = _engine(tmp_path)
+    restored = AnomalyDetector(window_minutes=5)
+    store = FileCheckpointStore(tmp_path / "state.bin")
+    assert AnalyzerCheckpoint(restored, restored_engine, store).restore()
+    assert {key: series.values() for key, series in restored.history.items()} == {
+        key: series.values() for key, series in detector.history.items()
+    }
+    key = "h2|sshd|warn"
+    assert restored.history[key].total_sq == detector.history[key].total_sq
+    # Два збіги вже враховано до рестарту — третій досягає порогу
+    matched = restored_engine.match({"msg": "failed", "host": "web", "ts": ts + 2})
+    assert [rule.id for rule in matched] == ["burst"]
+
+
+def test_incompatible_checkpoint_is_discarded(tmp_path: Path) -> None:
+    path = tmp_path / "state.bin"
+    path.write_bytes(b"CWCP" + b"\x63\x00" + b"garbage")
+    store = FileCheckpointStore(path)
+    detector = AnomalyDetector(window_minutes=5)
+    assert AnalyzerCheckpoint(detector, _engine(tmp_path), store).restore() is False
+    assert not detector.history
+
+    _warm(detector)
+    AnalyzerCheckpoint(detector, _engine(tmp_path), store).save()
+    other_window = AnomalyDetector(window_minutes=10)
+    assert AnalyzerCheckpoint(other_window, _engine(tmp_path), store).restore() is False
+    assert not other_window.history
+
+
+def test_redis_checkpoint_writes_only_changed_series(tmp_path: Path) -> None:
+    redis = FakeRedis()
+    store = RedisCheckpointStore(redis, key="cp")  # type: ignore[arg-type]
+    detector = AnomalyDetector(window_minutes=5, max_series=3)
+    checkpoint = AnalyzerCheckpoint(detector, _engine(tmp_path), store)
+    _warm(detector)
+    checkpoint.save()
+    assert _series_fields(redis) == {b"h0|sshd|warn", b"h1|sshd|warn", b"h2|sshd|warn"}
+    assert redis.hashes["cp"][b"__header__"] == encode_header(5)
+
+    redis.writes = 0
+    detector.update("h1", "sshd", "warn", START + timedelta(minutes=6))
+    detector.update("h9", "sshd", "warn", START + timedelta(minutes=6))  # витісняє h0
+    checkpoint.save()
+    # Записано лише заголовок, правила, h1 та h9
+    assert (redis.writes, _series_fields(redis)) == (
+        4,
+        {b"h1|sshd|warn", b"h2|sshd|warn", b"h9|sshd|warn"},
+    )
+
+    restored = AnomalyDetector(window_minutes=5, max_series=3)
+    assert AnalyzerCheckpoint(restored, _engine(tmp_path), store).restore()
+    assert restored.history["h1|sshd|warn"].values() == detector.history["h1|sshd|warn"].values()
+
+
+def test_redis_checkpoint_keeps_series_recreated_after_eviction(tmp_path: Path) -> None:
+    redis = FakeRedis()
+    store = RedisCheckpointStore(redis, key="cp")  # type: ignore[arg-type]
+    detector = AnomalyDetector(window_minutes=5, max_series=3)
+    checkpoint = AnalyzerCheckpoint(detector, _engine(tmp_path), store)
+    _warm(detector)
+    checkpoint.save()
+
+    # h0 витісняється, а потім зʼявляється знову до наступного знімка
+    detector.update("h9", "sshd", "warn", START + timedelta(minutes=6))
+    detector.update("h0", "sshd", "warn", START + timedelta(minutes=6))
+    checkpoint.save()
+    assert _series_fields(redis) == {b"h0|sshd|warn", b"h2|sshd|warn", b"h9|sshd|warn"}
@@ -0,0 +1,127 @@
+"""Тести дедуплікації алертів."""
+from __future__ import annotations
+
+import os
+from datetime import UTC, datetime, timedelta
+
+import pytest
+
+os.environ.setdefault("TG_BOT_TOKEN", "test")
+os.environ.setdefault("DATABASE_URL", "sqlite+aiosqlite:///:memory:")
+os.environ.setdefault("REDIS_URL", "redis://localhost:6379/0")
+os.environ.setdefault("API_AUTH_TOKEN", "token")
+
+from cortexwatcher.analyzer import dedup as dedup_module
+from cortexwatcher.analyzer.dedup import AlertDeduplicator
+from cortexwatcher.analyzer.notifier import AlertNotifier
+from cortexwatcher.db.models import Alert
+from cortexwatcher.storage.clickhouse import ClickHouseStorage
+
+START = datetime(2024, 1, 1, tzinfo=UTC)
+REPEATS = 1000
+
+
+class FakeRedis:
+    """Мінімальний Redis для SET NX EX / GET / PTTL."""
+
+    def __init__(self) -> None:
+        self.values: dict[str, tuple[bytes, float]] = {}
+        self.now = 0.0
+
+    def set(self, key: str, value: object, nx: bool = False, ex: int | None = None) -> bool:
+        if nx and key in self.values and self.values[key][1] > self.now:
+            return False
+        self.values[key] = (str(value).encode(), self.now + (ex or 0))
+        return True
+
+    def pipeline(self, transaction: bool = True) -> FakePipeline:
+        return FakePipeline(self)
+
+
+class FakePipeline:
+    def __init__(self, redis: FakeRedis) -> None:
+        self.redis = redis
+        self.ops: list[tuple[str, str]] = []
+
+    def get(self, key: str) -> None:
+        self.ops.append(("get", key))
+
+    def pttl(self, key: str) -> None:
+        self.ops.append(("pttl", key))
+
+    def execute(self) -> list[object]:
+        result: list[object] = []
+        for op, key in self.ops:
+            value, expires = self.redis.values.get(key, (None, 0.0))
+            alive = value is not None and expires > self.redis.now
+            if op == "get":
+                result.append(value if alive else None)
+            else:
+                result.append(int((expires - self.redis.now) * 1000) if alive else -2)
+        return result
+
+
+def _alert(ts: datetime, key: str = "1.2.3.4|*|sshd") -> Alert:
+    return Alert(
+        created_at=ts,
+        rule_id="ssh_bruteforce",
+        level=7,
+        title="Brute force",
+        description="",
+        tags=[],
+        evidence_json={},
+        correlation_key=key,
+    )
+
+
+@pytest.fixture
+def clock(monkeypatch: pytest.MonkeyPatch) -> FakeRedis:
+    redis = FakeRedis()
+    monkeypatch.setattr(dedup_module.time, "time", lambda: redis.now)
+    return redis
+
+
+@pytest.mark.asyncio
+async def test_repeats_increment_counter_instead_of_new_alerts(clock: FakeRedis) -> None:
+    storage = ClickHouseStorage("http://localhost")
+    notifier = AlertNotifier(storage, dedup=AlertDeduplicator(60, clock))
+
+    saved = [
+        await notifier.persist_and_notify(_alert(START + timedelta(seconds=i)))
+        for i in range(REPEATS)
+    ]
+    assert await notifier.persist_and_notify(_alert(START, key="5.6.7.8|*|sshd")) is not None
+    assert sum(item is not None for item in saved) == 1
+    assert await notifier.flush_occurrences() == REPEATS - 1
+    assert await notifier.flush_occurrences() == 0
+
+    alerts = await storage.list_alerts()
+    first = next(item for item in alerts if item.correlation_key == "1.2.3.4|*|sshd")
+    assert sorted(item.correlation_key or "" for item in alerts) == [
+        "1.2.3.4|*|sshd",
+        "5.6.7.8|*|sshd",
+    ]
+    assert first.occurrences == REPEATS
+    assert first.last_seen_at == START + timedelta(seconds=REPEATS - 1)
+
+    # Після вікна придушення інцидент відкривається заново
+    clock.now = 61
+    assert await notifier.persist_and_notify(_alert(START + timedelta(minutes=2))) is not None
+
+
+@pytest.mark.asyncio
+async def test_incident_opened_by_another_replica_is_suppressed(clock: FakeRedis) -> None:
+    storage = ClickHouseStorage("http://localhost")
+    first = AlertNotifier(storage, dedup=AlertDeduplicator(60, clock))
+    second = AlertNotifier(storage, dedup=AlertDeduplicator(60, clock))
+
+    opened = await first.persist_and_notify(_alert(START))
+    assert opened is not None
+    clock.now = 30
+    assert await second.persist_and_notify(_alert(START + timedelta(seconds=30))) is None
+    assert await second.flush_occurrences() == 1
+    assert [alert.occurrences for alert in await storage.list_alerts()] == [2]
+
+    # Локальна копія спливає разом із ключем у Redis
+    clock.now = 60
+    assert await second.persist_and_notify(_alert(START + timedelta(seconds=60))) is not None
@@ -0,0 +1,160 @@
+"""Тести наборів індикаторів і умов ``in set``."""
+from __future__ import annotations
+
+import ipaddress
+import os
+import random
+from pathlib import Path
+
+import pytest
+
+os.environ.setdefault("TG_BOT_TOKEN", "test")
+os.environ.setdefault("DATABASE_URL", "sqlite+aiosqlite:///:memory:")
+os.environ.setdefault("REDIS_URL", "redis://localhost:6379/0")
+os.environ.setdefault("API_AUTH_TOKEN", "token")
+
+from cortexwatcher.analyzer.indicators import (
+    BloomFilter,
+    ExactSet,
+    IndicatorRegistry,
+    NetworkSet,
+    load_indicator_file,
+)
+from cortexwatcher.analyzer.reload import RuleReloader
+from cortexwatcher.analyzer.rules_engine import RuleEngine
+
+
+def test_network_set_returns_most_specific_network() -> None:
+    entries = ["10.0.0.0/8", "10.1.0.0/16", "10.1.2.3", "2001:db8::/32", "2001:db8:1::/48"]
+    networks = NetworkSet(entries)
+
+    assert networks.lookup("10.1.2.3") == "10.1.2.3/32"
+    assert networks.lookup("10.1.9.9") == "10.1.0.0/16"
+    assert networks.lookup("10.200.0.1") == "10.0.0.0/8"
+    assert networks.lookup("2001:db8:1::5") == "2001:db8:1::/48"
+    assert networks.lookup("2001:db8:2::5") == "2001:db8::/32"
+    assert "11.0.0.1" not in networks
+    assert "not-an-ip" not in networks
+    assert len(networks) == len(entries)
+
+
+def test_network_set_agrees_with_linear_scan() -> None:
+    rng = random.Random(7)  # noqa: S311 - відтворювані тестові мережі
+    parsed = [
+        ipaddress.ip_network((rng.getrandbits(32), rng.randint(8, 32)), strict=False)
+        for _ in range(500)
+    ]
+    networks = NetworkSet(str(network) for network in parsed)
+    probes = [ipaddress.ip_address(rng.getrandbits(32)) for _ in range(500)]
+    probes += [network.network_address for network in parsed[:100]]
+
+    for address in probes:
+        best = max((n for n in parsed if address in n), key=lambda n: n.prefixlen, default=None)
+        assert networks.lookup(str(address)) == (str(best) if best is not None else None)
+
+
+def test_exact_set_confirms_bloom_hits() -> None:
+    values = [f"{index:040x}" for index in range(5000)]
+    indicators = ExactSet([*values, "Evil.Example.COM "], error_rate=0.5)
+
+    assert all(value in indicators for value in values[::97])
+    assert "evil.example.com" in indicators
+    # При error_rate=0.5 фільтр Блума пропускає багато чужих значень,
+    # але точна перевірка їх відкидає
+    strangers = [f"{index:040x}" for index in range(10**6, 10**6 + 2000)]
+    assert sum(value.encode() in indicators.bloom for value in strangers) > len(strangers) // 20
+    assert not any(value in indicators for value in strangers)
+    assert len(indicators) == len(values) + 1
+    with pytest.raises(ValueError):
+        BloomFilter(10, error_rate=1.5)
+
+
+def test_load_indicator_file_detects_kind(tmp_path: Path) -> None:
+    nets = tmp_path / "nets.txt"
+    nets.write_text(
+        "# DROP list\n1.10.16.0/20 ; SBL256894\n\n203.0.113.7\nnot-a-network\n",
+        encoding="utf-8",
+    )
+    domains = tmp_path / "domains.txt"
+    domains.write_text("bad.example  # phishing\nworse.example\n", encoding="utf-8")
+
+    loaded = load_indicator_file(nets)
+    assert isinstance(loaded, NetworkSet)
+    assert (len(loaded), "1.10.20.1" in loaded) == (2, True)
+    loaded = load_indicator_file(domains)
+    assert isinstance(loaded, ExactSet)
+    assert "BAD.example" in loaded and "good.example" not in loaded
+
+
+def test_rules_reference_sets_by_name_and_pick_up_reloads(tmp_path: Path) -> None:
+    nets = tmp_path / "nets.txt"
+    nets.write_text("198.51.100.0/24\n", encoding="utf-8")
+    hashes = tmp_path / "hashes.txt"
+    hashes.write_text("d41d8cd98f00b204e9800998ecf8427e\n", encoding="utf-8")
+    registry = IndicatorRegistry({"threat_nets": nets, "bad_hashes": hashes})
+    rules_file = tmp_path / "rules.yaml"
+    rules_file.write_text(
+        """
+- id: threat_intel_ip
+  title: ""
+  description: ""
+  severity: 8
+  where: ["srcip in set threat_nets"]
+- id: known_bad_hash
+  title: ""
+  description: ""
+  severity: 9
+  where: ["file.md5 in set bad_hashes"]
+""",
+        encoding="utf-8",
+    )
+    engine = RuleEngine(rules_file, match_cache_size=10, indicators=registry)
+
+    def ids(record: dict[str, object]) -> list[str]:
+        return [rule.id for rule in engine.match({"msg": "event", **record})]
+
+    assert ids({"srcip": "198.51.100.9"}) == ["threat_intel_ip"]
+    bad_file = {"file": {"md5": "D41D8CD98F00B204E9800998ECF8427E"}}
+    assert ids({"srcip": "192.0.2.1", "meta": bad_file}) == ["known_bad_hash"]
+    assert ids({"srcip": "192.0.2.1"}) == []
+
+    nets.write_text("192.0.2.0/24\n10.0.0.0/8\n", encoding="utf-8")
+    assert registry.changed_on_disk() == ["threat_nets"]
+    assert registry.reload() == ["threat_nets"]
+    assert ids({"srcip": "192.0.2.1"}) == ["threat_intel_ip"]
+    assert ids({"srcip": "198.51.100.9"}) == []
+
+    # Зіпсований файл не підміняє робочий набір
+    nets.unlink()
+    nets.mkdir()
+    os.utime(nets, ns=(1, 1))
+    assert registry.reload() == []
+    assert ids({"srcip": "192.0.2.1"}) == ["threat_intel_ip"]
+
+
+async def test_reloader_refreshes_indicator_sets(tmp_path: Path) -> None:
+    nets = tmp_path / "nets.txt"
+    nets.write_text("198.51.100.0/24\n", encoding="utf-8")
+    rules_file = tmp_path / "rules.yaml"
+    rules_file.write_text(
+        '- {id: ti, title: "", description: "", severity: 8,'
+        ' where: ["srcip in set threat_nets"]}\n',
+        encoding="utf-8",
+    )
+    engine = RuleEngine(rules_file, indicators=IndicatorRegistry({"threat_nets": nets}))
+    reloader = RuleReloader(engine, redis=None)
+
+    nets.write_text("192.0.2.0/24\n", encoding="utf-8")
+    assert await reloader.poll(force=True) is False
+    assert [rule.id for rule in engine.match({"msg": "x", "srcip": "192.0.2.1"})] == ["ti"]
+    assert reloader.state()["indicators"] == {"threat_nets": 1}
+
+
+def test_unknown_set_rejects_rules(tmp_path: Path) -> None:
+    rules_file = tmp_path / "rules.yaml"
+    rules_file.write_text(
+        '- {id: ti, title: "", description: "", severity: 8, where: ["srcip in set missing"]}\n',
+        encoding="utf-8",
+    )
+    with pytest.raises(ValueError, match="missing"):
+        RuleEngine(rules_file)
@@ -0,0 +1,157 @@
+"""Тести черги сповіщень і відправника."""
+from __future__ import annotations
+
+import asyncio
+import json
+import os
+
+import pytest
+
+os.environ.setdefault("TG_BOT_TOKEN", "test")
+os.environ.setdefault("DATABASE_URL", "sqlite+aiosqlite:///:memory:")
+os.environ.setdefault("REDIS_URL", "redis://localhost:6379/0")
+os.environ.setdefault("API_AUTH_TOKEN", "token")
+
+from aiogram.exceptions import TelegramRetryAfter
+from aiogram.methods import SendMessage
+
+from cortexwatcher.analyzer.outbox import (
+    OUTBOX_CHATS_KEY,
+    OUTBOX_DEAD_KEY,
+    OutboxSender,
+    outbox_key,
+    sending_key,
+)
+
+fakeredis = pytest.importorskip("fakeredis")
+
+# Повідомлень у черзі чату — більше за поріг зведення
+BACKLOG = 12
+# Чат, відправка в який падає з несподіваною помилкою
+FAILING_CHAT = 3
+
+
+def _payload(title: str) -> bytes:
+    payload = {"text": f"⚠️ {title}", "title": title, "level": 5, "thread_id": None}
+    return json.dumps(payload).encode()
+
+
+async def _push(redis: fakeredis.aioredis.FakeRedis, chat_id: int, *titles: str) -> None:
+    await redis.rpush(outbox_key(chat_id), *(_payload(title) for title in titles))
+    await redis.sadd(OUTBOX_CHATS_KEY, chat_id)
+
+
+class Clock:
+    def __init__(self) -> None:
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+@pytest.mark.asyncio
+async def test_sender_sends_concurrently_and_respects_chat_buckets() -> None:
+    redis = fakeredis.aioredis.FakeRedis()
+    await _push(redis, 1, "a1", "a2", "a3", "a4")
+    await _push(redis, 2, "b1")
+    clock = Clock()
+    in_flight = 0
+    peak = 0
+    sent: list[tuple[int, str]] = []
+
+    async def send(chat_id: int, text: str, message_thread_id: int | None = None) -> None:
+        nonlocal in_flight, peak
+        in_flight += 1
+        peak = max(peak, in_flight)
+        await asyncio.sleep(0.01)
+        in_flight -= 1
+        sent.append((chat_id, text))
+
+    sender = OutboxSender(
+        redis,
+        send,
+        chat_per_minute=60,
+        digest_threshold=10,
+        clock=clock,
+    )
+    # Обидва чати відправляються одночасно
+    assert (await sender.run_once(), peak) == (2, 2)
+    # Запас відра чату — 3 повідомлення; четверте чекає на новий токен
+    assert await sender.run_once() == 1
+    assert await sender.run_once() == 1
+    assert await sender.run_once() == 0
+    clock.now = 1.0
+    assert await sender.run_once() == 1
+    assert [text for chat, text in sent if chat == 1] == ["⚠️ a1", "⚠️ a2", "⚠️ a3", "⚠️ a4"]
+    clock.now = 2.0
+    assert await sender.run_once() == 0
+    assert await redis.smembers(OUTBOX_CHATS_KEY) == set()
+
+
+@pytest.mark.asyncio
+async def test_sender_honours_retry_after_and_folds_backlog_into_digest() -> None:
+    redis = fakeredis.aioredis.FakeRedis()
+    await _push(redis, 1, *[f"alert {index}" for index in range(BACKLOG)])
+    clock = Clock()
+    calls: list[str] = []
+
+    async def send(chat_id: int, text: str, message_thread_id: int | None = None) -> None:
+        calls.append(text)
+        if len(calls) == 1:
+            method = SendMessage(chat_id=chat_id, text=text)
+            raise TelegramRetryAfter(method, "Flood control", retry_after=30)
+
+    sender = OutboxSender(redis, send, digest_threshold=10, clock=clock)
+    assert await sender.run_once() == 0
+    # Забрані повідомлення чекають у sending і не губляться
+    assert await redis.llen(sending_key(1)) == BACKLOG
+    clock.now = 10
+    assert await sender.run_once() == 0
+    assert len(calls) == 1
+
+    clock.now = 31
+    assert await sender.run_once() == 1
+    assert calls[-1].startswith(f"📦 *Зведення: {BACKLOG} алертів*")
+    assert "• alert 11 (рівень 5)" in calls[-1]
+    assert await redis.llen(outbox_key(1)) == 0
+    assert await redis.llen(sending_key(1)) == 0
+
+
+@pytest.mark.asyncio
+async def test_producer_trim_during_send_keeps_undelivered_messages() -> None:
+    redis = fakeredis.aioredis.FakeRedis()
+    await _push(redis, 1, "old")
+    delivered: list[str] = []
+
+    async def send(chat_id: int, text: str, message_thread_id: int | None = None) -> None:
+        # Продюсер дописує й обрізає чергу до двох повідомлень, поки триває відправка
+        await redis.rpush(outbox_key(1), _payload("new1"), _payload("new2"), _payload("new3"))
+        await redis.ltrim(outbox_key(1), -2, -1)
+        delivered.append(text)
+
+    sender = OutboxSender(redis, send, chat_per_minute=60)
+    assert await sender.run_once() == 1
+    assert delivered == ["⚠️ old"]
+    assert await redis.lrange(outbox_key(1), 0, -1) == [_payload("new2"), _payload("new3")]
+
+
+@pytest.mark.asyncio
+async def test_broken_messages_and_failing_chat_do_not_stop_delivery() -> None:
+    redis = fakeredis.aioredis.FakeRedis()
+    await redis.rpush(outbox_key(1), b"not json", _payload("a1"))
+    await redis.sadd(OUTBOX_CHATS_KEY, 1)
+    await _push(redis, 2, "b1")
+    await _push(redis, 3, "c1")
+    sent: list[str] = []
+
+    async def send(chat_id: int, text: str, message_thread_id: int | None = None) -> None:
+        if chat_id == FAILING_CHAT:
+            raise RuntimeError("boom")
+        sent.append(text)
+
+    sender = OutboxSender(redis, send, chat_per_minute=60, digest_threshold=2)
+    assert await sender.run_once() == len(["a1", "b1"])
+    assert sorted(sent) == ["⚠️ a1", "⚠️ b1"]
+    assert await redis.lrange(OUTBOX_DEAD_KEY, 0, -1) == [b"not json"]
+    # Повідомлення чату з помилкою лишається до наступної спроби
+    assert await redis.lrange(sending_key(FAILING_CHAT), 0, -1) == [_payload("c1")]
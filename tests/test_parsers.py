@@ -1,16 +1,30 @@
 """Тести парсерів."""
 from __future__ import annotations
 
-from datetime import datetime, timezone
+import asyncio
+import io
+import mmap
+from collections.abc import AsyncIterator, Iterator
+from datetime import UTC, datetime
+from pathlib import Path
+
+import pytest
 
 from cortexwatcher.parsers import (
+    aiter_line_batches,
     detect_format,
+    detect_stream,
+    iter_content,
+    iter_lines,
+    iter_syslog,
     parse_gelf,
     parse_json_lines,
     parse_suricata,
     parse_syslog,
     parse_wazuh_alert,
 )
+from cortexwatcher.parsers.parallel import ParsePool, split_line_chunks
+from cortexwatcher.parsers.timestamps import parse_rfc3164, parse_timestamp
 
 
 def test_detect_syslog() -> None:
@@ -29,7 +43,7 @@ def test_parse_json_lines() -> None:
     result = parse_json_lines(sample)
     assert result[0]["app"] == "nginx"
     assert isinstance(result[0]["timestamp"], datetime)
-    assert result[0]["timestamp"].tzinfo == timezone.utc
+    assert result[0]["timestamp"].tzinfo == UTC
 
 
 def test_parse_gelf() -> None:
@@ -62,6 +76,154 @@ def test_parse_suricata() -> None:
     assert result[0]["severity"] == "1"
     assert result[0]["src_ip"] == "10.0.0.1"
     assert result[0]["dest_ip"] == "10.0.0.2"
-    assert result[0]["timestamp"].tzinfo == timezone.utc
+    assert result[0]["timestamp"].tzinfo == UTC
     assert "GET" in result[1]["message"] or "http" in result[1]["message"]
 
+
+@pytest.mark.parametrize(
+    ("value", "expected"),
+    [
+        ("2026-10-12T10:00:00.123Z", datetime(2026, 10, 12, 10, 0, 0, 123000, tzinfo=UTC)),
+        ("2026-10-12T10:00:00.123456+0000", datetime(2026, 10, 12, 10, 0, 0, 123456, tzinfo=UTC)),
+        ("2026-10-12T13:00:00+03:00", datetime(2026, 10, 12, 10, tzinfo=UTC)),
+        ("2026-10-12 10:00:00", datetime(2026, 10, 12, 10, tzinfo=UTC)),
+        ("12/Oct/2026:13:00:00 +0300", datetime(2026, 10, 12, 10, tzinfo=UTC)),
+        ("Mon, 12 Oct 2026 10:00:00 +0000", datetime(2026, 10, 12, 10, tzinfo=UTC)),
+        ("1791799200", datetime(2026, 10, 12, 10, tzinfo=UTC)),
+        (1791799200, datetime(2026, 10, 12, 10, tzinfo=UTC)),
+        ("2026/10/12 10:00", datetime(2026, 10, 12, 10, tzinfo=UTC)),
+        ("not a date", None),
+        (None, None),
+    ],
+)
+def test_parse_timestamp_formats(value: object, expected: datetime | None) -> None:
+    assert parse_timestamp(value) == expected
+
+
+def test_parse_rfc3164_is_cached_per_year() -> None:
+    parse_rfc3164.cache_clear()
+    first = parse_rfc3164("Oct  2 22:14:15", 2026)
+    assert first == datetime(2026, 10, 2, 22, 14, 15, tzinfo=UTC)
+    assert parse_rfc3164("Oct  2 22:14:15", 2026) is first
+    assert parse_rfc3164("Oct  2 22:14:15", 2027) == datetime(2027, 10, 2, 22, 14, 15, tzinfo=UTC)
+    assert parse_rfc3164.cache_info().hits == 1
+    assert parse_rfc3164("Feb 30 00:00:00", 2026) is None
+
+
+def test_parse_syslog_timestamps_are_utc() -> None:
+    sample = (
+        "<34>2026-10-12T13:00:00.5+03:00 web-1 sshd 42 - - Failed password\n"
+        "<34>Oct 11 22:14:15 mymachine su: 'su root' failed"
+    )
+    rfc5424, rfc3164 = parse_syslog(sample)
+    assert rfc5424["timestamp"] == datetime(2026, 10, 12, 10, 0, 0, 500000, tzinfo=UTC)
+    assert rfc3164["timestamp"].tzinfo == UTC
+    assert (rfc3164["timestamp"].month, rfc3164["timestamp"].day) == (10, 11)
+
+
+def test_iter_lines_rejoins_chunks_split_mid_line_and_mid_char() -> None:
+    data = "перший рядок\nдругий\n\nтретій".encode()
+    chunks = [data[index : index + 3] for index in range(0, len(data), 3)]
+    assert list(iter_lines(chunks)) == ["перший рядок", "другий", "", "третій"]
+
+
+def test_iter_lines_accepts_buffers_and_text_files(tmp_path: Path) -> None:
+    path = tmp_path / "log.txt"
+    path.write_bytes(b"a\nb\n")
+    with (
+        path.open("rb") as handle,
+        mmap.mmap(handle.fileno(), 0, access=mmap.ACCESS_READ) as mapped,
+    ):
+        assert list(iter_lines(mapped)) == ["a", "b"]
+    assert list(iter_lines(memoryview(b"a\nb"))) == ["a", "b"]
+    assert list(iter_lines(io.StringIO("a\nb\n"))) == ["a", "b"]
+
+
+def test_iter_lines_splits_on_carriage_returns() -> None:
+    text = "old mac\rwindows\r\n\r\nunix\nlast\r"
+    assert list(iter_lines(text)) == text.splitlines()
+    assert list(iter_lines("a\rb\rc")) == ["a", "b", "c"]
+    data = b"a\r\nb\r\n"
+    assert list(iter_lines(data)) == ["a", "b"]
+    # "\r" і "\n" потрапили в різні шматки
+    assert list(iter_lines([data[:2], data[2:]])) == ["a", "b"]
+
+
+def test_iter_syslog_is_lazy() -> None:
+    def source() -> Iterator[str]:
+        yield "<34>Oct 11 22:14:15 host su: one\n"
+        raise AssertionError("другий рядок не мав читатися")
+
+    assert next(iter_syslog(source()))["message"] == "one"
+
+
+def test_detect_stream_keeps_head_lines() -> None:
+    lines = [f'{{"host": "h{index}", "message": "m"}}\n'.encode() for index in range(500)]
+    fmt, stream = detect_stream(iter(lines))
+    assert fmt == "json_lines"
+    records = list(iter_content(fmt, stream))
+    assert [record["host"] for record in records] == [f"h{index}" for index in range(500)]
+
+
+def test_detect_format_reads_only_prefix() -> None:
+    sample = "<34>Oct 11 22:14:15 host su: ok\n" + "x" * (10 * 1024 * 1024)
+    assert detect_format(sample) == "syslog"
+
+    def endless() -> Iterator[str]:
+        while True:
+            yield "<34>Oct 11 22:14:15 host su: ok"
+
+    assert detect_format(endless()) == "syslog"
+
+
+@pytest.mark.parametrize(
+    ("fmt", "line"),
+    [
+        ("gelf", '{"short_message": "Hello", "host": "api", "level": 3}'),
+        ("wazuh", '{"rule": {"id": "5710", "level": 5}, "agent": {"name": "a"}}'),
+    ],
+)
+def test_json_document_parsers_accept_ndjson(fmt: str, line: str) -> None:
+    lines = [line, line]
+    content = "".join(f"{item}\n" for item in lines)
+    assert detect_format(content) == fmt
+    assert len(list(iter_content(fmt, content))) == len(lines)
+    assert len(list(iter_content(fmt, [content.encode()]))) == len(lines)
+
+
+def test_aiter_line_batches() -> None:
+    async def chunks() -> AsyncIterator[bytes]:
+        yield b"a\nb"
+        yield "\u0432".encode()[:1]
+        yield "\u0432".encode()[1:] + b"\nc"
+
+    async def collect() -> list[list[str]]:
+        return [batch async for batch in aiter_line_batches(chunks(), batch_size=2)]
+
+    assert asyncio.run(collect()) == [["a", "bв"], ["c"]]
+
+
+def test_split_line_chunks_keeps_lines_whole() -> None:
+    content = "".join(f"line {index}\n" for index in range(100))
+    chunks = split_line_chunks(content, 50)
+    assert "".join(chunks) == content
+    assert all(chunk.endswith("\n") for chunk in chunks)
+    assert len(chunks) > 1
+    assert split_line_chunks("a\nb", 0) == ["a\nb"]
+
+
+@pytest.mark.parametrize("workers", [0, 1])
+def test_parse_pool_preserves_order(workers: int) -> None:
+    content = "".join(f"<34>Oct 11 22:14:15 host app: message {index}\n" for index in range(300))
+    pool = ParsePool(workers, inline_max_chars=100, chunk_chars=1000)
+
+    async def run() -> tuple[str, list]:
+        await pool.start()
+        return await pool.parse(content)
+
+    try:
+        fmt, records = asyncio.run(run())
+    finally:
+        pool.close()
+    assert fmt == "syslog"
+    assert [record["message"] for record in records] == [f"message {index}" for index in range(300)]
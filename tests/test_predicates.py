@@ -0,0 +1,73 @@
+"""Тести умов правил на полях meta_json."""
+from __future__ import annotations
+
+import os
+
+import pytest
+
+os.environ.setdefault("TG_BOT_TOKEN", "test")
+os.environ.setdefault("DATABASE_URL", "sqlite+aiosqlite:///:memory:")
+os.environ.setdefault("REDIS_URL", "redis://localhost:6379/0")
+os.environ.setdefault("API_AUTH_TOKEN", "token")
+
+from cortexwatcher.analyzer.predicates import compile_condition, compile_conditions
+
+RECORD = {
+    "host": "web-1",
+    "app": "wazuh",
+    "meta": {
+        "rule": {"level": 12, "groups": ["sshd"]},
+        "alert": {"severity": "2"},
+        "http": {"status": 503, "user_agent": "sqlmap/1.7"},
+        "host": "shadowed",
+    },
+}
+
+
+@pytest.mark.parametrize(
+    ("expression", "expected"),
+    [
+        ("rule.level >= 10", True),
+        ("rule.level>10", True),
+        ("rule.level < 10", False),
+        ("alert.severity in [1, 2]", True),
+        ("alert.severity not in [1, 2]", False),
+        ("http.status between 500 599", True),
+        ("http.status between 200 299", False),
+        ("http.user_agent matches /SQLMAP|nikto/", True),
+        ("host == web-1", True),
+        ("meta.host == shadowed", True),
+        ("app != wazuh", False),
+        ("rule.missing >= 1", False),
+        ("rule.missing != 1", False),
+        ("rule.missing not exists", True),
+        ("rule exists", True),
+    ],
+)
+def test_condition(expression: str, expected: bool) -> None:
+    assert compile_condition(expression)(RECORD) is expected
+
+
+@pytest.mark.parametrize(
+    "expression",
+    [
+        "rule.level",
+        "rule.level >= high",
+        "status between 500",
+        "status between 500 high",
+        "status between 500 599 600",
+        "severity in 2",
+        "x exists 1",
+        "ua matches /(/",
+    ],
+)
+def test_invalid_condition_is_rejected(expression: str) -> None:
+    with pytest.raises(ValueError):
+        compile_condition(expression)
+
+
+def test_conditions_are_combined_with_and() -> None:
+    assert compile_conditions([]) is None
+    predicate = compile_conditions(["rule.level >= 10", "http.status between 500 599"])
+    assert predicate is not None and predicate(RECORD)
+    assert not compile_conditions(["rule.level >= 10", "http.status < 500"])(RECORD)  # type: ignore[misc]
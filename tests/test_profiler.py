@@ -0,0 +1,125 @@
+"""Тести профілювання правил і перевірки regex."""
+from __future__ import annotations
+
+import io
+import os
+from pathlib import Path
+
+import pytest
+
+os.environ.setdefault("TG_BOT_TOKEN", "test")
+os.environ.setdefault("DATABASE_URL", "sqlite+aiosqlite:///:memory:")
+os.environ.setdefault("REDIS_URL", "redis://localhost:6379/0")
+os.environ.setdefault("API_AUTH_TOKEN", "token")
+
+from cortexwatcher.analyzer import profiler
+from cortexwatcher.analyzer.profiler import RuleProfiler, regex_risks
+from cortexwatcher.analyzer.rules_engine import LITERAL_SCAN_ID, RuleEngine
+from cortexwatcher.analyzer.rules_profile import main
+
+RULES = """
+- id: literal
+  title: ""
+  description: ""
+  severity: 5
+  patterns: ["failed password"]
+- id: regex
+  title: ""
+  description: ""
+  severity: 5
+  patterns: ["/user=(\\\\w+\\\\s?)*$/"]
+- id: glob
+  title: ""
+  description: ""
+  severity: 5
+  patterns: ["*timeout*"]
+  filters:
+    app: ["nginx"]
+"""
+
+
+def test_profile_matches_like_match_and_reports_costs(tmp_path: Path) -> None:
+    rules_file = tmp_path / "rules.yaml"
+    rules_file.write_text(RULES, encoding="utf-8")
+    engine = RuleEngine(rules_file)
+    records = [
+        {"msg": "Failed password for root", "app": "sshd"},
+        {"msg": "upstream timeout", "app": "nginx"},
+        {"msg": "user=alice", "app": "nginx"},
+    ]
+
+    for record in records:
+        matched, costs = engine.ruleset.profile(record)
+        assert [rule.id for rule in matched] == [rule.id for rule in engine.ruleset.match(record)]
+        assert {rule_id for rule_id, _, _ in costs} >= {LITERAL_SCAN_ID, "literal", "regex"}
+
+    _, costs = engine.ruleset.profile(records[1])
+    assert ("glob", True) in {(rule_id, ok) for rule_id, ok, _ in costs}
+
+
+def test_engine_samples_every_nth_event(tmp_path: Path) -> None:
+    rules_file = tmp_path / "rules.yaml"
+    rules_file.write_text(RULES, encoding="utf-8")
+    engine = RuleEngine(rules_file, profile_sample=0.25)
+    assert engine.profiler is not None
+    engine.profiler.export = False
+
+    record = {"msg": "failed password", "app": "sshd"}
+    for _ in range(8):
+        assert [rule.id for rule in engine.match(record)] == ["literal"]
+
+    assert (engine.profiler.every, engine.profiler.sampled) == (4, 2)
+    literal = engine.profiler.stats["literal"]
+    assert (literal.evaluations, literal.matches) == (2, 2)
+    slowest = max(cost.seconds for cost in engine.profiler.stats.values())
+    assert engine.profiler.ranking(1)[0][1].seconds == slowest
+    with pytest.raises(ValueError):
+        RuleProfiler(0)
+
+
+@pytest.mark.parametrize(
+    ("pattern", "risky"),
+    [
+        ("(a+)+$", True),
+        ("(\\w+\\s?)*$", True),
+        ("(a|ab)*c", True),
+        ("\\s*\\s*=", True),
+        ("Failed password for (\\S+) from", False),
+        (".*foo.*", False),
+        ("(?:GET|POST) /api", False),
+        ("(a++)+", False),
+        ("(abc){3}", False),
+    ],
+)
+def test_regex_risks(pattern: str, risky: bool) -> None:
+    assert bool(regex_risks(pattern)) is risky
+
+
+def test_regex_risks_without_parser(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(profiler, "sre_parse", None)
+    assert regex_risks("(a+)+$") == []
+
+
+def test_cli_prints_throughput_ranking_and_flags(tmp_path: Path) -> None:
+    rules_file = tmp_path / "rules.yaml"
+    rules_file.write_text(RULES, encoding="utf-8")
+    corpus = tmp_path / "corpus.log"
+    corpus.write_text(
+        "\n".join(
+            [
+                '{"message": "Failed password for root", "app": "sshd", "host": "a"}',
+                '{"message": "upstream timeout", "app": "nginx", "host": "b"}',
+                '{"message": "user=bob", "app": "nginx", "host": "b"}',
+            ],
+        ),
+        encoding="utf-8",
+    )
+    out = io.StringIO()
+
+    main([str(corpus), "--rules", str(rules_file), "--repeat", "3"], out=out)
+
+    text = out.getvalue()
+    assert "подій: 9" in text
+    assert "подій/с" in text
+    assert "regex" in text.split("Найдорожчі правила")[1]
+    assert "Regex із ризиком катастрофічного бектрекінгу: 1" in text
@@ -1,7 +1,16 @@
 """Тести rules engine."""
 from __future__ import annotations
 
+import json
+import os
+from datetime import UTC, datetime, timedelta
+from pathlib import Path
+
+import pytest
+
+from cortexwatcher.analyzer.reload import REPLICA_TTL_SECONDS, RULES_VERSIONS_KEY, RuleReloader
 from cortexwatcher.analyzer.rules_engine import RuleEngine
+from cortexwatcher.analyzer.stateful import SlidingWindowCounter
 
 
 def test_rule_match(tmp_path) -> None:
@@ -23,3 +32,448 @@ def test_rule_match(tmp_path) -> None:
     matches = engine.match({"msg": "critical error", "app": "app1"})
     assert matches and matches[0].id == "test"
 
+
+
+def test_compiled_patterns_cover_regex_glob_and_literals(tmp_path: Path) -> None:
+    rules_file = tmp_path / "rules.yaml"
+    rules_file.write_text(
+        """
+- id: short
+  title: ""
+  description: ""
+  severity: 5
+  patterns: ["FAIL"]
+- id: long
+  title: ""
+  description: ""
+  severity: 5
+  patterns: ["failed password"]
+- id: inner
+  title: ""
+  description: ""
+  severity: 5
+  patterns: ["password"]
+- id: regex
+  title: ""
+  description: ""
+  severity: 5
+  patterns: ["/ 5\\\\d{2} /"]
+- id: glob
+  title: ""
+  description: ""
+  severity: 5
+  patterns: ["*for ROOT*"]
+- id: empty
+  title: ""
+  description: ""
+  severity: 5
+  patterns: [""]
+- id: broken
+  title: ""
+  description: ""
+  severity: 5
+  patterns: ["/(/"]
+""",
+        encoding="utf-8",
+    )
+    engine = RuleEngine(rules_file)
+
+    matched = {rule.id for rule in engine.match({"msg": "Failed password for root"})}
+    assert matched == {"short", "long", "inner", "glob"}
+
+    matched = {rule.id for rule in engine.match({"msg": "GET / 503 upstream"})}
+    assert matched == {"regex"}
+
+
+def test_rules_dispatched_by_exact_filters(tmp_path: Path) -> None:
+    rules_file = tmp_path / "rules.yaml"
+    rules_file.write_text(
+        """
+- id: ssh
+  title: ""
+  description: ""
+  severity: 5
+  patterns: ["failed"]
+  filters:
+    app: ["sshd"]
+- id: web
+  title: ""
+  description: ""
+  severity: 5
+  patterns: ["failed"]
+  filters:
+    app: ["nginx"]
+    host: ["web*"]
+- id: any_app
+  title: ""
+  description: ""
+  severity: 5
+  patterns: ["failed"]
+  filters:
+    app: ["ng*"]
+""",
+        encoding="utf-8",
+    )
+    engine = RuleEngine(rules_file)
+
+    assert [rule.id for rule in engine.ruleset.applicable("db1", "sshd", None)] == ["ssh"]
+    web_rules = engine.ruleset.applicable("web1", "nginx", None)
+    assert [rule.id for rule in web_rules] == ["web", "any_app"]
+    assert [rule.id for rule in engine.ruleset.applicable("db1", "nginx", None)] == ["any_app"]
+    assert engine.ruleset.applicable(None, None, None) == ()
+
+    matched = engine.match({"msg": "login failed", "host": "web1", "app": "nginx"})
+    assert [rule.id for rule in matched] == ["web", "any_app"]
+    # Правило з glob-фільтром не дає відсіяти логи на рівні сховища
+    assert engine.prefilter.wildcard
+
+
+def test_prefilter_collects_exact_filter_values(tmp_path: Path) -> None:
+    rules_file = tmp_path / "rules.yaml"
+    rules_file.write_text(
+        """
+- id: ssh
+  title: ""
+  description: ""
+  severity: 5
+  patterns: ["failed"]
+  filters:
+    app: ["sshd"]
+- id: db
+  title: ""
+  description: ""
+  severity: 5
+  patterns: ["deadlock"]
+  filters:
+    host: ["db1", "db2"]
+- id: chain
+  title: ""
+  description: ""
+  severity: 7
+  sequence:
+    - rule: ssh
+  within: 60
+""",
+        encoding="utf-8",
+    )
+    prefilter = RuleEngine(rules_file).prefilter
+
+    assert prefilter.apps == {"sshd"}
+    assert prefilter.hosts == {"db1", "db2"}
+    assert not prefilter.wildcard
+    assert prefilter.admits("sshd", "web1")
+    assert prefilter.admits("nginx", "db2")
+    assert not prefilter.admits("nginx", "web1")
+
+
+RELOAD_RULES = """
+- id: {rule_id}
+  title: ""
+  description: ""
+  severity: 5
+  patterns: ["error"]
+"""
+
+
+class FakePubSub:
+    def __init__(self, bus: list[str]) -> None:
+        self.bus = bus
+        self.offset = len(bus)
+
+    def subscribe(self, channel: str) -> None:
+        self.channel = channel
+
+    def get_message(self, timeout: float = 0) -> dict[str, object] | None:
+        if self.offset >= len(self.bus):
+            return None
+        self.offset += 1
+        return {"type": "message", "data": self.bus[self.offset - 1]}
+
+    def close(self) -> None:
+        pass
+
+
+class FakeRedis:
+    def __init__(self) -> None:
+        self.bus: list[str] = []
+        self.hashes: dict[str, dict[str, str]] = {}
+
+    def pubsub(self, **_: object) -> FakePubSub:
+        return FakePubSub(self.bus)
+
+    def publish(self, channel: str, message: str) -> int:
+        self.bus.append(message)
+        return 1
+
+    def hset(self, key: str, field: str, value: str) -> int:
+        self.hashes.setdefault(key, {})[field] = value
+        return 1
+
+    def hgetall(self, key: str) -> dict[str, str]:
+        return dict(self.hashes.get(key, {}))
+
+    def hdel(self, key: str, *fields: str) -> int:
+        return sum(self.hashes.get(key, {}).pop(field, None) is not None for field in fields)
+
+
+def test_reload_swaps_ruleset_only_on_content_change(tmp_path: Path) -> None:
+    rules_file = tmp_path / "rules.yaml"
+    rules_file.write_text(RELOAD_RULES.format(rule_id="first"), encoding="utf-8")
+    engine = RuleEngine(rules_file)
+    initial = engine.ruleset
+
+    assert engine.reload() is False
+    assert engine.ruleset is initial
+
+    rules_file.write_text(RELOAD_RULES.format(rule_id="second"), encoding="utf-8")
+    assert engine.changed_on_disk()
+    assert engine.reload() is True
+    assert engine.version != initial.version
+    assert [rule.id for rule in engine.match({"msg": "error"})] == ["second"]
+    assert [rule.id for rule in initial.match({"msg": "error"})] == ["first"]
+
+
+async def test_reloader_propagates_version_between_replicas(tmp_path: Path) -> None:
+    first_file = tmp_path / "a.yaml"
+    second_file = tmp_path / "b.yaml"
+    for path in (first_file, second_file):
+        path.write_text(RELOAD_RULES.format(rule_id="old"), encoding="utf-8")
+    redis = FakeRedis()
+    leader = RuleReloader(RuleEngine(first_file), redis, "leader", poll_interval=3600)
+    follower = RuleReloader(RuleEngine(second_file), redis, "follower", poll_interval=3600)
+    leader.start()
+    follower.start()
+
+    new_content = RELOAD_RULES.format(rule_id="new")
+    first_file.write_text(new_content, encoding="utf-8")
+    second_file.write_text(new_content, encoding="utf-8")
+    # Зберігаємо старий mtime фоловера, щоб оновлення прийшло лише через сигнал
+    os.utime(second_file, ns=(0, 0))
+    follower.engine._file_stamp = (0, second_file.stat().st_size)
+
+    assert await follower.poll() is False
+    assert await leader.poll(force=True) is True
+    assert redis.bus == [leader.engine.version]
+    assert await follower.poll() is True
+    assert follower.engine.version == leader.engine.version
+
+    reported = redis.hashes[RULES_VERSIONS_KEY]
+    versions = {key: json.loads(value)["version"] for key, value in reported.items()}
+    assert versions == {"leader": leader.engine.version, "follower": leader.engine.version}
+
+
+async def test_reloader_drops_rows_of_dead_replicas(tmp_path: Path) -> None:
+    rules_file = tmp_path / "rules.yaml"
+    rules_file.write_text(RELOAD_RULES.format(rule_id="live"), encoding="utf-8")
+    redis = FakeRedis()
+    # Репліка впала без close: її запис зі старою версією лишився в хеші
+    last_seen = datetime.now(UTC) - timedelta(seconds=REPLICA_TTL_SECONDS * 2)
+    redis.hset(
+        RULES_VERSIONS_KEY,
+        "inline:dead:42",
+        json.dumps({"version": "old", "seen_at": last_seen.isoformat()}),
+    )
+    redis.hset(RULES_VERSIONS_KEY, "inline:legacy:7", json.dumps({"version": "old"}))
+    reloader = RuleReloader(RuleEngine(rules_file), redis, "inline:live:1", poll_interval=3600)
+    reloader.start()
+
+    await reloader.poll()
+
+    assert list(redis.hashes[RULES_VERSIONS_KEY]) == ["inline:live:1"]
+
+
+def test_threshold_rule_fires_once_per_window_and_group(tmp_path: Path) -> None:
+    rules_file = tmp_path / "rules.yaml"
+    rules_file.write_text(
+        """
+- id: brute
+  title: ""
+  description: ""
+  severity: 6
+  patterns: ["Failed password"]
+  threshold: 3
+  window: 60
+  group_by: [srcip]
+""",
+        encoding="utf-8",
+    )
+    engine = RuleEngine(rules_file)
+
+    def hit(srcip: str, ts: float) -> bool:
+        return bool(engine.match({"msg": "Failed password", "srcip": srcip, "ts": ts}))
+
+    assert [hit("10.0.0.1", 1000 + i) for i in range(5)] == [False, False, True, False, False]
+    assert hit("10.0.0.2", 1005) is False
+    # Після закінчення вікна стара серія не рахується, потрібен новий поріг
+    assert [hit("10.0.0.1", 1200 + i) for i in range(3)] == [False, False, True]
+
+
+def test_match_cache_reuses_results_but_keeps_stateful_rules_exact(tmp_path: Path) -> None:
+    rules_file = tmp_path / "rules.yaml"
+    rules_file.write_text(
+        """
+- id: brute
+  title: ""
+  description: ""
+  severity: 6
+  patterns: ["Failed password"]
+  threshold: 3
+  window: 60
+- id: cron
+  title: ""
+  description: ""
+  severity: 5
+  patterns: ['/CRON\\[\\d+\\]/']
+""",
+        encoding="utf-8",
+    )
+    cache_size = 2
+    engine = RuleEngine(rules_file, match_cache_size=cache_size)
+    ruleset = engine.ruleset
+
+    failed = {"msg": "Failed password", "app": "sshd"}
+    fired = [bool(engine.match(dict(failed, ts=1000 + i))) for i in range(4)]
+    assert fired == [False, False, True, False]
+    assert len(ruleset._match_cache) == 1
+
+    cron = {"msg": "CRON[42]: session opened", "app": "cron"}
+    assert [rule.id for rule in engine.match(cron)] == ["cron"]
+    assert [rule.id for rule in engine.match(dict(cron, app="other"))] == ["cron"]
+    assert len(ruleset._match_cache) == cache_size
+    # Інша трійка фільтрів — інший ключ; кеш обмежений двома записами
+    assert ("Failed password", None, "sshd", None) not in ruleset._match_cache
+
+    updated = rules_file.read_text(encoding="utf-8").replace("CRON", "ANACRON")
+    rules_file.write_text(updated, encoding="utf-8")
+    assert engine.reload()
+    assert engine.ruleset._match_cache == {}
+    assert engine.match(cron) == []
+
+
+def test_where_conditions_check_meta_after_cached_patterns(tmp_path: Path) -> None:
+    rules_file = tmp_path / "rules.yaml"
+    rules_file.write_text(
+        """
+- id: wazuh_high_level
+  title: ""
+  description: ""
+  severity: 7
+  where: ["rule.level >= 10"]
+- id: server_errors
+  title: ""
+  description: ""
+  severity: 5
+  patterns: ["upstream"]
+  where: ["http.status between 500 599"]
+""",
+        encoding="utf-8",
+    )
+    engine = RuleEngine(rules_file, match_cache_size=10)
+
+    def ids(meta: dict[str, object]) -> list[str]:
+        record = {"msg": "upstream failed", "app": "nginx", "meta": meta}
+        return [rule.id for rule in engine.match(record)]
+
+    both = ["wazuh_high_level", "server_errors"]
+    assert ids({"rule": {"level": 12}, "http": {"status": 502}}) == both
+    # Той самий текст повідомлення береться з кешу, але умови перевіряються наново
+    assert ids({"rule": {"level": 3}, "http": {"status": "404"}}) == []
+    assert ids({"http": {"status": "503"}}) == ["server_errors"]
+
+    rules_file.write_text(
+        """
+- id: broken
+  title: ""
+  description: ""
+  severity: 5
+  where: ["rule.level >= high"]
+""",
+        encoding="utf-8",
+    )
+    with pytest.raises(ValueError, match="broken"):
+        engine.reload()
+    assert [rule.id for rule in engine.rules] == ["wazuh_high_level", "server_errors"]
+
+
+def test_sliding_window_counter_evicts_idle_and_excess_groups() -> None:
+    counter = SlidingWindowCounter(window_seconds=10, max_groups=2)
+    assert [counter.hit("a", 0), counter.hit("a", 5), counter.hit("a", 10.5)] == [1, 2, 2]
+    counter.hit("b", 11)
+    counter.hit("c", 12)
+    assert list(counter.groups) == ["b", "c"]
+    counter.hit("c", 40)
+    assert (list(counter.groups), counter.evicted) == (["c"], 2)
+
+
+SEQUENCE_RULES = """
+- id: ssh_failed
+  title: ""
+  description: ""
+  severity: 1
+  patterns: ["Failed password"]
+- id: ssh_accepted
+  title: ""
+  description: ""
+  severity: 1
+  patterns: ["Accepted password"]
+- id: brute_then_success
+  title: ""
+  description: ""
+  severity: 8
+  sequence:
+    - rule: ssh_failed
+      count: 3
+    - rule: ssh_accepted
+  within: 120
+"""
+
+
+def test_sequence_rule_tracks_progress_per_correlation_key(tmp_path: Path) -> None:
+    rules_file = tmp_path / "rules.yaml"
+    rules_file.write_text(SEQUENCE_RULES, encoding="utf-8")
+    engine = RuleEngine(rules_file)
+
+    def send(msg: str, key: str, ts: float) -> list[str]:
+        return [rule.id for rule in engine.match({"msg": msg, "correlation_key": key, "ts": ts})]
+
+    assert send("Accepted password", "a", 0) == ["ssh_accepted"]
+    for offset in range(3):
+        send("Failed password", "a", 10 + offset)
+    send("Failed password", "b", 11)
+    assert send("Accepted password", "b", 20) == ["ssh_accepted"]
+    assert send("Accepted password", "a", 30) == ["ssh_accepted", "brute_then_success"]
+
+    # Прострочена послідовність не спрацьовує
+    for offset in range(3):
+        send("Failed password", "c", 100 + offset)
+    assert "brute_then_success" not in send("Accepted password", "c", 400)
+
+
+def test_sequence_state_survives_restart(tmp_path: Path) -> None:
+    rules_file = tmp_path / "rules.yaml"
+    rules_file.write_text(SEQUENCE_RULES, encoding="utf-8")
+    engine = RuleEngine(rules_file)
+    for offset in range(3):
+        engine.match({"msg": "Failed password", "correlation_key": "k", "ts": 1000 + offset})
+
+    restarted = RuleEngine(rules_file)
+    restarted.restore_state(engine.export_state())
+    matched = restarted.match({"msg": "Accepted password", "correlation_key": "k", "ts": 1010})
+    assert [rule.id for rule in matched] == ["ssh_accepted", "brute_then_success"]
+
+
+def test_sequence_restore_skips_malformed_states(tmp_path: Path) -> None:
+    rules_file = tmp_path / "rules.yaml"
+    rules_file.write_text(SEQUENCE_RULES, encoding="utf-8")
+    engine = RuleEngine(rules_file)
+    snapshot = engine.export_state()
+    tracker = engine.state.sequences["brute_then_success"]
+    signature = repr(tracker.signature())
+    snapshot["sequences"] = {
+        "brute_then_success": {
+            "signature": signature,
+            "states": [["bad", "1", 0, 0.0, 2000.0], ["ok", 1, 0, 1000.0, 2000.0]],
+        },
+    }
+    engine.restore_state(snapshot)
+    assert list(tracker.states) == ["ok"]
@@ -0,0 +1,161 @@
+"""Тести потокових скетчів аналізатора."""
+from __future__ import annotations
+
+import os
+import random
+from bisect import bisect_left
+from collections.abc import Callable
+from datetime import UTC, datetime, timedelta
+from pathlib import Path
+
+import pytest
+
+os.environ.setdefault("TG_BOT_TOKEN", "test")
+os.environ.setdefault("DATABASE_URL", "sqlite+aiosqlite:///:memory:")
+os.environ.setdefault("REDIS_URL", "redis://localhost:6379/0")
+os.environ.setdefault("API_AUTH_TOKEN", "token")
+
+from cortexwatcher.analyzer.rules_engine import RuleEngine
+from cortexwatcher.analyzer.sketches import (
+    KllSketch,
+    QuantileTracker,
+    SpaceSaving,
+    TrafficTracker,
+    persist_traffic,
+)
+
+START = datetime(2024, 1, 1, tzinfo=UTC)
+# Гарантія KLL для k=200: похибка рангу ~1.7/k, з запасом
+RANK_ERROR = 0.02
+HEAVY_HITS = 2000
+TOP_CAPACITY = 50
+PORTS = 100
+
+
+def _rank(values: list[float], estimate: float | None) -> float:
+    assert estimate is not None
+    return bisect_left(values, estimate) / len(values)
+
+
+def test_kll_sketch_rank_error_is_bounded_and_merge_is_lossless() -> None:
+    rng = random.Random(5)  # noqa: S311 - відтворювані тестові дані
+    values = [rng.lognormvariate(0, 1) for _ in range(50_000)]
+    whole, left, right = KllSketch(), KllSketch(), KllSketch()
+    for index, value in enumerate(values):
+        whole.update(value)
+        (left if index % 2 else right).update(value)
+    left.merge(right)
+    ordered = sorted(values)
+    for sketch in (whole, left, KllSketch.from_bytes(left.to_bytes())):
+        assert sketch.count == len(values)
+        for q in (0.5, 0.95, 0.99):
+            assert abs(_rank(ordered, sketch.quantile(q)) - q) < RANK_ERROR
+    retained = sum(len(level) for level in whole.levels)
+    assert retained < 5 * whole.k
+
+
+def test_kll_merge_rejects_sketches_with_different_k() -> None:
+    sketch, other = KllSketch(k=200), KllSketch(k=100)
+    other.update(1.0)
+    with pytest.raises(ValueError, match="різним k"):
+        sketch.merge(other)
+    assert sketch.count == 0
+
+
+def test_tracker_closes_minutes_and_feeds_quantile_rules(tmp_path: Path) -> None:
+    rules_file = tmp_path / "rules.yaml"
+    rules_file.write_text(
+        """
+- id: nginx_slow
+  title: "Повільні відповіді nginx"
+  description: ""
+  severity: 6
+  filters:
+    app: ["nginx"]
+  quantile:
+    field: request_time
+    q: 0.95
+    above: 1.5
+    min_count: 10
+""",
+        encoding="utf-8",
+    )
+    engine = RuleEngine(rules_file)
+    assert engine.match({"msg": "anything", "app": "nginx"}) == []
+
+    tracker = QuantileTracker({"request_time": "data.request_time"})
+    for minute, slow in ((0, False), (1, True)):
+        # У повільну хвилину останні 10 зі 100 відповідей тривають 3 с
+        slow_from = 90 if slow else 100
+        for index in range(100):
+            value = 3.0 if index >= slow_from else 0.1 + index / 1000
+            meta = {"data": {"request_time": str(value)}}
+            timestamp = START + timedelta(minutes=minute, seconds=index % 60)
+            tracker.observe(meta, "web", "nginx", timestamp)
+    # Подія без поля не рухає хвилину: закрита лише нульова
+    tracker.observe({"data": {}}, "web", "nginx", START + timedelta(minutes=2))
+    closed = tracker.tick()
+    assert [(item.series, item.minute, item.sketch.count) for item in closed] == [
+        ("web|nginx", closed[0].minute, 100),
+    ]
+    closed += tracker.tick(START + timedelta(minutes=3))
+    assert [item.minute - closed[0].minute for item in closed] == [0, 1]
+    assert [item.sketch.count for item in closed] == [100, 100]
+    record = {"host": "web", "app": "nginx"}
+    fired = [engine.match_quantiles(item.field, record, item.sketch) for item in closed]
+    assert fired[0] == []
+    assert [(rule.id, value) for rule, value in fired[1]] == [("nginx_slow", 3.0)]
+
+
+def test_space_saving_keeps_heavy_hitters_with_bounded_error() -> None:
+    rng = random.Random(11)  # noqa: S311 - відтворюваний тестовий потік
+    stream = [f"10.0.0.{index}" for index in range(5) for _ in range(HEAVY_HITS)]
+    stream += [f"192.168.{index // 256}.{index % 256}" for index in range(20_000)]
+    rng.shuffle(stream)
+    sketch = SpaceSaving(capacity=TOP_CAPACITY)
+    for item in stream:
+        sketch.update(item)
+
+    top = sketch.top(5)
+    assert sorted(item for item, _, _ in top) == [f"10.0.0.{index}" for index in range(5)]
+    for _, count, error in top:
+        assert count - error <= HEAVY_HITS <= count
+    assert len(sketch.counts) == TOP_CAPACITY
+
+
+class _Pipeline:
+    def __init__(self) -> None:
+        self.calls: list[tuple[object, ...]] = []
+
+    def __getattr__(self, name: str) -> Callable[..., None]:
+        return lambda *args: self.calls.append((name, *args))
+
+    def execute(self) -> None:
+        pass
+
+
+class _Redis:
+    def __init__(self) -> None:
+        self.pipe = _Pipeline()
+
+    def pipeline(self, transaction: bool = True) -> _Pipeline:
+        return self.pipe
+
+
+def test_traffic_tracker_counts_talkers_and_distinct_ports() -> None:
+    tracker = TrafficTracker(["srcip"], {"dst_ports": ("raw.dest_port", "srcip")}, capacity=10)
+    for port in range(PORTS):
+        record = {"srcip": "10.0.0.1", "dstip": "10.0.0.2"}
+        tracker.observe(record, {"raw": {"dest_port": port}}, START + timedelta(seconds=port % 60))
+    tracker.observe({"srcip": "10.0.0.9"}, {"raw": {"dest_port": 22}}, START + timedelta(minutes=1))
+
+    closed = tracker.tick()
+    assert [(item.field, item.items) for item in closed] == [("srcip", [("10.0.0.1", PORTS, 0)])]
+    distinct = tracker.drain_distinct()
+    assert len(distinct[("dst_ports", closed[0].minute, "10.0.0.1")]) == PORTS
+    assert tracker.drain_distinct() == {}
+
+    redis = _Redis()
+    persist_traffic(redis, closed, distinct, retention_minutes=60)  # type: ignore[arg-type]
+    calls = {call[0] for call in redis.pipe.calls}
+    assert calls == {"zincrby", "pfadd", "sadd", "expire"}
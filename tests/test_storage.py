@@ -167,6 +167,119 @@ async def test_postgres_storage_handles_anomalies(postgres_storage: "PostgresSto
     assert anomalies[0].signal == "events_total"
 
 
+@pytest.mark.asyncio
+async def test_postgres_storage_adds_alert_occurrences(postgres_storage: PostgresStorage) -> None:
+    from cortexwatcher.db.models import Alert  # noqa: PLC0415 - після перезавантаження модулів БД
+
+    now = datetime(2024, 1, 1)
+    alert = Alert(
+        created_at=now,
+        rule_id="ssh_bruteforce",
+        level=7,
+        title="Brute force",
+        description="",
+        tags=[],
+        evidence_json={},
+        correlation_key="1.2.3.4|*|sshd",
+        last_seen_at=now,
+    )
+    stored = await postgres_storage.store_alert(alert)
+    assert stored.occurrences == 1
+
+    await postgres_storage.add_alert_occurrences({stored.id: (41, now + timedelta(minutes=2))})
+    await postgres_storage.add_alert_occurrences({stored.id: (8, now + timedelta(minutes=1))})
+    alerts = await postgres_storage.list_alerts()
+    updated = next(item for item in alerts if item.id == stored.id)
+    assert updated.occurrences == 1 + 41 + 8
+    assert updated.last_seen_at == now + timedelta(minutes=2)
+
+
+@pytest.mark.asyncio
+async def test_postgres_storage_batches_alerts_and_anomalies(
+    postgres_storage: PostgresStorage,
+) -> None:
+    from cortexwatcher.db.models import (  # noqa: PLC0415 - після перезавантаження модулів БД
+        Alert,
+        Anomaly,
+    )
+
+    now = datetime(2024, 1, 2)
+    titles = [f"Batch {index}" for index in range(20)]
+    alerts = [
+        Alert(created_at=now, rule_id=f"rule-{index}", level=5, title=title, description="")
+        for index, title in enumerate(titles)
+    ]
+    saved = await postgres_storage.store_alerts_batch(alerts)
+    assert [item.title for item in saved] == titles
+    assert len({item.id for item in saved}) == len(titles)
+    assert all(item.occurrences == 1 and item.evidence_json == {} for item in saved)
+
+    stored = {item.id: item.title for item in await postgres_storage.list_alerts(limit=100)}
+    assert all(stored[item.id] == item.title for item in saved)
+
+    anomalies = await postgres_storage.store_anomalies_batch(
+        [
+            Anomaly(created_at=now, signal=f"s{i}", score=float(i), window=5, details_json={})
+            for i in range(3)
+        ],
+    )
+    assert [item.id for item in anomalies] == sorted(item.id for item in anomalies)
+    assert await postgres_storage.store_alerts_batch([]) == []
+
+
+@pytest.mark.asyncio
+async def test_postgres_storage_streams_logs_in_range(postgres_storage: PostgresStorage) -> None:
+    from cortexwatcher.analyzer.rules_engine import (  # noqa: PLC0415 - після налаштування БД
+        RulePrefilter,
+    )
+    from cortexwatcher.db.models import (  # noqa: PLC0415 - після перезавантаження модулів БД
+        LogNormalized,
+        LogRaw,
+    )
+
+    base = datetime(2023, 3, 1)
+    raw = LogRaw(source="api", received_at=base, payload_raw="", format="syslog", hash="stream")
+    await postgres_storage.store_raw_batch([raw])
+    await postgres_storage.store_normalized_batch(
+        [
+            LogNormalized(
+                raw_id=raw.id,
+                ts=base + timedelta(minutes=offset),
+                host="db",
+                app="pg",
+                severity="info",
+                msg=f"m{offset}",
+            )
+            for offset in (3, 0, 1, 5, 2)
+        ],
+    )
+
+    end = base + timedelta(minutes=5)
+    streamed = [log.msg async for log in postgres_storage.iter_logs(base, end, batch_size=2)]
+    assert streamed == ["m0", "m1", "m2", "m3"]
+
+    await postgres_storage.store_normalized_batch(
+        [
+            LogNormalized(raw_id=raw.id, ts=base, host=host, app=app, severity="info", msg=host)
+            for host, app in (("web", "nginx"), ("cache", "redis"))
+        ],
+    )
+    window = (base, base + timedelta(minutes=1))
+
+    async def streamed(prefilter: RulePrefilter) -> list[str]:
+        logs = postgres_storage.iter_logs(*window, prefilter=prefilter)
+        return sorted([log.msg async for log in logs])
+
+    only_web = RulePrefilter(apps=frozenset({"nginx"}), hosts=frozenset(), wildcard=False)
+    assert await streamed(only_web) == ["web"]
+    by_host = RulePrefilter(apps=frozenset({"nginx"}), hosts=frozenset({"db"}), wildcard=False)
+    assert await streamed(by_host) == ["m0", "web"]
+    nothing = RulePrefilter(apps=frozenset(), hosts=frozenset(), wildcard=False)
+    assert await streamed(nothing) == []
+    everything = RulePrefilter(apps=frozenset(), hosts=frozenset(), wildcard=True)
+    assert await streamed(everything) == ["cache", "m0", "web"]
+
+
 @pytest.mark.asyncio
 async def test_clickhouse_storage_in_memory_behaviour() -> None:
     from cortexwatcher.db.models import Alert, LogNormalized, LogRaw
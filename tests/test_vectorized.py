@@ -0,0 +1,70 @@
+"""Тести векторизованого бекенду детектора аномалій."""
+from __future__ import annotations
+
+import os
+import random
+from datetime import UTC, datetime, timedelta
+
+import pytest
+
+os.environ.setdefault("TG_BOT_TOKEN", "test")
+os.environ.setdefault("DATABASE_URL", "sqlite+aiosqlite:///:memory:")
+os.environ.setdefault("REDIS_URL", "redis://localhost:6379/0")
+os.environ.setdefault("API_AUTH_TOKEN", "token")
+
+from cortexwatcher.analyzer.anomalies import AnomalyDetector
+from cortexwatcher.analyzer.vectorized import VectorizedAnomalyDetector
+
+np = pytest.importorskip("numpy")
+
+START = datetime(2024, 1, 1, tzinfo=UTC)
+
+
+def test_zscore_matches_scalar_detector_at_bucket_close() -> None:
+    rng = random.Random(3)  # noqa: S311 - відтворювані тестові дані
+    scalar = AnomalyDetector(window_minutes=6, threshold=2.0)
+    vectorized = VectorizedAnomalyDetector(window_minutes=6, threshold=2.0, capacity=2)
+    expected: dict[tuple[str, datetime], float] = {}
+    hits = []
+    for minute in range(15):
+        ts = START + timedelta(minutes=minute)
+        for host in ("a", "b", "c"):
+            count = 40 if (host, minute) == ("b", 11) else rng.randrange(1, 6)
+            for _ in range(count):
+                anomaly, score = scalar.update(host, "app", "err", ts)
+                assert vectorized.update(host, "app", "err", ts) == (False, 0.0)
+            if anomaly:
+                expected[(f"{host}|app|err", ts)] = score
+        hits.extend(vectorized.tick())
+    assert vectorized.snapshot() == scalar.snapshot()
+    hits.extend(vectorized.tick(START + timedelta(minutes=15)))
+
+    assert {(hit.signal, hit.timestamp): hit.score for hit in hits} == pytest.approx(expected)
+    assert ("b|app|err", START + timedelta(minutes=11)) in expected
+
+
+def test_mad_variant_flags_spike_and_ignores_flat_series() -> None:
+    detector = VectorizedAnomalyDetector(window_minutes=10, threshold=3.5, method="mad")
+    for minute in range(10):
+        for _ in range(5 + minute % 2):
+            detector.update("web", "nginx", "err", START + timedelta(minutes=minute))
+        detector.update("db", "pg", "err", START + timedelta(minutes=minute))
+    for _ in range(30):
+        detector.update("web", "nginx", "err", START + timedelta(minutes=10))
+    hits = detector.tick(START + timedelta(minutes=11))
+    assert [(hit.signal, hit.value) for hit in hits] == [("web|nginx|err", 30)]
+
+
+def test_rows_are_reused_after_eviction() -> None:
+    detector = VectorizedAnomalyDetector(window_minutes=5, max_series=2, idle_minutes=3, capacity=1)
+    detector.update("a", "app", "err", START)
+    detector.update("b", "app", "err", START)
+    detector.update("c", "app", "err", START)
+    assert set(detector.index) == {"b|app|err", "c|app|err"}
+    assert detector.evicted["capacity"] == 1
+
+    # Закриття хвилини витісняє обидві простояні серії, а "c" займає звільнений рядок
+    detector.update("c", "app", "err", START + timedelta(minutes=4))
+    assert set(detector.index) == {"c|app|err"}
+    assert detector.evicted == {"capacity": 1, "idle": 2}
+    assert len(detector.keys) == detector.max_series
@@ -2,11 +2,13 @@
 from __future__ import annotations
 
 import os
+from collections.abc import AsyncIterator, Iterable, Sequence
 from datetime import datetime, timezone
+from pathlib import Path
 from types import SimpleNamespace
-from typing import Iterable, Sequence
 
 import pytest
+from rq import Queue
 
 os.environ.setdefault("TG_BOT_TOKEN", "test")
 os.environ.setdefault("ALLOWED_CHAT_IDS", "1")
@@ -15,6 +17,10 @@ os.environ.setdefault("REDIS_URL", "redis://localhost:6379/0")
 os.environ.setdefault("API_AUTH_TOKEN", "token")
 os.environ.setdefault("RULES_PATH", "src/cortexwatcher/rules/sample_rules.yaml")
 
+from cortexwatcher.analyzer import AnomalyDetector, RuleEngine
+from cortexwatcher.analyzer.inline import PROCESSED_LOGS_KEY, InlineAnalyzer, claim_logs
+from cortexwatcher.analyzer.rules_engine import RulePrefilter
+from cortexwatcher.config import get_settings
 from cortexwatcher.db.models import Alert, Anomaly, LogNormalized, LogRaw
 from cortexwatcher.storage.base import LogStorage
 from cortexwatcher.workers import tasks
@@ -66,6 +72,19 @@ class InMemoryStorage(LogStorage):
             result = [item for item in result if text.lower() in item.msg.lower()]
         return list(sorted(result, key=lambda log: log.ts, reverse=True))[:limit]
 
+    async def iter_logs(
+        self,
+        start: datetime,
+        end: datetime,
+        batch_size: int = 1000,
+        prefilter: RulePrefilter | None = None,
+    ) -> AsyncIterator[LogNormalized]:
+        for item in sorted(self.normalized_records, key=lambda log: log.ts):
+            if not start <= item.ts < end:
+                continue
+            if prefilter is None or prefilter.admits(item.app, item.host):
+                yield item
+
     async def store_alert(self, alert: Alert) -> Alert:
         alert.id = len(self.alerts) + 1  # type: ignore[assignment]
         self.alerts.append(alert)
@@ -145,9 +164,13 @@ async def test_evaluate_log_creates_alert_and_anomaly(monkeypatch: pytest.Monkey
         def __init__(self) -> None:
             self.alerts: list[Alert] = []
 
-        async def persist_and_notify(self, alert: Alert, thread_id: int | None = None) -> Alert:
-            saved = await storage.store_alert(alert)
-            self.alerts.append(saved)
+        async def persist_and_notify_batch(
+            self,
+            alerts: list[Alert],
+            thread_id: int | None = None,
+        ) -> list[Alert]:
+            saved = await storage.store_alerts_batch(alerts)
+            self.alerts.extend(saved)
             return saved
 
     class DummyDetector:
@@ -162,7 +185,7 @@ async def test_evaluate_log_creates_alert_and_anomaly(monkeypatch: pytest.Monkey
         ) -> tuple[bool, float]:
             return True, 3.7
 
-    monkeypatch.setattr(tasks, "_bump_alert_metrics", lambda: None)
+    monkeypatch.setattr(tasks, "_bump_alert_metrics", lambda *_: None)
 
     log = LogNormalized(
         raw_id=1,
@@ -187,3 +210,103 @@ async def test_evaluate_log_creates_alert_and_anomaly(monkeypatch: pytest.Monkey
     saved_anomaly = storage.anomalies[0]
     assert saved_anomaly.signal == "web|svc|error"
     assert saved_anomaly.score == pytest.approx(3.7)
+
+
+@pytest.mark.asyncio()
+async def test_process_ingest_runs_inline_analysis(
+    monkeypatch: pytest.MonkeyPatch, tmp_path: Path,
+) -> None:
+    fakeredis = pytest.importorskip("fakeredis")
+
+    rules_file = tmp_path / "rules.yaml"
+    rules_file.write_text(
+        """
+- id: inline
+  title: "Inline"
+  description: ""
+  severity: 7
+  patterns:
+    - "denied"
+""",
+        encoding="utf-8",
+    )
+    storage = InMemoryStorage()
+    monkeypatch.setattr(tasks, "get_storage", lambda: storage)
+    monkeypatch.setattr(tasks, "_bump_metrics", lambda *_: None)
+    monkeypatch.setattr(get_settings(), "inline_analysis_sources", "wazuh, suricata")
+    redis = fakeredis.FakeStrictRedis()
+    inline = InlineAnalyzer(
+        redis,
+        RuleEngine(rules_file),
+        AnomalyDetector(window_minutes=5),
+    )
+    monkeypatch.setattr(tasks._inline, "analyzer", inline)
+
+    payload = {"content": '{"host": "fw", "app": "svc", "message": "access denied"}'}
+    await tasks._process_ingest("api", payload)
+    assert not storage.alerts
+    assert not redis.exists(PROCESSED_LOGS_KEY)
+
+    await tasks._process_ingest("wazuh", payload)
+    assert len(storage.alerts) == 1
+    assert storage.alerts[0].rule_id == "inline"
+    claimed = [member.decode() for member in redis.zrange(PROCESSED_LOGS_KEY, 0, -1)]
+    assert claimed == [str(storage.normalized_records[-1].id)]
+
+
+def test_claim_logs_skips_logs_taken_by_analyzer() -> None:
+    fakeredis = pytest.importorskip("fakeredis")
+    redis = fakeredis.FakeStrictRedis()
+    logs = [LogNormalized(raw_id=1, msg=str(index)) for index in range(3)]
+    for index, log in enumerate(logs[:2], start=1):
+        log.id = index  # type: ignore[assignment]
+    # Окремий аналізатор встиг узяти перший запис між збереженням і inline-аналізом
+    redis.zadd(PROCESSED_LOGS_KEY, {"1": 0}, nx=True)
+
+    assert claim_logs(redis, logs) == logs[1:]
+    assert claim_logs(redis, logs) == logs[2:]
+
+
+def test_worker_keeps_inline_state_between_jobs(
+    monkeypatch: pytest.MonkeyPatch, tmp_path: Path,
+) -> None:
+    fakeredis = pytest.importorskip("fakeredis")
+
+    rules_file = tmp_path / "rules.yaml"
+    rules_file.write_text(
+        """
+- id: repeated_denied
+  title: "Repeated denied"
+  description: ""
+  severity: 7
+  patterns:
+    - "denied"
+  threshold: 2
+  window: 60
+  group_by:
+    - host
+""",
+        encoding="utf-8",
+    )
+    storage = InMemoryStorage()
+    monkeypatch.setattr(tasks, "get_storage", lambda: storage)
+    monkeypatch.setattr(tasks, "_bump_metrics", lambda *_: None)
+    monkeypatch.setattr(get_settings(), "inline_analysis_sources", "wazuh")
+    connection = fakeredis.FakeStrictRedis()
+    inline = InlineAnalyzer(
+        connection,
+        RuleEngine(rules_file),
+        AnomalyDetector(window_minutes=5),
+    )
+    monkeypatch.setattr(tasks._inline, "analyzer", inline)
+
+    queue = Queue("ingest", connection=connection)
+    payload = {"content": '{"host": "fw", "app": "svc", "message": "access denied"}'}
+    queue.enqueue(tasks.process_ingest_job, "wazuh", payload)
+    queue.enqueue(tasks.process_ingest_job, "wazuh", payload)
+    tasks.build_worker([queue]).work(burst=True)
+
+    # Поріг 2 досягається лише тоді, коли лічильник другої задачі бачить першу
+    assert [record.msg for record in storage.normalized_records] == ["access denied"] * 2
+    assert [alert.rule_id for alert in storage.alerts] == ["repeated_denied"]
+